@@ -1,8 +1,10 @@
-from flask import Flask, request
-from config import Config, DeploymentConfig
+import os
+import click
+from flask import Flask, request, session
+from config import Config, DeploymentConfig, PostgresConfig
 from flask_login import current_user, logout_user
 from dotenv import load_dotenv
-from db import db, mail, migrate, login_manager
+from db import db, mail, migrate, login_manager, standings_cache, player_history_cache, friend_cache, identity_cache, mail_queue, sqlite_pragmas, sql_instrumentation, username_index, password_hasher
 
 # Load environment variables
 load_dotenv()
@@ -14,26 +16,42 @@ def create_app(Config):
     
     # Initialize extensions with app
     db.init_app(app)
+    sqlite_pragmas.init_app(app)
+    sql_instrumentation.init_app(app)
     mail.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
+    standings_cache.init_app(app)
+    player_history_cache.init_app(app)
+    friend_cache.init_app(app)
+    identity_cache.init_app(app)
+    mail_queue.init_app(app)
+    username_index.init_app(app)
+    password_hasher.init_app(app)
 
-    # Import models here to avoid circular imports
-    from models import User
+    # Imported here to avoid circular imports
+    from identity import load_user as load_identity
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        return load_identity(int(user_id))
 
     @app.before_request
     def logout_if_user_missing():
-        if current_user.is_authenticated and db.session.get(User, current_user.id) is None:
+        # The session names a user load_user could not find (deleted): forget the login
+        if not current_user.is_authenticated and '_user_id' in session:
             logout_user()
 
     @app.context_processor
     def inject_request():
         return dict(request=request)
 
+    @app.cli.command('rebuild-user-stats')
+    def rebuild_user_stats_command():
+        """Recompute every UserStat row from the stored tournament results."""
+        from user_stats import rebuild_user_stats
+        click.echo(f"Rebuilt {rebuild_user_stats()} user stat rows.")
+
     # Register blueprint
     from blueprints import main
     app.register_blueprint(main)
@@ -41,7 +59,7 @@ def create_app(Config):
     return app
 
 # Create the application instance
-application = create_app(DeploymentConfig)
+application = create_app(PostgresConfig if os.getenv("DATABASE_URL") else DeploymentConfig)
 
 if __name__ == '__main__':
     application.run()
@@ -0,0 +1,96 @@
+"""Single elimination brackets as a binary tree of slots.
+
+The bracket for a tournament is stored as BracketSlot rows numbered like a
+binary heap: slot 1 is the champion, the children of slot s are 2s and
+2s + 1, and the entrants sit in the leaves size .. 2 * size - 1, where size
+is the number of entrants rounded up to a power of two. Each match records
+the slot its winner moves into (Match.bracket_slot), so advancing a winner is
+a single slot update, and the matches of round r are simply the parents of
+the slots filled by round r - 1.
+
+Entrants are placed by standard seeding, so seed 1 and seed 2 can only meet
+in the final and any byes go to the top seeds, one per first-round match.
+"""
+
+
+def bracket_size(num_players):
+    """The number of leaves: num_players rounded up to a power of two."""
+    size = 1
+    while size < num_players:
+        size *= 2
+    return size
+
+
+def standard_seed_order(size):
+    """Seeds in bracket order, e.g. [1, 8, 4, 5, 2, 7, 3, 6] for 8 entrants.
+
+    Each pair of neighbours meets in the first round and the seeds of every
+    pair add up to size + 1.
+    """
+    order = [1]
+    while len(order) < size:
+        total = 2 * len(order) + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def round_nodes(size, round_number):
+    """The slots that the winners of a round's matches move into."""
+    first = size >> round_number
+    return range(first, 2 * first)
+
+
+def build_bracket(seeded_player_ids):
+    """Slots for a new bracket from players in seed order (best first).
+
+    Returns {slot: (seed, player_id)} for every slot in the tree. Leaves
+    facing a bye have no player and the player they face is already placed
+    in the slot above.
+    """
+    size = bracket_size(len(seeded_player_ids))
+    slots = {slot: (None, None) for slot in range(1, 2 * size)}
+    for offset, seed in enumerate(standard_seed_order(size)):
+        player_id = seeded_player_ids[seed - 1] if seed <= len(seeded_player_ids) else None
+        slots[size + offset] = (seed, player_id)
+
+    # Players with a first-round bye move straight up
+    for node in round_nodes(size, 1):
+        left, right = slots[2 * node][1], slots[2 * node + 1][1]
+        if (left is None) != (right is None):
+            slots[node] = (None, left if left is not None else right)
+    return slots
+
+
+def round_pairings(slot_players, size, round_number):
+    """(winner_slot, player1_id, player2_id) for each match of a round.
+
+    slot_players maps slot to the player in it. A slot pair with only one
+    player gives that player a bye (player2_id None); a pair with none is
+    skipped.
+    """
+    pairings = []
+    for node in round_nodes(size, round_number):
+        left, right = slot_players.get(2 * node), slot_players.get(2 * node + 1)
+        if left is None and right is None:
+            continue
+        if left is None:
+            left, right = right, None
+        pairings.append((node, left, right))
+    return pairings
+
+
+def bracket_rounds(slot_players, size):
+    """The bracket as a list of rounds, each a list of (player1_id, player2_id) slot pairs.
+
+    The last entry is the champion slot on its own.
+    """
+    rounds = []
+    round_number = 1
+    while (size >> round_number) >= 1:
+        rounds.append([
+            (slot_players.get(2 * node), slot_players.get(2 * node + 1))
+            for node in round_nodes(size, round_number)
+        ])
+        round_number += 1
+    rounds.append([(slot_players.get(1), None)])
+    return rounds
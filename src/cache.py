@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a size bound.
+
+    The bound is read from the app config key given to the constructor when
+    init_app is called, so each cache can be sized per deployment.
+    """
+
+    def __init__(self, config_key=None, max_size=256):
+        self.config_key = config_key
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if self.config_key:
+            self.max_size = app.config.get(self.config_key, self.max_size)
+        self.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def pop_matching(self, predicate):
+        """Drop every entry whose key predicate(key) is true for."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ExpiringLRUCache(LRUCache):
+    """LRUCache whose entries are also dropped max_age seconds after being set.
+
+    A process only hears about the changes it makes itself, so when several
+    processes serve the app, max_age (read from the age_key config key)
+    bounds how long a change made by another one, or by a script, goes
+    unseen. A max_age of 0 turns the cache off.
+    """
+
+    def __init__(self, config_key=None, age_key=None, max_size=256, max_age=30):
+        super().__init__(config_key, max_size)
+        self.age_key = age_key
+        self.max_age = max_age
+
+    def init_app(self, app):
+        if self.age_key:
+            self.max_age = app.config.get(self.age_key, self.max_age)
+        super().init_app(app)
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires <= time.monotonic():
+            super().pop(key)
+            return default
+        return value
+
+    def set(self, key, value):
+        if self.max_age > 0:
+            super().set(key, (time.monotonic() + self.max_age, value))
+
+    def pop(self, key):
+        entry = super().pop(key)
+        return None if entry is None else entry[1]
@@ -2,10 +2,26 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_migrate import Migrate
+from cache import ExpiringLRUCache
+from standings_cache import StandingsCache
+from mail_queue import MailQueue
+from sqlite_pragmas import SQLitePragmas
+from sql_instrumentation import SQLInstrumentation
+from username_index import UsernameIndex
+from password_hashing import PasswordHasher
 
 # Initialize Flask extensions
 db = SQLAlchemy()
 mail = Mail()
 migrate = Migrate()
 login_manager = LoginManager()
+standings_cache = StandingsCache()
+player_history_cache = ExpiringLRUCache('PLAYER_HISTORY_CACHE_SIZE', 'PLAYER_HISTORY_CACHE_SECONDS')
+friend_cache = ExpiringLRUCache('FRIEND_CACHE_SIZE', 'FRIEND_CACHE_SECONDS')
+identity_cache = ExpiringLRUCache('IDENTITY_CACHE_SIZE', 'IDENTITY_CACHE_SECONDS')
+mail_queue = MailQueue(mail)
+sqlite_pragmas = SQLitePragmas(db)
+sql_instrumentation = SQLInstrumentation(db)
+username_index = UsernameIndex(db)
+password_hasher = PasswordHasher()
 login_manager.login_view = 'main.login' 
\ No newline at end of file
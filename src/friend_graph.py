@@ -0,0 +1,65 @@
+"""Who is friends with whom.
+
+Each friendship is one Friend row, whichever way round it was asked for
+(see Friend.between), so every question about a pair of users is a primary
+key lookup. A user's accepted friends come from two index lookups, one on
+each column of the pair, and are cached as a frozenset of ids per user, so
+"is friend" and "list friends" don't touch the database again until a
+request, accept, decline or removal involving that user calls
+invalidate_friends. That only reaches this process's cache, so entries also
+expire after FRIEND_CACHE_SECONDS, for changes made by other processes.
+"""
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from db import db, friend_cache
+from models import Friend, User
+
+
+def get_edge(user_id, other_id):
+    """The Friend row linking two users, pending or accepted, or None."""
+    low, high = sorted((user_id, other_id))
+    return db.session.get(Friend, (low, high))
+
+
+def friend_ids(user_id):
+    """frozenset of the ids of user_id's accepted friends."""
+    ids = friend_cache.get(user_id)
+    if ids is None:
+        accepted = Friend.status == 'accepted'
+        ids = frozenset(
+            other_id for (other_id,) in
+            db.session.query(Friend.friend_id).filter(Friend.user_id == user_id, accepted)
+            .union_all(db.session.query(Friend.user_id).filter(Friend.friend_id == user_id, accepted))
+        )
+        friend_cache.set(user_id, ids)
+    return ids
+
+
+def are_friends(user_id, other_id):
+    return other_id in friend_ids(user_id)
+
+
+def friend_users(user_id, *columns):
+    """user_id's accepted friends ordered by username, as rows of the given User columns (whole Users if none)."""
+    ids = friend_ids(user_id)
+    if not ids:
+        return []
+    query = db.session.query(*columns) if columns else User.query
+    return query.filter(User.id.in_(ids)).order_by(User.username).all()
+
+
+def incoming_requests(user_id):
+    """Friend rows for requests other users sent to user_id, pending or accepted, with the sender loaded."""
+    return (
+        Friend.query
+        .options(joinedload(Friend.sender))
+        .filter(or_(Friend.user_id == user_id, Friend.friend_id == user_id), Friend.requested_by != user_id)
+        .order_by(Friend.status.desc(), Friend.requested_by)
+        .all()
+    )
+
+
+def invalidate_friends(*user_ids):
+    """Drop the cached friends of the given users."""
+    for user_id in user_ids:
+        friend_cache.pop(user_id)
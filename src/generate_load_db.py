@@ -0,0 +1,386 @@
+"""Generate a large, reproducible database for load and performance testing.
+
+Run from src with, for example:
+
+    python generate_load_db.py --users 100000 --tournaments 50000 --players 16
+
+Unlike generate_test_db.py, which builds a small hand-made fixture, every
+value here comes from one random generator seeded with --seed, ids are
+assigned up front and timestamps count from a fixed date, so the same flags
+always give the same rows. Rows are written with executemany in batches of
+--batch-size, so millions of rows load in minutes on SQLite or PostgreSQL.
+The target database (--database, or DATABASE_URL) is emptied first.
+
+Tournaments are drafts, active or completed. Active and completed ones are
+played out the way the app would: Swiss rounds pair players on the same
+score, round robins follow a stored round_robin_schedule and single
+elimination tournaments advance winners through a stored bracket. Stored
+results (with their round by round aggregates) and user stats are filled in
+from the completed rounds.
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+from collections import namedtuple
+from sqlalchemy import text
+from app import create_app
+from bracket import build_bracket, round_pairings
+from config import DeploymentConfig, PostgresConfig
+from db import db
+from models import BracketSlot, Friend, Match, Round, Tournament, TournamentPlayer, TournamentResult, User
+from rankings import new_player_stats, rank_players, stored_aggregates, tally_matches
+from round_robin import pack_schedule, round_robin_schedule
+from user_stats import rebuild_user_stats
+
+FIRST_NAMES = ["Alex", "Sam", "Chris", "Taylor", "Jordan", "Morgan", "Casey", "Jamie", "Pat", "Robin",
+               "Riley", "Avery", "Quinn", "Drew", "Skyler", "Reese", "Harper", "Rowan", "Emerson", "Kai"]
+LAST_NAMES = ["Smith", "Johnson", "Lee", "Garcia", "Wilson", "Brown", "Taylor", "Martinez", "Nguyen", "Chen",
+              "Davis", "Miller", "Clark", "Lewis", "Walker", "Young", "King", "Wright", "Scott", "Green"]
+GAME_TYPES = ["Pokémon TCG", "Chess", "Magic: The Gathering", "Checkers", "YuGiOh", "One Piece Card Game"]
+FORMATS = ["swiss", "round robin", "single elimination"]
+# Half of all tournaments are finished, a third are being played and the rest are drafts
+STATUSES = ["completed", "completed", "completed", "active", "active", "draft"]
+# Everyone's password is password123. Hashing is slow on purpose and salted at
+# random, so the hash is worked out once here rather than on every run
+PASSWORD_HASH = ("scrypt:32768:8:1$28aDlpRaexWBYJu0$037e1a7756d56b7cb961bf62a9c4f7a0409bf648da280bf35654888ae64d"
+                 "c19674eb48869203c9d523cfe72658e5abb43026672beb4faf26de5cb34c34dde942")
+# Timestamps count from here so runs on different days give the same rows
+EPOCH = datetime.datetime(2025, 1, 1)
+
+# Tables in the order they are written, so foreign keys always point back
+TABLES = [User, Friend, Tournament, TournamentPlayer, Round, BracketSlot, Match, TournamentResult]
+
+MatchRow = namedtuple('MatchRow', ['player1_id', 'player2_id', 'winner_id', 'is_bye'])
+
+
+class BatchWriter:
+    """Hands out ids and buffers rows per table, writing them with executemany.
+
+    Whenever a table has batch_size rows waiting, every buffer is written in
+    TABLES order and committed. Rows are added parents first, so no row ever
+    reaches the database before the rows it refers to.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.buffers = {model: [] for model in TABLES}
+        self.next_ids = {model: 1 for model in TABLES}
+        self.counts = {model.__tablename__: 0 for model in TABLES}
+
+    def next_id(self, model):
+        model_id = self.next_ids[model]
+        self.next_ids[model] += 1
+        return model_id
+
+    def add(self, model, rows):
+        buffer = self.buffers[model]
+        buffer.extend(rows)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.buffers.items():
+            if rows:
+                db.session.execute(model.__table__.insert(), rows)
+                self.counts[model.__tablename__] += len(rows)
+                rows.clear()
+        db.session.commit()
+
+
+def add_users(writer, rng, num_users):
+    for _ in range(num_users):
+        user_id = writer.next_id(User)
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        writer.add(User, [{
+            'id': user_id,
+            'username': f"{first_name}{last_name[0]}{user_id}",
+            'email': f"player{user_id}@example.com",
+            'first_name': first_name,
+            'last_name': last_name,
+            'password_hash': PASSWORD_HASH,
+            'show_win_rate': rng.random() < 0.5,
+            'show_total_wins_played': rng.random() < 0.5,
+            'show_last_three': rng.random() < 0.5,
+            'show_best_three': rng.random() < 0.5,
+            'show_admin': False,
+            'created_at': EPOCH + datetime.timedelta(minutes=user_id),
+            'avatar_path': 'uploads/avatars/defaultAvatar.jpg',
+            'preferred_game_type': rng.choice(GAME_TYPES),
+            'preferred_top3_sorting': rng.choice(['wins', 'winrate'])
+        }])
+
+
+def add_friendships(writer, rng, num_users, friends_per_user):
+    """friends_per_user requests sent by each user, nine in ten of them accepted.
+
+    User u sends to u + k (wrapping round) for distinct k of less than half
+    the number of users, so no two users are ever linked twice in either
+    direction.
+    """
+    reach = (num_users - 1) // 2
+    for user_id in range(1, num_users + 1):
+        recipients = [(user_id + offset - 1) % num_users + 1
+                      for offset in rng.sample(range(1, reach + 1), min(friends_per_user, reach))]
+        writer.add(Friend, [
+            {
+                'user_id': min(user_id, recipient_id),
+                'friend_id': max(user_id, recipient_id),
+                'requested_by': user_id,
+                'status': 'accepted' if rng.random() < 0.9 else 'pending'
+            }
+            for recipient_id in recipients
+        ])
+
+
+def swiss_pairs(rng, player_ids, wins, had_bye):
+    """Pair players down the standings, random among equal scores.
+
+    With an odd number of players the lowest placed player who has not had
+    a bye yet gets one (player2_id None).
+    """
+    standings = sorted(player_ids, key=lambda pid: (-wins[pid], rng.random()))
+    pairs = []
+    if len(standings) % 2:
+        bye = next((pid for pid in reversed(standings) if pid not in had_bye), standings[-1])
+        standings.remove(bye)
+        had_bye.add(bye)
+        pairs.append((bye, None))
+    return [(standings[i], standings[i + 1]) for i in range(0, len(standings), 2)] + pairs
+
+
+def play_tournament(writer, rng, tournament_id, tournament_format, player_ids, total_rounds, active):
+    """Play out a started tournament with random winners.
+
+    total_rounds only applies to Swiss; the other formats take as many
+    rounds as their schedule or bracket needs. A completed tournament plays
+    every round, an active one a random number of them followed by a round
+    under way with no results. Returns (total_rounds, packed round robin
+    schedule or None, rows per model, completed matches, rounds completed).
+    """
+    rows = {Round: [], Match: [], BracketSlot: []}
+    schedule = bracket = None
+    if tournament_format == 'round robin':
+        seating = list(player_ids)
+        rng.shuffle(seating)
+        schedule = round_robin_schedule(seating)
+        total_rounds = len(schedule)
+    elif tournament_format == 'single elimination':
+        seeds = list(player_ids)
+        rng.shuffle(seeds)
+        slots = build_bracket(seeds)
+        size = (len(slots) + 1) // 2
+        bracket = {slot: player_id for slot, (_, player_id) in slots.items() if player_id is not None}
+        total_rounds = size.bit_length() - 1
+    wins = dict.fromkeys(player_ids, 0)
+    had_bye = set()
+
+    rounds_played = rng.randrange(total_rounds) if active else total_rounds
+    completed = []
+    for round_number in range(1, rounds_played + active + 1):
+        finished = round_number <= rounds_played
+        if bracket is not None:
+            pairings = round_pairings(bracket, size, round_number)
+        else:
+            pairs = schedule[round_number - 1] if schedule else swiss_pairs(rng, player_ids, wins, had_bye)
+            pairings = [(None, player1_id, player2_id) for player1_id, player2_id in pairs]
+
+        round_id = writer.next_id(Round)
+        rows[Round].append({
+            'id': round_id,
+            'tournament_id': tournament_id,
+            'round_number': round_number,
+            'status': 'completed' if finished else 'in progress'
+        })
+        for winner_slot, player1_id, player2_id in pairings:
+            is_bye = player2_id is None
+            winner_id = None
+            if finished:
+                winner_id = player1_id if is_bye else rng.choice((player1_id, player2_id))
+                wins[winner_id] += 1
+                completed.append(MatchRow(player1_id, player2_id, winner_id, is_bye))
+                if bracket is not None:
+                    bracket[winner_slot] = winner_id
+            rows[Match].append({
+                'id': writer.next_id(Match),
+                'round_id': round_id,
+                'player1_id': player1_id,
+                'player2_id': player2_id,
+                'winner_id': winner_id,
+                'status': 'completed' if finished else 'in progress',
+                'notes': None,
+                'is_bye': is_bye,
+                'bracket_slot': winner_slot
+            })
+
+    if bracket is not None:
+        rows[BracketSlot] = [
+            {
+                'id': writer.next_id(BracketSlot),
+                'tournament_id': tournament_id,
+                'slot': slot,
+                'seed': seed,
+                'player_id': bracket.get(slot)
+            }
+            for slot, (seed, _) in slots.items()
+        ]
+    return total_rounds, schedule and pack_schedule(schedule), rows, completed, rounds_played
+
+
+def result_rows(writer, tournament_id, tournament_format, game_type, player_ids, completed, rounds_applied):
+    """TournamentResult rows for the completed rounds, as update_tournament_results stores them."""
+    stats = tally_matches({pid: new_player_stats() for pid in player_ids}, completed)
+    return [
+        {
+            'id': writer.next_id(TournamentResult),
+            'tournament_id': tournament_id,
+            'player_id': entry['player_id'],
+            'game_type': game_type,
+            'rank': rank,
+            'wins': entry['wins'],
+            'losses': entry['losses'],
+            'opponent_win_percentage': entry['owp'],
+            'opp_opp_win_percentage': entry['oowp'],
+            'rounds_applied': rounds_applied,
+            **stored_aggregates(entry, stats)
+        }
+        for rank, entry in enumerate(rank_players(tournament_format, stats), 1)
+    ]
+
+
+def add_tournament(writer, rng, num_users, num_players, tournament_format, swiss_rounds):
+    tournament_id = writer.next_id(Tournament)
+    status = rng.choice(STATUSES)
+    game_type = rng.choice(GAME_TYPES)
+    created_by = rng.randint(1, num_users)
+    created_at = EPOCH + datetime.timedelta(seconds=rng.randrange(365 * 24 * 60 * 60))
+    include_creator = rng.random() < 0.5
+
+    # About half the field are friends with accounts, the rest are guests
+    registered = rng.sample(range(1, num_users + 1), min(num_players // 2 + 1, num_users))
+    registered = [user_id for user_id in registered if user_id != created_by][:num_players // 2]
+    if include_creator:
+        registered = [created_by] + registered[:num_players // 2 - 1]
+    players = [
+        {'id': writer.next_id(TournamentPlayer), 'tournament_id': tournament_id, 'user_id': user_id,
+         'guest_firstname': None, 'guest_lastname': None, 'email': None, 'is_confirmed': True}
+        for user_id in registered
+    ]
+    while len(players) < num_players:
+        player_id = writer.next_id(TournamentPlayer)
+        players.append({
+            'id': player_id, 'tournament_id': tournament_id, 'user_id': None,
+            'guest_firstname': rng.choice(FIRST_NAMES), 'guest_lastname': rng.choice(LAST_NAMES),
+            'email': f"guest{player_id}@example.com" if rng.random() < 0.5 else None, 'is_confirmed': True
+        })
+    player_ids = [player['id'] for player in players]
+
+    total_rounds, schedule, rows, completed, rounds_played = None, None, {}, [], 0
+    if status != 'draft':
+        total_rounds, schedule, rows, completed, rounds_played = play_tournament(
+            writer, rng, tournament_id, tournament_format, player_ids, swiss_rounds, status == 'active')
+
+    writer.add(Tournament, [{
+        'id': tournament_id,
+        'title': f"{game_type} {tournament_format.title()} #{tournament_id}",
+        'game_type': game_type,
+        'format': tournament_format,
+        'created_by': created_by,
+        'status': status,
+        'num_players': num_players,
+        'round_time_minutes': rng.choice([15, 30, 45, 60]),
+        'total_rounds': total_rounds,
+        'include_creator_as_player': include_creator,
+        'start_time': created_at + datetime.timedelta(days=1) if status != 'draft' else None,
+        'created_at': created_at,
+        'version': 0,
+        'double_round_robin': False,
+        'publish_all_rounds': False,
+        'round_robin_schedule': schedule
+    }])
+    writer.add(TournamentPlayer, players)
+    for model in (Round, BracketSlot, Match):
+        writer.add(model, rows.get(model, []))
+    if rounds_played:
+        writer.add(TournamentResult, result_rows(writer, tournament_id, tournament_format, game_type,
+                                                 player_ids, completed, rounds_played))
+
+
+def reset_sequences():
+    """Move PostgreSQL id sequences past the ids written here."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in TABLES:
+        if 'id' in model.__table__.c:
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+            ))
+    db.session.commit()
+
+
+def generate(users, friends_per_user, tournaments, players, formats=FORMATS, rounds=5, seed=0, batch_size=10000):
+    """Fill the (empty) database and return the number of rows written per table."""
+    rng = random.Random(seed)
+    writer = BatchWriter(batch_size)
+    add_users(writer, rng, users)
+    add_friendships(writer, rng, users, friends_per_user)
+    for number in range(tournaments):
+        add_tournament(writer, rng, users, players, formats[number % len(formats)], rounds)
+    writer.flush()
+    reset_sequences()
+    counts = dict(writer.counts)
+    counts['user_stats'] = rebuild_user_stats()
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', default=os.getenv('DATABASE_URL') or 'sqlite:///load.db',
+                        help="database URL (default: DATABASE_URL, or instance/load.db)")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--friends-per-user', type=int, default=10, help="friend requests sent by each user")
+    parser.add_argument('--tournaments', type=int, default=5000)
+    parser.add_argument('--players', type=int, default=16, help="players per tournament")
+    parser.add_argument('--formats', default=','.join(FORMATS),
+                        help="comma separated formats, used in turn (default: all three)")
+    parser.add_argument('--rounds', type=int, default=5, help="rounds per Swiss tournament")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=10000, help="rows per executemany")
+    args = parser.parse_args()
+    args.formats = [f.strip() for f in args.formats.split(',')]
+    unknown = set(args.formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+    if args.users < 2 or args.players < 2:
+        parser.error("--users and --players must be at least 2")
+    return args
+
+
+def main():
+    args = parse_args()
+    database = args.database.replace("postgres://", "postgresql://", 1)
+
+    class LoadConfig(PostgresConfig if database.startswith('postgresql') else DeploymentConfig):
+        SQLALCHEMY_DATABASE_URI = database
+        MAIL_QUEUE_WORKERS = 0
+
+    app = create_app(LoadConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        counts = generate(args.users, args.friends_per_user, args.tournaments, args.players,
+                          args.formats, args.rounds, args.seed, args.batch_size)
+        elapsed = time.perf_counter() - start
+
+    for table, count in counts.items():
+        print(f"{table:>20} {count:>12,}")
+    total = sum(counts.values())
+    print(f"{'total':>20} {total:>12,} rows in {elapsed:.1f} s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
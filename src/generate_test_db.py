@@ -230,11 +230,7 @@ def add_friendships():
     ]
     
     for user_id, friend_id, status in friendships:
-        new_friendship = Friend(
-            user_id=user_id,
-            friend_id=friend_id,
-            status=status
-        )
+        new_friendship = Friend.between(user_id, friend_id, status)
         db.session.add(new_friendship)
     
     db.session.commit()
@@ -520,12 +516,7 @@ def add_tournament_players(created_tournaments):
         ).all()
         
         # Get friend IDs (excluding the creator)
-        friend_ids = set()
-        for friendship in creator_friends:
-            if friendship.user_id == creator_id:
-                friend_ids.add(friendship.friend_id)
-            else:
-                friend_ids.add(friendship.user_id)
+        friend_ids = {friendship.other(creator_id) for friendship in creator_friends}
         
         # Convert to list of User objects
         available_friends = [user for user in users if user.id in friend_ids]
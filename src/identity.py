@@ -0,0 +1,54 @@
+"""The logged in user, read from the database at most once per IDENTITY_CACHE_SECONDS.
+
+Flask-Login calls load_user at the start of every authenticated request,
+which used to SELECT the users row each time. Now the row's column values
+are kept in identity_cache, and each request gets its own User built from
+them and attached to its session without a query. It behaves like a loaded
+User: relationships lazy load, changes are flushed as UPDATEs and a commit
+expires it as usual.
+
+Any flush that changes or deletes a User drops that user's entry, once at
+the flush and again at the commit, so a request that read the old row in
+between cannot leave it cached.
+"""
+from itertools import chain
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from db import db, identity_cache
+from models import User
+
+
+def column_values(user):
+    return {attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs}
+
+
+def load_user(user_id):
+    """The User with this id attached to the current session, or None if there is no such user."""
+    values = identity_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            identity_cache.set(user_id, column_values(user))
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_identity(*user_ids):
+    """Drop the cached rows of the given users."""
+    for user_id in user_ids:
+        identity_cache.pop(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def forget_changed_users(session, flush_context):
+    user_ids = {obj.id for obj in chain(session.dirty, session.deleted) if isinstance(obj, User)}
+    if user_ids:
+        invalidate_identity(*user_ids)
+        session.info.setdefault('changed_user_ids', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def forget_committed_users(session):
+    invalidate_identity(*session.info.pop('changed_user_ids', ()))
@@ -0,0 +1,151 @@
+"""Background delivery for tournament emails.
+
+Routes render a message body once and hand it to mail_queue.enqueue, which
+returns straight away. Worker threads send the queued messages in batches
+over one SMTP connection per batch, retry dropped connections with a growing
+delay and keep a send status per tournament that the pages can poll.
+
+The queue lives in memory, so anything still queued when the process exits
+is not sent.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from flask_mail import BadHeaderError, Message
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# status is the send status dict the job's sends and failures are counted in
+MailJob = namedtuple('MailJob', ['app', 'tournament_id', 'kind', 'subject', 'html', 'recipients', 'status'])
+
+# Errors that only affect one message; the connection can be reused for the rest
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, BadHeaderError, AssertionError)
+
+
+class MailQueue:
+    """Queue of outgoing emails served by a small pool of worker threads.
+
+    Worker count, batch size, attempts and retry delay are read from the
+    MAIL_QUEUE_* config keys when init_app is called. Workers are started on
+    the first enqueue rather than at import time. Send statuses are kept for
+    the MAIL_QUEUE_STATUS_LIMIT tournaments that most recently sent or
+    checked on emails.
+    """
+
+    def __init__(self, mail, workers=2, batch_size=50, max_attempts=3, retry_delay=2.0):
+        self.mail = mail
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._statuses = LRUCache('MAIL_QUEUE_STATUS_LIMIT', 1024)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.get('MAIL_QUEUE_WORKERS', self.workers)
+        self.batch_size = app.config.get('MAIL_QUEUE_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('MAIL_QUEUE_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_delay = app.config.get('MAIL_QUEUE_RETRY_DELAY', self.retry_delay)
+        self._statuses.init_app(app)
+
+    def enqueue(self, tournament_id, kind, subject, html, recipients):
+        """Queue one message per recipient and return how many were queued.
+
+        kind names the email ('results', 'pairings') so a tournament's status
+        can track both. Queuing the same kind again restarts its status;
+        messages still going out from the earlier send no longer count in it.
+        """
+        recipients = list(dict.fromkeys(r for r in recipients if r))
+        status = {
+            'queued': len(recipients),
+            'sent': 0,
+            'failed': [],
+            'finished': not recipients
+        }
+        with self._lock:
+            statuses = dict(self._statuses.get(tournament_id, {}))
+            statuses[kind] = status
+            self._statuses.set(tournament_id, statuses)
+        if not recipients:
+            return 0
+
+        app = current_app._get_current_object()
+        for start in range(0, len(recipients), self.batch_size):
+            batch = recipients[start:start + self.batch_size]
+            self._jobs.put(MailJob(app, tournament_id, kind, subject, html, batch, status))
+        self._start_workers()
+        return len(recipients)
+
+    def status(self, tournament_id):
+        """{kind: {'queued', 'sent', 'failed', 'finished'}} for a tournament's emails."""
+        with self._lock:
+            return {
+                kind: dict(status, failed=list(status['failed']))
+                for kind, status in self._statuses.get(tournament_id, {}).items()
+            }
+
+    def join(self):
+        """Block until every queued message has been sent or given up on."""
+        self._jobs.join()
+
+    def _start_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name='mail-queue', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            pending = list(job.recipients)
+            try:
+                self._deliver(job, pending)
+            except Exception:
+                logger.exception("Mail worker failed on a batch for tournament %s", job.tournament_id)
+                self._record(job, failed=pending)
+            finally:
+                self._jobs.task_done()
+
+    def _deliver(self, job, pending):
+        """Send the job's messages, taking each recipient off pending once it is recorded."""
+        attempt = 0
+        with job.app.app_context():
+            while pending:
+                attempt += 1
+                try:
+                    with self.mail.connect() as connection:
+                        while pending:
+                            recipient = pending[0]
+                            try:
+                                connection.send(Message(subject=job.subject, recipients=[recipient], html=job.html))
+                            except MESSAGE_ERRORS as e:
+                                logger.warning("Could not send %s email to %s: %s", job.kind, recipient, e)
+                                self._record(job, failed=[recipient])
+                            else:
+                                self._record(job, sent=1)
+                            pending.pop(0)
+                except (smtplib.SMTPException, OSError) as e:
+                    if attempt >= self.max_attempts:
+                        logger.error("Giving up on %d %s emails for tournament %s: %s",
+                                     len(pending), job.kind, job.tournament_id, e)
+                        self._record(job, failed=pending)
+                        pending.clear()
+                        return
+                    logger.warning("Mail connection failed (attempt %d): %s", attempt, e)
+                    time.sleep(self.retry_delay * attempt)
+
+    def _record(self, job, sent=0, failed=()):
+        with self._lock:
+            status = job.status
+            status['sent'] += sent
+            status['failed'].extend(failed)
+            status['finished'] = status['sent'] + len(status['failed']) >= status['queued']
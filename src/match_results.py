@@ -0,0 +1,152 @@
+"""Checking and writing submitted match results in bulk.
+
+complete_round and save_results take a list of {'match_id', 'winner_id'}
+results, sent as JSON or uploaded as a CSV file with match_id and winner_id
+columns. The matches they name are loaded with one query, every result is
+checked against them (the match must belong to the round or tournament, the
+winner must be one of its two players and each match may only appear once),
+and the winners are written with a single executemany UPDATE, so a round of
+thousands of matches costs the same few statements as a round of four.
+"""
+import csv
+import io
+from collections import namedtuple
+from sqlalchemy import update
+from db import db
+from models import Match, Round
+
+MatchState = namedtuple('MatchState', ['id', 'round_id', 'player1_id', 'player2_id', 'winner_id', 'is_bye',
+                                       'bracket_slot'])
+
+# Problems listed in an error response; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_results_csv(text):
+    """Results from CSV text with a header row naming match_id and winner_id.
+
+    Other columns (player names, say) are ignored and a blank winner_id
+    clears the result. Raises ValueError if either column is missing.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+    missing = [name for name in ('match_id', 'winner_id') if name not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing the {' and '.join(missing)} column{'s' if len(missing) > 1 else ''}")
+    return [
+        {'match_id': row[columns['match_id']], 'winner_id': row[columns['winner_id']] or None}
+        for row in reader
+    ]
+
+
+def round_matches(round_id):
+    """{match_id: MatchState} for every match of a round."""
+    return matches_where(Match.round_id == round_id)
+
+
+def tournament_matches(tournament_id, match_ids):
+    """{match_id: MatchState} for the given matches that belong to the tournament."""
+    return matches_where(Round.tournament_id == tournament_id, Match.id.in_(match_ids))
+
+
+def bracket_matches(tournament_id, slots):
+    """{bracket_slot: MatchState} for the tournament's matches whose winners move into the given slots."""
+    if not slots:
+        return {}
+    matches = matches_where(Round.tournament_id == tournament_id, Match.bracket_slot.in_(slots))
+    return {match.bracket_slot: match for match in matches.values()}
+
+
+def matches_where(*criteria):
+    rows = (
+        db.session.query(Match.id, Match.round_id, Match.player1_id, Match.player2_id, Match.winner_id,
+                         Match.is_bye, Match.bracket_slot)
+        .join(Round, Match.round_id == Round.id)
+        .filter(*criteria)
+    )
+    return {row.id: MatchState(*row) for row in rows}
+
+
+def submitted_match_ids(match_results):
+    """The match ids in a results list that are whole numbers."""
+    return {
+        match_id for match_id in
+        (as_id(result.get('match_id')) for result in match_results if isinstance(result, dict))
+        if match_id
+    }
+
+
+def as_id(value):
+    """value as a positive integer id, or None if it is not one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 and str(number) == str(value).strip() else None
+
+
+def check_match_results(match_results, matches, scope='round'):
+    """Check submitted results against the matches they may change.
+
+    scope names what matches covers ('round' or 'tournament') in the error
+    messages. Returns ({match_id: winner_id}, errors). A winner_id of None
+    clears a match's result.
+    """
+    winners, errors = {}, []
+    for result in match_results:
+        if not isinstance(result, dict):
+            errors.append(f"Result {result!r} is not a match_id and winner_id pair")
+            continue
+        match_id = as_id(result.get('match_id'))
+        winner = result.get('winner_id')
+        winner_id = None if winner is None or winner == '' else as_id(winner)
+        if match_id is None:
+            errors.append(f"Invalid match id {result.get('match_id')!r}")
+        elif match_id not in matches:
+            errors.append(f"Match {match_id} is not part of this {scope}")
+        elif match_id in winners:
+            errors.append(f"Match {match_id} has more than one result")
+        elif winner_id is None and winner not in (None, ''):
+            errors.append(f"Invalid winner id {winner!r} for match {match_id}")
+        elif winner_id is not None and winner_id not in (matches[match_id].player1_id, matches[match_id].player2_id):
+            errors.append(f"Player {winner_id} is not playing in match {match_id}")
+        else:
+            winners[match_id] = winner_id
+    return winners, errors
+
+
+def error_response_data(errors):
+    """JSON body listing the first MAX_REPORTED_ERRORS problems with a set of results."""
+    return {
+        'success': False,
+        'message': f"{len(errors)} match result{'s are' if len(errors) != 1 else ' is'} invalid",
+        'errors': errors[:MAX_REPORTED_ERRORS],
+        'error_count': len(errors)
+    }
+
+
+def write_winners(winners, status=None):
+    """Set winner_id (and status, if given) on each match in one executemany UPDATE."""
+    if not winners:
+        return
+    extra = {'status': status} if status else {}
+    db.session.execute(update(Match), [
+        {'id': match_id, 'winner_id': winner_id, **extra} for match_id, winner_id in winners.items()
+    ])
+
+
+def replace_players(matches, replacements):
+    """Swap players in the given matches in one executemany UPDATE.
+
+    replacements maps the id of the player to take out to the one to put in.
+    """
+    rows = [
+        {'id': match.id,
+         'player1_id': replacements.get(match.player1_id, match.player1_id),
+         'player2_id': replacements.get(match.player2_id, match.player2_id)}
+        for match in matches if match.player1_id in replacements or match.player2_id in replacements
+    ]
+    if rows:
+        db.session.execute(update(Match), rows)
@@ -0,0 +1,59 @@
+"""Add username search table
+
+Revision ID: 4f8d2c61a7b3
+Revises: e6f101aa1b3f
+Create Date: 2026-10-18 20:12:05.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8d2c61a7b3'
+down_revision = 'e6f101aa1b3f'
+branch_labels = None
+depends_on = None
+
+
+# Trigram FTS5 index of usernames for the player search (see username_index.py).
+# SQLite only; a batch migration that rebuilds the users table drops these
+# triggers, so such a migration must create them again afterwards.
+TRIGGERS = {
+    'user_search_insert': "AFTER INSERT ON users BEGIN "
+                          "INSERT INTO user_search(rowid, username) VALUES (new.id, new.username); END",
+    'user_search_delete': "AFTER DELETE ON users BEGIN "
+                          "INSERT INTO user_search(user_search, rowid, username) "
+                          "VALUES ('delete', old.id, old.username); END",
+    'user_search_update': "AFTER UPDATE OF username ON users BEGIN "
+                          "INSERT INTO user_search(user_search, rowid, username) "
+                          "VALUES ('delete', old.id, old.username); "
+                          "INSERT INTO user_search(rowid, username) VALUES (new.id, new.username); END",
+}
+
+
+def supports_fts5_trigram(bind):
+    if bind.dialect.name != 'sqlite':
+        return False
+    version = bind.exec_driver_sql("SELECT sqlite_version()").scalar()
+    has_fts5 = bind.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()
+    return bool(has_fts5) and tuple(int(part) for part in version.split('.')[:2]) >= (3, 34)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not supports_fts5_trigram(bind):
+        return
+    op.execute("CREATE VIRTUAL TABLE user_search USING fts5("
+               "username, content='users', content_rowid='id', tokenize='trigram')")
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+    op.execute("INSERT INTO user_search(user_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS user_search")
@@ -0,0 +1,57 @@
+"""Store each friendship once
+
+Revision ID: c3e57a9b1d24
+Revises: 4f8d2c61a7b3
+Create Date: 2026-10-18 20:41:37.904215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e57a9b1d24'
+down_revision = '4f8d2c61a7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('friends', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('requested_by', sa.Integer(), nullable=True))
+
+    # Rows were (sender, recipient). Two users who each sent the other a
+    # request want to be friends, so the pair becomes one accepted row,
+    # credited to the lower id's request. Every other row is put in
+    # (lower id, higher id) order and remembers its sender.
+    op.execute("UPDATE friends SET requested_by = user_id")
+    op.execute("DELETE FROM friends WHERE user_id = friend_id")
+    op.execute(
+        "UPDATE friends SET status = 'accepted' WHERE user_id < friend_id AND EXISTS "
+        "(SELECT 1 FROM friends AS mirror WHERE mirror.user_id = friends.friend_id "
+        "AND mirror.friend_id = friends.user_id)"
+    )
+    op.execute(
+        "DELETE FROM friends WHERE user_id > friend_id AND EXISTS "
+        "(SELECT 1 FROM friends AS mirror WHERE mirror.user_id = friends.friend_id "
+        "AND mirror.friend_id = friends.user_id)"
+    )
+    op.execute("UPDATE friends SET user_id = friend_id, friend_id = user_id WHERE user_id > friend_id")
+
+    with op.batch_alter_table('friends', schema=None) as batch_op:
+        batch_op.alter_column('requested_by', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_friends_requested_by_users', 'users', ['requested_by'], ['id'],
+                                    ondelete='CASCADE')
+        batch_op.create_check_constraint('canonical_check', 'user_id < friend_id')
+
+
+def downgrade():
+    with op.batch_alter_table('friends', schema=None) as batch_op:
+        batch_op.drop_constraint('canonical_check', type_='check')
+        batch_op.drop_constraint('fk_friends_requested_by_users', type_='foreignkey')
+
+    # Back to (sender, recipient) rows
+    op.execute("UPDATE friends SET user_id = friend_id, friend_id = user_id WHERE requested_by = friend_id")
+
+    with op.batch_alter_table('friends', schema=None) as batch_op:
+        batch_op.drop_column('requested_by')
@@ -1,7 +1,6 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.sql import func
-from db import db
+from db import db, password_hasher
 
 # Import db at module level but don't use it until after initialization
 
@@ -25,29 +24,44 @@ class User(UserMixin, db.Model):
     preferred_top3_sorting = db.Column(db.String(10), default='wins')  # 'wins' / 'winrate'
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        # Hashed with an older method or work factor than PASSWORD_HASH_METHOD
+        return password_hasher.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}')>"
 
 class Friend(db.Model):
+    # One row per pair of users, whoever sent the request: user_id is always
+    # the lower of the two ids and requested_by says which of them asked
     __tablename__ = 'friends'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
     friend_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     status = db.Column(db.Text, nullable=False)
 
     __table_args__ = (
         db.CheckConstraint("status IN ('pending', 'accepted')", name='status_check'),
+        db.CheckConstraint("user_id < friend_id", name='canonical_check'),
+        # The primary key covers lookups by user_id, this one lookups by friend_id
+        db.Index('ix_friends_friend_status', 'friend_id', 'status'),
     )
-    sender    = db.relationship('User',
-                                foreign_keys=[user_id],
-                                backref=db.backref('sent_requests',  lazy='dynamic'))
-    recipient = db.relationship('User',
-                                foreign_keys=[friend_id],
-                                backref=db.backref('incoming_requests', lazy='dynamic'))
+    sender = db.relationship('User', foreign_keys=[requested_by])
+
+    @classmethod
+    def between(cls, sender_id, recipient_id, status='pending'):
+        """The row for a friend request from sender_id to recipient_id."""
+        low, high = sorted((sender_id, recipient_id))
+        return cls(user_id=low, friend_id=high, requested_by=sender_id, status=status)
+
+    def other(self, user_id):
+        """The other user in the pair."""
+        return self.friend_id if self.user_id == user_id else self.user_id
 
 
 class Tournament(db.Model):
@@ -64,9 +78,16 @@ class Tournament(db.Model):
     include_creator_as_player = db.Column(db.Boolean, default=False)
     start_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, server_default=func.now())
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped whenever standings change
+    double_round_robin = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    publish_all_rounds = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    round_robin_schedule = db.Column(db.Text)  # JSON: each round's player ids, two per match (see round_robin.py)
 
     __table_args__ = (
         db.CheckConstraint("format IN ('round robin', 'swiss', 'single elimination')", name='format_check'),
+        # A host's tournaments by status, newest first, and the public feed of active tournaments
+        db.Index('ix_tournaments_creator_status_created', 'created_by', 'status', 'created_at'),
+        db.Index('ix_tournaments_status_created', 'status', 'created_at'),
     )
 
 class TournamentPlayer(db.Model):
@@ -79,6 +100,15 @@ class TournamentPlayer(db.Model):
     email = db.Column(db.Text)
     is_confirmed = db.Column(db.Boolean, default=False)
 
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_tournament_players_tournament', 'tournament_id'),
+        db.Index('ix_tournament_players_user', 'user_id', 'tournament_id'),
+        # Guest entries waiting to be linked to an account at signup
+        db.Index('ix_tournament_players_email', 'email', 'user_id'),
+    )
+
 class Round(db.Model):
     __tablename__ = 'rounds'
     id = db.Column(db.Integer, primary_key=True)
@@ -88,6 +118,7 @@ class Round(db.Model):
 
     __table_args__ = (
         db.CheckConstraint("status IN ('not started', 'in progress', 'completed')", name='round_status_check'),
+        db.Index('ix_rounds_tournament_number', 'tournament_id', 'round_number'),
     )
 
 class Match(db.Model):
@@ -100,9 +131,23 @@ class Match(db.Model):
     status = db.Column(db.Text, default='not started', nullable=False)
     notes = db.Column(db.Text)
     is_bye = db.Column(db.Boolean, default=False)
+    bracket_slot = db.Column(db.Integer)  # single elimination: the BracketSlot.slot the winner moves into
     
     __table_args__ = (
         db.CheckConstraint("status IN ('not started', 'in progress', 'completed')", name='match_status_check'),
+        db.Index('ix_matches_round_status', 'round_id', 'status'),
+    )
+
+class BracketSlot(db.Model):
+    __tablename__ = 'bracket_slots'
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id', ondelete='CASCADE'), nullable=False)
+    slot = db.Column(db.Integer, nullable=False)  # heap numbering: 1 is the champion, children of s are 2s and 2s + 1
+    seed = db.Column(db.Integer)
+    player_id = db.Column(db.Integer, db.ForeignKey('tournament_players.id', ondelete='SET NULL'))
+
+    __table_args__ = (
+        db.UniqueConstraint('tournament_id', 'slot', name='bracket_slot_unique'),
     )
 
 class TournamentResult(db.Model):
@@ -116,6 +161,16 @@ class TournamentResult(db.Model):
     losses = db.Column(db.Integer, default=0)
     opponent_win_percentage = db.Column(db.Float)
     opp_opp_win_percentage = db.Column(db.Float)
+    # Running aggregates so standings can be updated one round at a time
+    opponent_ids = db.Column(db.Text)  # JSON list of opponent player ids, one entry per game
+    head_to_head = db.Column(db.Text)  # JSON object of {opponent player id: wins against them}
+    rounds_applied = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.Index('ix_tournament_results_tournament_player', 'tournament_id', 'player_id'),
+        # A player's own result, and a user's history joined through tournament_players
+        db.Index('ix_tournament_results_player', 'player_id'),
+    )
 
 class UserStat(db.Model):
     __tablename__ = 'user_stats'
@@ -127,6 +182,10 @@ class UserStat(db.Model):
     games_lost = db.Column(db.Integer, default=0)
     win_percentage = db.Column(db.Float)
 
+    __table_args__ = (
+        db.Index('ix_user_stats_user_game', 'user_id', 'game_type'),
+    )
+
 class Invite(db.Model):
     __tablename__ = 'invite'
     id = db.Column(db.Integer, primary_key=True)
@@ -138,4 +197,8 @@ class Invite(db.Model):
 
     tournament = db.relationship('Tournament', backref=db.backref('invites', lazy='dynamic'))
     sender     = db.relationship('User', foreign_keys=[sender_id])
-    recipient  = db.relationship('User', foreign_keys=[recipient_id])
\ No newline at end of file
+    recipient  = db.relationship('User', foreign_keys=[recipient_id])
+
+    __table_args__ = (
+        db.Index('ix_invite_recipient_tournament', 'recipient_id', 'tournament_id'),
+    )
\ No newline at end of file
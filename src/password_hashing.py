@@ -0,0 +1,82 @@
+"""Password hashing and checking in a pool of worker processes.
+
+Hashing is deliberately slow (scrypt takes around a tenth of a second of
+CPU), so when many players sign up or log in at once, the hashes run on
+the request threads and crowd every other request off the CPU. With
+PASSWORD_HASH_WORKERS above 0 the work goes to that many worker processes
+instead: at most that many hashes run at once, however many logins are
+waiting, and the rest of the app keeps the remaining CPU time. 0 hashes on
+the request thread, as before.
+
+PASSWORD_HASH_METHOD is the werkzeug method and work factor new hashes
+use, for example 'scrypt:32768:8:1' or 'pbkdf2:sha256:1000000'. A stored
+hash made with a different method or factor still checks out, and
+needs_rehash tells the login route to replace it while it has the password.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def method_of(password_hash):
+    """The method and work factor part of a werkzeug hash, e.g. 'scrypt:32768:8:1'."""
+    return password_hash.split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Hashes and checks passwords, in worker processes when configured to."""
+
+    def __init__(self, method='scrypt:32768:8:1', workers=0):
+        self.method = method
+        self.workers = workers
+        self._pool = None
+        self._current_method = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self._current_method = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with another method or work factor than new ones are."""
+        if self._current_method is None:
+            # werkzeug fills in the defaults of a bare method name such as 'scrypt'
+            self._current_method = method_of(generate_password_hash('', self.method))
+        return method_of(password_hash) != self._current_method
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+        try:
+            return self._get_pool().submit(function, *args).result()
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory); start a fresh pool next time
+            self.shutdown()
+            return function(*args)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned rather than forked, so workers don't inherit the app's
+                # database connections, locks and mail threads
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
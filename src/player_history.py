@@ -0,0 +1,209 @@
+"""Per-user tournament history shared by the account, analytics and profile pages.
+
+Everything returned here is plain data (no ORM instances), so it can be kept
+in player_history_cache between requests. Entries are keyed on (user_id,
+what was asked for), kept for at most PLAYER_HISTORY_CACHE_SECONDS and
+dropped as soon as this process changes one of that user's results or a
+tournament they host.
+"""
+from collections import defaultdict, namedtuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from db import db, player_history_cache
+from models import User, Tournament, TournamentPlayer, TournamentResult
+
+ResultSummary = namedtuple('ResultSummary', [
+    'id', 'tournament_id', 'game_type', 'rank', 'wins', 'losses',
+    'opponent_win_percentage', 'opp_opp_win_percentage'
+])
+TournamentSummary = namedtuple('TournamentSummary', [
+    'id', 'title', 'format', 'game_type', 'status', 'round_time_minutes', 'created_at'
+])
+
+
+class PlayerHistory:
+    """A user's results grouped the ways the stats pages display them.
+
+    results is a list of (ResultSummary, TournamentSummary) pairs;
+    grouped_by_wins and grouped_by_winrate map game type to those pairs,
+    best first; last_three holds the three most recent tournaments.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+        self.grouped_by_wins = defaultdict(list)
+        for result, tournament in results:
+            self.grouped_by_wins[tournament.game_type].append((result, tournament))
+        for entries in self.grouped_by_wins.values():
+            entries.sort(key=lambda x: x[0].wins, reverse=True)
+
+        self.grouped_by_winrate = {
+            game_type: sorted(entries, key=lambda x: win_rate(x[0]), reverse=True)
+            for game_type, entries in self.grouped_by_wins.items()
+        }
+
+        self.last_three = sorted(results, key=lambda x: x[1].created_at, reverse=True)[:3]
+
+    @property
+    def game_types(self):
+        return list(self.grouped_by_wins.keys())
+
+
+def win_rate(result):
+    total = result.wins + result.losses
+    return result.wins / total if total > 0 else 0
+
+
+def get_player_history(user_id):
+    """Every tournament result for a user, loaded with one query and cached."""
+    key = (user_id, 'history')
+    history = player_history_cache.get(key)
+    if history is None:
+        TP = aliased(TournamentPlayer)
+        rows = (
+            db.session.query(TournamentResult, Tournament)
+            .join(Tournament, TournamentResult.tournament_id == Tournament.id)
+            .join(TP, TournamentResult.player_id == TP.id)
+            .filter(TP.user_id == user_id)
+            .all()
+        )
+        history = PlayerHistory([
+            (_result_summary(result), _tournament_summary(tournament))
+            for result, tournament in rows
+        ])
+        player_history_cache.set(key, history)
+    return history
+
+
+def get_hosted_standings(user_id, limit=None, completed_only=False):
+    """Standings for the tournaments a user most recently hosted.
+
+    Tournaments with fewer than three ranked players are left out. Uses two
+    queries however many tournaments are returned; the second orders each
+    tournament's players and counts them with window functions, so only the
+    rows to show come back.
+    """
+    key = (user_id, 'hosted', limit, completed_only)
+    hosted = player_history_cache.get(key)
+    if hosted is not None:
+        return hosted
+
+    query = Tournament.query.filter_by(created_by=user_id)
+    if completed_only:
+        query = query.filter_by(status='completed')
+    query = query.order_by(Tournament.created_at.desc())
+    if limit:
+        query = query.limit(limit)
+    recent = query.all()
+
+    rows_by_tournament = defaultdict(list)
+    if recent:
+        by_tournament = TournamentPlayer.tournament_id
+        ranked = (
+            select(
+                by_tournament,
+                TournamentPlayer.guest_firstname,
+                TournamentPlayer.guest_lastname,
+                User.username,
+                TournamentResult.wins,
+                TournamentResult.losses,
+                TournamentResult.opponent_win_percentage,
+                TournamentResult.opp_opp_win_percentage,
+                func.row_number().over(
+                    partition_by=by_tournament,
+                    order_by=(func.coalesce(TournamentResult.wins, 0).desc(),
+                              func.coalesce(TournamentResult.opp_opp_win_percentage, 0.0).desc())
+                ).label('position'),
+                func.count().over(partition_by=by_tournament).label('ranked_players')
+            )
+            .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
+            .outerjoin(User, TournamentPlayer.user_id == User.id)
+            .where(by_tournament.in_([t.id for t in recent]))
+            .subquery()
+        )
+        rows = db.session.execute(
+            select(ranked)
+            .where(ranked.c.ranked_players >= 3)
+            .order_by(ranked.c.tournament_id, ranked.c.position)
+        )
+        for row in rows:
+            rows_by_tournament[row.tournament_id].append(row)
+
+    hosted = []
+    for tourney in recent:
+        standings = []
+        for row in rows_by_tournament[tourney.id]:
+            if row.username:
+                display_name = row.username
+            else:
+                first = row.guest_firstname or ""
+                last_initial = row.guest_lastname[0] if row.guest_lastname else ""
+                display_name = f"{first} {last_initial}".strip() or "Unknown"
+
+            standings.append({
+                'username': display_name,
+                'wins':     row.wins,
+                'losses':   row.losses,
+                'owp':      round((row.opponent_win_percentage or 0) * 100, 2),
+                'opp_owp':  round((row.opp_opp_win_percentage or 0) * 100, 2)
+            })
+
+        if not standings:
+            continue
+
+        hosted.append({
+            'id':                   tourney.id,
+            'title':                tourney.title,
+            'format':               tourney.format,
+            'game_type':            tourney.game_type,
+            'round_time_minutes':   tourney.round_time_minutes,
+            'date':                 tourney.created_at.strftime("%d/%m/%Y") if tourney.created_at else "",
+            'standings':            standings
+        })
+
+    player_history_cache.set(key, hosted)
+    return hosted
+
+
+def invalidate_users(*user_ids):
+    """Drop the cached history for the given users."""
+    user_ids = set(user_ids) - {None}
+    if user_ids:
+        player_history_cache.pop_matching(lambda key: key[0] in user_ids)
+
+
+def invalidate_tournament(tournament_id):
+    """Drop the cached history of everyone playing in or hosting a tournament."""
+    user_ids = {
+        user_id for (user_id,) in
+        db.session.query(TournamentPlayer.user_id)
+        .filter(TournamentPlayer.tournament_id == tournament_id, TournamentPlayer.user_id.isnot(None))
+    }
+    user_ids.add(db.session.query(Tournament.created_by).filter_by(id=tournament_id).scalar())
+    invalidate_users(*user_ids)
+
+
+def _result_summary(result):
+    return ResultSummary(
+        id=result.id,
+        tournament_id=result.tournament_id,
+        game_type=result.game_type,
+        rank=result.rank,
+        wins=result.wins or 0,
+        losses=result.losses or 0,
+        opponent_win_percentage=result.opponent_win_percentage or 0.0,
+        opp_opp_win_percentage=result.opp_opp_win_percentage or 0.0
+    )
+
+
+def _tournament_summary(tournament):
+    return TournamentSummary(
+        id=tournament.id,
+        title=tournament.title,
+        format=tournament.format,
+        game_type=tournament.game_type,
+        status=tournament.status,
+        round_time_minutes=tournament.round_time_minutes,
+        created_at=tournament.created_at
+    )
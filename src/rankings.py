@@ -0,0 +1,149 @@
+"""Standings engine shared by live rankings and stored tournament results.
+
+Everything in here works on values that have already been loaded from the
+database, so callers fetch players and matches in bulk and no queries are
+issued while the tiebreakers are worked out.
+"""
+import json
+
+
+def new_player_stats():
+    return {"wins": 0, "losses": 0, "opponents": [], "head_to_head": {}}
+
+
+def stats_from_result(result):
+    """Rebuild a player's running stats from a stored TournamentResult row."""
+    head_to_head = json.loads(result.head_to_head) if result.head_to_head else {}
+    return {
+        "wins": result.wins or 0,
+        "losses": result.losses or 0,
+        "opponents": json.loads(result.opponent_ids) if result.opponent_ids else [],
+        # JSON object keys are strings, player ids are not
+        "head_to_head": {int(opp): wins for opp, wins in head_to_head.items()}
+    }
+
+
+def stored_aggregates(entry, stats):
+    """Columns holding a ranking entry's running aggregates on TournamentResult."""
+    return {
+        "opponent_ids": json.dumps(stats[entry["player_id"]]["opponents"]),
+        "head_to_head": json.dumps(entry["head_to_head"])
+    }
+
+
+def tally_matches(stats, matches):
+    """Apply match outcomes to a {player_id: stats} mapping in place.
+
+    Matches only need player1_id, player2_id, winner_id and is_bye attributes,
+    so both Match objects and column rows can be passed in. Matches without a
+    winner yet (other than byes) are skipped.
+    """
+    for match in matches:
+        p1, p2, winner = match.player1_id, match.player2_id, match.winner_id
+        # Byes: only p1 gets a win
+        if match.is_bye:
+            if p1 in stats:
+                stats[p1]["wins"] += 1
+            continue
+        if winner is None or p1 not in stats:
+            continue
+        # Track opponents
+        if p2 in stats:
+            stats[p1]["opponents"].append(p2)
+            stats[p2]["opponents"].append(p1)
+        # Track wins/losses
+        if winner == p1:
+            stats[p1]["wins"] += 1
+            if p2 in stats:
+                stats[p2]["losses"] += 1
+                stats[p1]["head_to_head"][p2] = stats[p1]["head_to_head"].get(p2, 0) + 1
+        elif winner == p2 and p2 in stats:
+            stats[p2]["wins"] += 1
+            stats[p1]["losses"] += 1
+            stats[p2]["head_to_head"][p1] = stats[p2]["head_to_head"].get(p1, 0) + 1
+    return stats
+
+
+def win_percentage(player_stats):
+    total = player_stats["wins"] + player_stats["losses"]
+    return player_stats["wins"] / total if total > 0 else None
+
+
+def opponent_win_percentage(stats, player_id):
+    """Average win percentage of a player's opponents (opponents with no games are ignored)."""
+    opp_wp = []
+    for opp in stats[player_id]["opponents"]:
+        if opp in stats:
+            wp = win_percentage(stats[opp])
+            if wp is not None:
+                opp_wp.append(wp)
+    return sum(opp_wp) / len(opp_wp) if opp_wp else 0.0
+
+
+def tiebreakers(stats):
+    """Return (owp, oowp) dictionaries for every player in stats."""
+    owp = {pid: opponent_win_percentage(stats, pid) for pid in stats}
+    oowp = {}
+    for pid in stats:
+        opp_owp = [owp[opp] for opp in stats[pid]["opponents"] if opp in owp]
+        oowp[pid] = sum(opp_owp) / len(opp_owp) if opp_owp else 0.0
+    return owp, oowp
+
+
+def rank_players(tournament_format, stats):
+    """Order players using the tiebreak rules for the tournament format.
+
+    Returns a list of entries with player_id, wins, losses, owp, oowp and
+    head_to_head keys, best player first.
+    """
+    if tournament_format == "swiss":
+        owp, oowp = tiebreakers(stats)
+    else:
+        owp, oowp = {}, {}
+
+    ranking = []
+    for pid, player_stats in stats.items():
+        ranking.append({
+            "player_id": pid,
+            "wins": player_stats["wins"],
+            "losses": player_stats["losses"],
+            "owp": owp.get(pid, 0.0),
+            "oowp": oowp.get(pid, 0.0),
+            "head_to_head": player_stats["head_to_head"]
+        })
+
+    if tournament_format == "swiss":
+        ranking.sort(key=lambda x: (-x["wins"], -x["owp"], -x["oowp"]))
+    elif tournament_format == "round robin":
+        # First by wins, then head-to-head if only two tied, else OWP
+        ranking.sort(key=lambda x: -x["wins"])
+        i = 0
+        while i < len(ranking) - 1:
+            j = i
+            # Find group of tied players
+            while j + 1 < len(ranking) and ranking[j]["wins"] == ranking[j+1]["wins"]:
+                j += 1
+            if j > i:
+                tied = ranking[i:j+1]
+                if len(tied) == 2:
+                    a, b = tied[0], tied[1]
+                    # If b beat a more often than the other way round, swap
+                    if b["head_to_head"].get(a["player_id"], 0) > a["head_to_head"].get(b["player_id"], 0):
+                        ranking[i], ranking[i+1] = b, a
+                else:
+                    for entry in tied:
+                        entry["owp"] = opponent_win_percentage(stats, entry["player_id"])
+                    tied.sort(key=lambda x: -x["owp"])
+                    ranking[i:j+1] = tied
+            i = j + 1
+    else:  # single elimination
+        ranking.sort(key=lambda x: -x["wins"])
+
+    return ranking
+
+
+def compute_standings(tournament_format, player_ids, matches):
+    """Tally matches for the given players and return the ranked entries."""
+    stats = {pid: new_player_stats() for pid in player_ids}
+    tally_matches(stats, matches)
+    return rank_players(tournament_format, stats)
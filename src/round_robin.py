@@ -0,0 +1,59 @@
+"""Round robin schedules.
+
+A tournament's whole schedule is worked out once, when it starts, and kept
+on Tournament.round_robin_schedule. It is stored compactly as a JSON list
+with one flat list of player ids per round, two ids per match, and null in
+place of the opponent for a bye:
+
+    [[4, 7, 2, 9, 5, null], [4, 9, 7, 5, 2, null], ...]
+"""
+import json
+
+
+def round_robin_schedule(player_ids, double=False):
+    """Every round of a round robin as lists of (player1_id, player2_id) pairs.
+
+    Uses the circle method: the first player stays put and the others rotate
+    one place each round. With an odd number of players one player sits out
+    each round with a bye (player2_id None). A double round robin repeats the
+    schedule with player1 and player2 swapped.
+    """
+    player_ids = list(player_ids)
+    if len(player_ids) % 2 != 0:
+        player_ids.append(None)  # Add a bye
+    n = len(player_ids)
+    if n < 2:
+        return []
+
+    fixed, rotating = player_ids[0], player_ids[1:]
+    schedule = []
+    for rotation in range(n - 1):
+        rotated = rotating[-rotation:] + rotating[:-rotation]  # rotating[-0:] is the whole list
+        pairs = []
+        for i in range(n // 2):
+            if i == 0:
+                p1, p2 = fixed, rotated[i]
+            else:
+                p1, p2 = rotated[i], rotated[n - 1 - i]
+            # Ensure player1_id is always not None
+            if p1 is None:
+                p1, p2 = p2, None
+            pairs.append((p1, p2))
+        schedule.append(pairs)
+
+    if double:
+        schedule += [
+            [(p2, p1) if p2 is not None else (p1, None) for p1, p2 in pairs]
+            for pairs in schedule
+        ]
+    return schedule
+
+
+def pack_schedule(schedule):
+    """The compact JSON form of a schedule, for Tournament.round_robin_schedule."""
+    return json.dumps([[pid for pair in pairs for pid in pair] for pairs in schedule], separators=(',', ':'))
+
+
+def unpack_schedule(packed):
+    """Turn a stored schedule back into lists of (player1_id, player2_id) pairs."""
+    return [list(zip(flat[::2], flat[1::2])) for flat in json.loads(packed)]
@@ -1,18 +1,31 @@
 import datetime
 import math
 import random
-from flask import render_template, request, redirect, url_for, flash, jsonify, abort
+from flask import current_app, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_user, logout_user, current_user, login_required
-from flask_mail import Message
 from blueprints import main
-from models import Friend, User, UserStat, Tournament, TournamentPlayer, TournamentResult, Match, Round, Invite
-from db import db, mail  # Import db and mail from database instead of app
-from sqlalchemy import func
-from sqlalchemy.orm import aliased
-from collections import defaultdict
+from models import BracketSlot, Friend, User, UserStat, Tournament, TournamentPlayer, TournamentResult, Match, Round, Invite
+from rankings import new_player_stats, rank_players, stats_from_result, stored_aggregates, tally_matches
+from db import db, mail_queue, standings_cache, username_index  # Import db and mail from database instead of app
+from standings_cache import bump_version
+from friend_graph import friend_ids, friend_users, get_edge, incoming_requests, invalidate_friends
+from player_history import get_player_history, get_hosted_standings, invalidate_tournament, invalidate_users
+from user_stats import add_games, apply_result_totals, stat_totals, user_result_totals
+from swiss_pairing import DEFAULT_WINDOW, swiss_pairings
+from tournament_snapshot import TournamentSnapshot
+from standings_query import ranked_standings
+from match_results import (bracket_matches, check_match_results, error_response_data, parse_results_csv,
+                           replace_players, round_matches, submitted_match_ids, tournament_matches, write_winners)
+from round_robin import pack_schedule, round_robin_schedule, unpack_schedule
+from bracket import bracket_rounds, build_bracket, round_pairings
+from sqlalchemy import bindparam, case, func, insert, update
+from sqlalchemy.orm import joinedload
 import os
 from werkzeug.utils import secure_filename
 
+# Tournament cards shown per page on the dashboard
+DASHBOARD_PAGE_SIZE = 24
+
 @main.route('/')
 def landing():
     if current_user.is_authenticated:
@@ -31,6 +44,10 @@ def login():
         user = db.session.query(User).filter_by(username=username).first()
 
         if user and user.verify_password(password):
+            if user.password_needs_rehash():
+                # The password is known now, so bring its hash up to the current work factor
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             flash('Login successful!', 'success')
             return redirect(url_for('main.dashboard'))
@@ -77,6 +94,7 @@ def signup():
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
+        username_index.add(user.id, user.username)
 
         # Re-fetch user to ensure ID is available after commit
         user = db.session.query(User).filter_by(email=email).first()
@@ -109,13 +127,10 @@ def signup():
                         db.session.add(user_stat)
 
                     # Update the user's stats
-                    user_stat.games_played += result.wins + result.losses
-                    user_stat.games_won += result.wins
-                    user_stat.games_lost += result.losses
-                    if user_stat.games_played > 0:
-                        user_stat.win_percentage = user_stat.games_won / user_stat.games_played
+                    add_games(user_stat, result.wins or 0, result.losses or 0)
 
             db.session.commit()
+            invalidate_users(user.id)
             flash('Past results have been successfully added to your account.', 'success')
         else:
             flash('No past results found for this email.', 'info')
@@ -128,123 +143,110 @@ def signup():
 @main.route('/dashboard')
 @login_required
 def dashboard():
-    my_tournaments = Tournament.query.filter_by(created_by=current_user.id).all()
-
-    sent_accepted = Friend.query.filter_by(user_id=current_user.id, status='accepted').all()
-    recv_accepted = Friend.query.filter_by(friend_id=current_user.id, status='accepted').all()
-
-    sent_friends = [f.recipient for f in sent_accepted]
-    recv_friends = [f.sender for f in recv_accepted]
-    
-    all_friend_ids = set()
-    accepted_friends = []
-    
-    for friend in sent_friends + recv_friends:
-        if friend.id not in all_friend_ids:
-            all_friend_ids.add(friend.id)
-            accepted_friends.append(friend)
+    # Friends' usernames, looked up by their cached ids in one query
+    accepted_friend_usernames = [username for (username,) in friend_users(current_user.id, User.username)]
 
-    accepted_friend_usernames = [friend.username for friend in accepted_friends]
-    
     status = request.args.get('status', 'in progress player')
-    N = 5
+    # Keyset cursor: id of the last tournament on the previous page
+    before = request.args.get('before', type=int)
 
     # New filter logic
-    tournaments = []
     if status == 'in progress creator':
-        tournaments = (
-            Tournament.query
-                      .filter_by(status='active', created_by=current_user.id)
-                      .order_by(Tournament.created_at.desc())
-                      .all()
-        )
+        query = Tournament.query.filter_by(status='active', created_by=current_user.id)
     elif status == 'in progress player':
-        tournaments = (
+        query = (
             Tournament.query
                       .filter(Tournament.status == 'active')
                       .join(TournamentPlayer, TournamentPlayer.tournament_id == Tournament.id)
                       .filter(TournamentPlayer.user_id == current_user.id)
                       .filter(Tournament.created_by != current_user.id)
-                      .order_by(Tournament.created_at.desc())
-                      .all()
         )
     elif status == 'draft creator':
-        tournaments = (
-            Tournament.query
-                      .filter_by(status='draft', created_by=current_user.id)
-                      .order_by(Tournament.created_at.desc())
-                      .all()
-        )
+        query = Tournament.query.filter_by(status='draft', created_by=current_user.id)
     elif status == 'draft player':
-        tournaments = (
+        query = (
             Tournament.query
                       .filter(Tournament.status == 'draft')
                       .join(TournamentPlayer, TournamentPlayer.tournament_id == Tournament.id)
                       .filter(TournamentPlayer.user_id == current_user.id)
                       .filter(Tournament.created_by != current_user.id)
-                      .order_by(Tournament.created_at.desc())
-                      .all()
         )
     else:
-        tournaments = (
-            Tournament.query
-                      .filter_by(status='active')
-                      .order_by(Tournament.created_at.desc())
-                      .all()
+        query = Tournament.query.filter_by(status='active')
+
+    if before:
+        # Compare against the cursor row's own created_at so the database
+        # compares values stored in the same format
+        anchor = db.session.query(Tournament.created_at).filter(Tournament.id == before).scalar_subquery()
+        query = query.filter(
+            (Tournament.created_at < anchor) |
+            ((Tournament.created_at == anchor) & (Tournament.id < before))
         )
 
-    for t in tournaments:
-        rounds = Round.query.filter_by(tournament_id=t.id).all()
-        completed = sum(1 for r in rounds if r.status == 'completed')
-        in_progress = any(r.status == 'in progress' for r in rounds)
-        t.current_round = completed + (1 if in_progress else 0)
-        t.completed_rounds = completed
-        # Set is_player attribute for client-side filtering
-        t.is_player = False
-        for player in TournamentPlayer.query.filter_by(tournament_id=t.id).all():
-            if player.user_id == current_user.id:
-                t.is_player = True
-                break
+    tournaments = (
+        query.order_by(Tournament.created_at.desc(), Tournament.id.desc())
+             .limit(DASHBOARD_PAGE_SIZE + 1)
+             .all()
+    )
+    next_cursor = None
+    if len(tournaments) > DASHBOARD_PAGE_SIZE:
+        tournaments = tournaments[:DASHBOARD_PAGE_SIZE]
+        next_cursor = tournaments[-1].id
+
+    add_tournament_card_data(tournaments)
 
     return render_template(
         'dashboard.html',
         tournaments=tournaments,
         accepted_friend_usernames=accepted_friend_usernames,
         status_filter=status,
+        next_cursor=next_cursor,
         current_user=current_user
     )
-  
-@main.route('/analytics')
-@login_required
-def analytics():
-    # User's personal performance data
 
-    TP = aliased(TournamentPlayer)
 
-    all_results = (
-        db.session.query(TournamentResult, Tournament)
-        .join(Tournament, TournamentResult.tournament_id == Tournament.id)
-        .join(TP, TournamentResult.player_id == TP.id)
-        .filter(TP.user_id == current_user.id)
-        .all()
-    )
-
-    grouped_results = defaultdict(list)
-    for result, tournament in all_results:
-        grouped_results[tournament.game_type].append((result, tournament))
-    for game_type in grouped_results:
-        grouped_results[game_type].sort(key=lambda x: x[0].wins, reverse=True)
+def add_tournament_card_data(tournaments):
+    """Set current_round, completed_rounds and is_player on tournaments for the dashboard cards."""
+    tournament_ids = [t.id for t in tournaments]
+    if not tournament_ids:
+        return
+
+    # Round progress for every tournament in one grouped query
+    progress = {
+        tournament_id: (completed or 0, in_progress or 0)
+        for tournament_id, completed, in_progress in (
+            db.session.query(
+                Round.tournament_id,
+                func.sum(case((Round.status == 'completed', 1), else_=0)),
+                func.max(case((Round.status == 'in progress', 1), else_=0))
+            )
+            .filter(Round.tournament_id.in_(tournament_ids))
+            .group_by(Round.tournament_id)
+        )
+    }
+
+    # Tournaments the current user is playing in
+    playing_in = {
+        tournament_id for (tournament_id,) in (
+            db.session.query(TournamentPlayer.tournament_id)
+            .filter(TournamentPlayer.tournament_id.in_(tournament_ids),
+                    TournamentPlayer.user_id == current_user.id)
+            .distinct()
+        )
+    }
 
-    last_3_results = sorted(all_results, key=lambda x: x[1].created_at, reverse=True)[:3]
+    for t in tournaments:
+        completed, in_progress = progress.get(t.id, (0, 0))
+        t.current_round = completed + (1 if in_progress else 0)
+        t.completed_rounds = completed
+        # Set is_player attribute for client-side filtering
+        t.is_player = t.id in playing_in
 
-    grouped_by_winrate = {}
-    for game_type, entries in grouped_results.items():
-        sorted_entries = sorted(
-            entries,
-            key=lambda x: (x[0].wins / (x[0].wins + x[0].losses)) if (x[0].wins + x[0].losses) > 0 else 0,
-            reverse=True
-        )
-        grouped_by_winrate[game_type] = sorted_entries
+@main.route('/analytics')
+@login_required
+def analytics():
+    # User's personal performance data
+    history = get_player_history(current_user.id)
 
     user_stats = db.session.query(UserStat).filter_by(user_id=current_user.id).all()
 
@@ -258,78 +260,26 @@ def analytics():
     except ValueError:
         limit = None  # means "all"
 
-    base_q = (
-        db.session.query(Tournament)
-        .filter_by(created_by=current_user.id, status='completed')  # Add status='completed' filter
-        .order_by(Tournament.created_at.desc())
-    )
-
-    if limit:
-        recent = base_q.limit(limit).all()
-    else:
-        recent = base_q.all()
-
-    recent_tournaments = []
-    for tourney in recent:
-        rows = (
-            db.session.query(TournamentPlayer, TournamentResult, User)
-            .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
-            .outerjoin(User, TournamentPlayer.user_id == User.id)
-            .filter(TournamentPlayer.tournament_id == tourney.id)
-            .all()
-        )
-
-        standings = []
-        for player, result, user in rows:
-            if user:
-                display_name = user.username
-            else:
-                first = player.guest_firstname or ""
-                last_initial = player.guest_lastname[0] if player.guest_lastname else ""
-                display_name = f"{first} {last_initial}".strip() or "Unknown"
-
-            standings.append({
-                'username': display_name,
-                'wins':     result.wins,
-                'losses':   result.losses,
-                'owp':      round(result.opponent_win_percentage * 100, 2),
-                'opp_owp':  round(result.opp_opp_win_percentage   * 100, 2)
-            })
-
-        if len(standings) < 3:
-            continue
-
-        standings.sort(key=lambda p: (p['wins'], p['opp_owp']), reverse=True)
-        recent_tournaments.append({
-            'id':                   tourney.id,
-            'title':                tourney.title,
-            'format':               tourney.format,
-            'game_type':            tourney.game_type,
-            'round_time_minutes':   tourney.round_time_minutes,
-            'date':                 tourney.created_at.strftime("%d/%m/%Y"),
-            'standings':            standings
-        })
+    recent_tournaments = get_hosted_standings(current_user.id, limit=limit, completed_only=True)
 
     return render_template(
         'analytics.html',
         title='Analytics',
         stats=user_stats,
         recent_tournaments=recent_tournaments,
-        grouped_results=grouped_results,
-        grouped_by_winrate=grouped_by_winrate,
-        last_3_results=last_3_results,
+        grouped_results=history.grouped_by_wins,
+        grouped_by_winrate=history.grouped_by_winrate,
+        last_3_results=history.last_three,
         limit=limit_param
     )
 
-    
+
 @main.route('/requests')
 @login_required
 def view_requests():
-    incoming_rels = Friend.query.filter_by(friend_id=current_user.id).all()
-
     incoming = [
         { "fr": fr, "user": fr.sender }
-        for fr in incoming_rels
+        for fr in incoming_requests(current_user.id)
     ]
 
     return render_template('requests.html', incoming=incoming)
@@ -337,144 +287,27 @@ def view_requests():
 @main.route('/account')
 @login_required
 def account():
-    from sqlalchemy.orm import aliased
-    from collections import defaultdict
-    TP = aliased(TournamentPlayer)
-    # ✅ 获取当前用户参与的比赛
-    all_results = (
-        db.session.query(TournamentResult, Tournament)
-        .join(Tournament, TournamentResult.tournament_id == Tournament.id)
-        .join(TP, TournamentResult.player_id == TP.id)
-        .filter(TP.user_id == current_user.id)
-        .all()
-    )
-    # ✅ 分组：wins
-    grouped_results = defaultdict(list)
-    for result, tournament in all_results:
-        grouped_results[tournament.game_type].append((result, tournament))
-    for game_type in grouped_results:
-        grouped_results[game_type].sort(key=lambda x: x[0].wins, reverse=True)
-    # ✅ 最近 3 场
-    last_3_results = sorted(all_results, key=lambda x: x[1].created_at, reverse=True)[:3]
-    # ✅ 胜率排序
-    grouped_by_winrate = {}
-    for game_type, entries in grouped_results.items():
-        sorted_entries = sorted(
-            entries,
-            key=lambda x: (x[0].wins / (x[0].wins + x[0].losses)) if (x[0].wins + x[0].losses) > 0 else 0,
-            reverse=True
-        )
-        grouped_by_winrate[game_type] = sorted_entries
+    history = get_player_history(current_user.id)
 
-    # ✅ 总胜率
-    total_stats = (
-        db.session.query(
-            func.sum(TournamentResult.wins),
-            func.sum(TournamentResult.losses)
-        )
-        .join(TP, TournamentResult.player_id == TP.id)
-        .filter(TP.user_id == current_user.id)
-        .first()
-    )
-    total_wins = total_stats[0] or 0
-    total_losses = total_stats[1] or 0
-    total_games = total_wins + total_losses
-    total_winrate = round(total_wins / total_games * 100, 1) if total_games > 0 else 0.0
-    # ✅ Admin 专属：获取自己主办的比赛及每场前三名
-    hosted_tournaments = (
-        db.session.query(Tournament)
-        .filter_by(created_by=current_user.id)
-        .order_by(Tournament.created_at.desc())
-        .all()
-    )
-    # ✅ Admin 卡片展示：top3 玩家
-    hosted_rankings_by_game = defaultdict(list)
-    for tournament in hosted_tournaments:
-        results = (
-            db.session.query(TournamentResult, TournamentPlayer, User)
-            .join(TournamentPlayer, TournamentResult.player_id == TournamentPlayer.id)
-            .join(User, TournamentPlayer.user_id == User.id)
-            .filter(TournamentResult.tournament_id == tournament.id)
-            .all()
-        )
-        def rank_score(res):
-            total = res.wins + res.losses
-            return res.wins / total if total > 0 else 0
-        top3 = sorted(results, key=lambda r: rank_score(r[0]), reverse=True)[:3]
-        hosted_rankings_by_game[tournament.game_type].append({
-            "tournament": tournament,
-            "top3": top3
-        })
-    # ✅ Admin 卡片展示：所有主办比赛（用于筛选）
-    hosted_by_game = defaultdict(list)
-    for t in hosted_tournaments:
-        hosted_by_game[t.game_type].append(t)
-    hosted_game_types = list(hosted_by_game.keys())
-
-    # ✅ recent_tournaments for admincards（直接复用 analytics 的逻辑）
-    recent_tournaments = []
-    base_q = (
-        db.session.query(Tournament)
-        .filter_by(created_by=current_user.id)
-        .order_by(Tournament.created_at.desc())
-    )
-    recent = base_q.limit(6).all()  # 可以固定 6，也可以用 request.args.get('limit')
-
-    for tourney in recent:
-        rows = (
-            db.session.query(TournamentPlayer, TournamentResult, User)
-            .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
-            .outerjoin(User, TournamentPlayer.user_id == User.id)
-            .filter(TournamentPlayer.tournament_id == tourney.id)
-            .all()
-        )
-
-        standings = []
-        for player, result, user in rows:
-            if user:
-                display_name = user.username
-            else:
-                first = player.guest_firstname or ""
-                last_initial = player.guest_lastname[0] if player.guest_lastname else ""
-                display_name = f"{first} {last_initial}".strip() or "Unknown"
-
-            standings.append({
-                'username': display_name,
-                'wins': result.wins,
-                'losses': result.losses,
-                'owp': round(result.opponent_win_percentage * 100, 2),
-                'opp_owp': round(result.opp_opp_win_percentage * 100, 2)
-            })
+    # Admin 卡片展示：最近主办比赛的排名
+    recent_tournaments = get_hosted_standings(current_user.id, limit=6)
 
-        if len(standings) < 3:
-            continue
-
-        standings.sort(key=lambda p: (p['wins'], p['opp_owp']), reverse=True)
-
-        recent_tournaments.append({
-            'id': tourney.id,
-            'title': tourney.title,
-            'standings': standings
-        })
-
-    # ✅ 用户统计
+    # ✅ 用户统计（总胜率来自预先汇总的 UserStat）
     user_stats = db.session.query(UserStat).filter_by(user_id=current_user.id).all()
+    _, _, total_winrate = stat_totals(user_stats)
     return render_template(
         "account.html",
         title="My Account",
-        results=all_results,
-        grouped_results=grouped_results,
-        grouped_by_winrate=grouped_by_winrate,
+        grouped_results=history.grouped_by_wins,
+        grouped_by_winrate=history.grouped_by_winrate,
         user_stats=user_stats,
         total_winrate=total_winrate,
-        game_types=list(grouped_results.keys()),
-        last_3_results=last_3_results,
-        hosted_rankings_by_game=hosted_rankings_by_game,
-        hosted_game_types=hosted_game_types,
-        hosted_by_game=hosted_by_game,  # ✅ 新增变量，供 admin-hosted-section 使用
+        game_types=history.game_types,
+        last_3_results=history.last_three,
         recent_tournaments=recent_tournaments
     )
 
+
 @main.route('/account/save_display_settings', methods=['POST'])
 @login_required
 def save_display_settings():
@@ -494,10 +327,7 @@ def save_display_settings():
 @login_required
 def new_tournament():
     # Get accepted friends (do this for all cases)
-    sent_accepted = Friend.query.filter_by(user_id=current_user.id, status='accepted').all()
-    recv_accepted = Friend.query.filter_by(friend_id=current_user.id, status='accepted').all()
-
-    accepted_friends = [f.recipient for f in sent_accepted] + [f.sender for f in recv_accepted]
+    accepted_friends = friend_users(current_user.id)
     accepted_friend_usernames = [friend.username for friend in accepted_friends]
     
     # Create list of friend details including names
@@ -512,8 +342,9 @@ def new_tournament():
     if tournament_id:
         tournament = db.session.get(Tournament, tournament_id)
         if tournament and tournament.created_by == current_user.id and tournament.status == 'draft':
-            # Get tournament players
-            players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
+            # Get tournament players, with their accounts loaded in the same query
+            players = TournamentPlayer.query.options(joinedload(TournamentPlayer.user)).filter_by(
+                tournament_id=tournament_id).all()
             player_data = []
             for player in players:
                 player_info = {
@@ -526,7 +357,7 @@ def new_tournament():
                     'user_id': player.user_id
                 }
                 if player.user_id:
-                    user = db.session.get(User, player.user_id)
+                    user = player.user
                     if user:
                         player_info['username'] = user.username
                         # If this is the current user and they're a player, mark them as confirmed
@@ -586,16 +417,17 @@ def save_tournament():
             tournament.include_creator_as_player = data['include_creator_as_player']
             tournament.round_time_minutes = data.get('round_time_minutes', 30)
             tournament.num_players = len(data['players'])
+            tournament.double_round_robin = bool(data.get('double_round_robin', False))
+            tournament.publish_all_rounds = bool(data.get('publish_all_rounds', False))
             
             # Delete existing players
             TournamentPlayer.query.filter_by(tournament_id=tournament_id).delete()
             
             # Add new players
-            for player_data in data['players']:
-                new_player = create_tournament_player(tournament.id, player_data)
-                db.session.add(new_player)
+            create_tournament_players(tournament.id, data['players'], validation_result['users'])
             
             db.session.commit()
+            invalidate_users(current_user.id)
             
             return jsonify({
                 'success': True,
@@ -612,17 +444,18 @@ def save_tournament():
                 status='draft',  # Explicitly set as draft
                 include_creator_as_player=data['include_creator_as_player'],
                 round_time_minutes=data.get('round_time_minutes', 30),
-                num_players=len(data['players'])
+                num_players=len(data['players']),
+                double_round_robin=bool(data.get('double_round_robin', False)),
+                publish_all_rounds=bool(data.get('publish_all_rounds', False))
             )
             
             db.session.add(new_tournament)
             db.session.flush()
             
-            for player_data in data['players']:
-                new_player = create_tournament_player(new_tournament.id, player_data)
-                db.session.add(new_player)
+            create_tournament_players(new_tournament.id, data['players'], validation_result['users'])
             
             db.session.commit()
+            invalidate_users(current_user.id)
             
             return jsonify({
                 'success': True,
@@ -651,7 +484,7 @@ def start_tournament():
         if not validation_result['valid']:
             return jsonify(validation_result['response']), 400
         
-        # Check if we're updating an existing draft tournament
+        # Check if we're starting an existing draft tournament
         tournament_id = data.get('tournament_id')
         if tournament_id:
             tournament = db.session.get(Tournament, tournament_id)
@@ -673,166 +506,45 @@ def start_tournament():
                     'message': 'Can only start draft tournaments'
                 }), 400
             
-            # Update existing tournament
-            tournament.title = data['title']
-            tournament.format = data['format']
-            tournament.game_type = data['game_type']
-            tournament.status = 'active'
-            tournament.include_creator_as_player = data['include_creator_as_player']
-            tournament.round_time_minutes = data.get('round_time_minutes', 30)
-            tournament.num_players = len(data['players'])
-            tournament.start_time = datetime.datetime.now()
-            
-            # Calculate total_rounds based on tournament format and number of players
-            player_count = len(data['players'])
-            if data['format'] == 'round robin':
-                tournament.total_rounds = player_count - 1
-            elif data['format'] == 'single elimination':
-                tournament.total_rounds = math.ceil(math.log2(player_count))
-            elif data['format'] == 'swiss':
-                tournament.total_rounds = math.ceil(math.log2(player_count))
-            
-            # Delete existing data in the correct order
-            # First get all rounds for this tournament
-            rounds = Round.query.filter_by(tournament_id=tournament_id).all()
-            round_ids = [r.id for r in rounds]
-            
-            # Delete matches for these rounds
-            if round_ids:
-                Match.query.filter(Match.round_id.in_(round_ids)).delete(synchronize_session=False)
-            
-            # Delete the rounds
+            # Delete existing data in the correct order: matches, rounds, then players
+            round_ids = db.session.query(Round.id).filter_by(tournament_id=tournament_id).scalar_subquery()
+            Match.query.filter(Match.round_id.in_(round_ids)).delete(synchronize_session=False)
             Round.query.filter_by(tournament_id=tournament_id).delete(synchronize_session=False)
-            
-            # Delete existing players
             TournamentPlayer.query.filter_by(tournament_id=tournament_id).delete(synchronize_session=False)
-            
-            # Process new players
-            player_ids = []
-            for player_data in data['players']:
-                new_player = create_tournament_player(tournament.id, player_data)
-                db.session.add(new_player)
-                db.session.flush()
-                player_ids.append(new_player.id)
-            
-            # Generate first round pairings
-            if data['format'] == 'round robin' or data['format'] == 'swiss':
-                # For round robin or swiss, randomly pair players for the first round
-                random.shuffle(player_ids)
-                
-                # Create pairs
-                for i in range(0, len(player_ids), 2):
-                    # If we have an odd number of players, the last player gets a bye
-                    if i + 1 >= len(player_ids):
-                        # Create a bye match
-                        create_match(tournament.id, 1, player_ids[i], None, is_bye=True, status='not started')
-                    else:
-                        # Create a normal match
-                        create_match(tournament.id, 1, player_ids[i], player_ids[i+1], status='not started')
-                    
-            elif data['format'] == 'single elimination':
-                # For single elimination, calculate number of byes needed
-                next_power_of_two = 2 ** math.ceil(math.log2(len(player_ids)))
-                num_byes = next_power_of_two - len(player_ids)
-
-                # Shuffle players
-                random.shuffle(player_ids)
-                
-                # Create first round matches
-                # For each match slot in the first round
-                for i in range(0, next_power_of_two, 2):
-                    if i + 1 >= len(player_ids):
-                        # Last player gets a bye if we have an odd number
-                        if i < len(player_ids):
-                            create_match(tournament.id, 1, player_ids[i], None, is_bye=True, status='not started')
-                    else:
-                        # Regular match between two players
-                        create_match(tournament.id, 1, player_ids[i], player_ids[i+1], status='not started')
-            
-            db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'tournament_id': tournament.id,
-                'message': 'Tournament started successfully'
-            })
         else:
             # Create new tournament with status='active' instead of draft
-            new_tournament = Tournament(
-                title=data['title'],
-                format=data['format'],
-                game_type=data['game_type'],
-                created_by=current_user.id,
-                status='active',
-                include_creator_as_player=data['include_creator_as_player'],
-                round_time_minutes=data.get('round_time_minutes', 30),
-                num_players=len(data['players']),
-                start_time=datetime.datetime.now()
-            )
-            
-            # Calculate total_rounds based on tournament format and number of players
-            player_count = len(data['players'])
-            if data['format'] == 'round robin':
-                new_tournament.total_rounds = player_count - 1
-            elif data['format'] == 'single elimination':
-                new_tournament.total_rounds = math.ceil(math.log2(player_count))
-            elif data['format'] == 'swiss':
-                new_tournament.total_rounds = math.ceil(math.log2(player_count))
-            
-            # Add tournament to database and flush to get ID
-            db.session.add(new_tournament)
-            db.session.flush()
-            
-            # Process players
-            player_ids = []
-            for player_data in data['players']:
-                new_player = create_tournament_player(new_tournament.id, player_data)
-                db.session.add(new_player)
-                db.session.flush()
-                player_ids.append(new_player.id)
-            
-            # Generate first round pairings
-            if data['format'] == 'round robin' or data['format'] == 'swiss':
-                # For round robin or swiss, randomly pair players for the first round
-                random.shuffle(player_ids)
-                
-                # Create pairs
-                for i in range(0, len(player_ids), 2):
-                    # If we have an odd number of players, the last player gets a bye
-                    if i + 1 >= len(player_ids):
-                        # Create a bye match
-                        create_match(new_tournament.id, 1, player_ids[i], None, is_bye=True, status='not started')
-                    else:
-                        # Create a normal match
-                        create_match(new_tournament.id, 1, player_ids[i], player_ids[i+1], status='not started')
-                    
-            elif data['format'] == 'single elimination':
-                # For single elimination, calculate number of byes needed
-                next_power_of_two = 2 ** math.ceil(math.log2(len(player_ids)))
-                num_byes = next_power_of_two - len(player_ids)
-
-                # Shuffle players
-                random.shuffle(player_ids)
-                
-                # Create first round matches
-                # For each match slot in the first round
-                for i in range(0, next_power_of_two, 2):
-                    if i + 1 >= len(player_ids):
-                        # Last player gets a bye if we have an odd number
-                        if i < len(player_ids):
-                            create_match(new_tournament.id, 1, player_ids[i], None, is_bye=True, status='not started')
-                    else:
-                        # Regular match between two players
-                        create_match(new_tournament.id, 1, player_ids[i], player_ids[i+1], status='not started')
-            
-            # Commit all changes
-            db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'tournament_id': new_tournament.id,
-                'message': 'Tournament started successfully'
-            })
+            tournament = Tournament(created_by=current_user.id)
+            db.session.add(tournament)
+        
+        player_count = len(data['players'])
+        tournament.title = data['title']
+        tournament.format = data['format']
+        tournament.game_type = data['game_type']
+        tournament.status = 'active'
+        tournament.include_creator_as_player = data['include_creator_as_player']
+        tournament.round_time_minutes = data.get('round_time_minutes', 30)
+        tournament.num_players = player_count
+        tournament.double_round_robin = bool(data.get('double_round_robin', False))
+        tournament.publish_all_rounds = bool(data.get('publish_all_rounds', False))
+        tournament.start_time = datetime.datetime.now()
+        
+        # Calculate total_rounds based on tournament format and number of players
+        # (a round robin takes its total from the schedule built in bootstrap_tournament)
+        if data['format'] in ('single elimination', 'swiss'):
+            tournament.total_rounds = math.ceil(math.log2(player_count))
+        
+        # Flush to get the tournament ID, then add players and the first round in bulk
+        db.session.flush()
+        bootstrap_tournament(tournament, data['players'], validation_result['users'])
+        
+        db.session.commit()
+        invalidate_users(current_user.id)
+        
+        return jsonify({
+            'success': True,
+            'tournament_id': tournament.id,
+            'message': 'Tournament started successfully'
+        })
         
     except Exception as e:
         # Roll back any changes if error occurs
@@ -844,6 +556,8 @@ def start_tournament():
             'message': f"Error starting tournament: {str(e)}"
         }), 500
     
+
+
 @main.route('/tournament/<int:tournament_id>', methods=['GET'])
 @login_required
 def view_tournament(tournament_id):
@@ -864,105 +578,47 @@ def view_tournament(tournament_id):
     rounds = Round.query.filter_by(tournament_id=tournament_id).order_by(Round.round_number).all()
     rounds_count = len(rounds)
     completed_rounds = sum(1 for r in rounds if r.status == 'completed')
+    round_numbers = {r.id: r.round_number for r in rounds}
     
     # Get current round (the first non-completed round, or the last round if all are completed)
     current_round = next((r for r in rounds if r.status != 'completed'), rounds[-1] if rounds else None)
     
-    # Get all players in this tournament
-    tournament_players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
+    # Get all players in this tournament, with their user accounts in the same query
+    tournament_players = (
+        TournamentPlayer.query
+        .options(joinedload(TournamentPlayer.user))
+        .filter_by(tournament_id=tournament_id)
+        .all()
+    )
     
     # Create a dictionary to easily access players by ID
-    players = {}
-    for player in tournament_players:
-        players[player.id] = player
-        # Eagerly load user data if player is a registered user
-        if player.user_id:
-            player.user = db.session.get(User, player.user_id)
+    players = {player.id: player for player in tournament_players}
     
     # Get all matches organized by round
     matches_by_round = {}
-    all_matches = Match.query.join(Round).filter(Round.tournament_id == tournament_id).all()
+    all_matches = Match.query.join(Round).filter(Round.tournament_id == tournament_id).order_by(Match.id).all()
+    # Leave out any round another request has created since the rounds were read
+    all_matches = [match for match in all_matches if match.round_id in round_numbers]
     
     for match in all_matches:
-        round_obj = db.session.get(Round, match.round_id)
-        round_num = round_obj.round_number
-        if round_num not in matches_by_round:
-            matches_by_round[round_num] = []
-        matches_by_round[round_num].append(match)
+        matches_by_round.setdefault(round_numbers[match.round_id], []).append(match)
     
     # Get current round matches
     current_matches = []
     if current_round:
-        current_matches = Match.query.filter_by(round_id=current_round.id).all()
+        current_matches = matches_by_round.get(current_round.round_number, [])
     
-    # Standings logic: use live compute_rankings for in-progress, TournamentResult for completed
-    if tournament.status == 'completed':
-        # Use TournamentResult for completed tournaments
-        tournament_results = TournamentResult.query.filter_by(
-            tournament_id=tournament_id
-        ).order_by(TournamentResult.rank).all()
-        # Create player_stats dictionary from tournament results for pairings table
-        player_stats = {}
-        for result in tournament_results:
-            player_stats[result.player_id] = {
-                'wins': result.wins,
-                'losses': result.losses
-            }
-        # Prepare player results for rankings using stored ranks
-        ranked_players = []
-        for result in tournament_results:
-            player = players.get(result.player_id)
-            if not player:
-                continue
-            player_result = {
-                'id': player.id,
-                'name': "",
-                'wins': result.wins,
-                'losses': result.losses,
-                'owp': result.opponent_win_percentage or 0,
-                'oowp': result.opp_opp_win_percentage or 0,
-                'rank': result.rank
-            }
-            # Set player name
-            if player.user_id:
-                player_result['name'] = player.user.username
-            else:
-                player_result['name'] = f"{player.guest_firstname} {player.guest_lastname}"
-            ranked_players.append(player_result)
-    else:
-        # Use live compute_rankings for in-progress tournaments
-        ranked_players_raw = compute_rankings(tournament_id, tournament.format)
-        # Assign rank field based on sorted order (1-based)
-        ranked_players = []
-        for idx, rp in enumerate(ranked_players_raw, 1):
-            # Try to find the player object for id or name
-            player_obj = None
-            for p in tournament_players:
-                if (hasattr(p, 'user') and rp.get('name') == p.user.username) or (rp.get('name') == f"{p.guest_firstname} {p.guest_lastname}"):
-                    player_obj = p
-                    break
-            # If possible, add id field for template compatibility
-            rp_copy = dict(rp)
-            if player_obj:
-                rp_copy['id'] = player_obj.id
-            rp_copy['rank'] = idx
-            ranked_players.append(rp_copy)
-        # Also build player_stats for the pairings table
-        player_stats = {}
-        for player in tournament_players:
-            rp = next((p for p in ranked_players if p.get('id', None) == player.id or p.get('name', None) == (player.user.username if player.user_id else f"{player.guest_firstname} {player.guest_lastname}")), None)
-            if rp:
-                player_stats[player.id] = {
-                    'wins': rp['wins'],
-                    'losses': rp['losses']
-                }
-            else:
-                player_stats[player.id] = {'wins': 0, 'losses': 0}
+    # Standings only change when the tournament version is bumped, so reuse
+    # the last computed standings for this version if we have them
+    standings = standings_cache.get(tournament)
+    if standings is None:
+        standings = tournament_standings(tournament, rounds, current_round, players, all_matches)
+        standings_cache.set(tournament, standings)
     
     # If tournament is completed, use the completed template with special stats
     if tournament.status == 'completed':
         # Calculate additional tournament statistics
-        total_matches = sum(len(matches) for matches in matches_by_round.values())
+        total_matches = len(all_matches)
         total_byes = sum(1 for match in all_matches if match.is_bye)
         
         # Calculate tournament duration
@@ -975,9 +631,6 @@ def view_tournament(tournament_id):
         else:
             tournament_duration = "N/A"
         
-        # Check if current user is the tournament creator
-        is_creator = current_user.id == tournament.created_by
-        
         return render_template(
             'tournament_completed.html',
             tournament=tournament,
@@ -986,7 +639,7 @@ def view_tournament(tournament_id):
             completed_rounds=completed_rounds,
             players=players,
             matches_by_round=matches_by_round,
-            ranked_players=ranked_players,
+            ranked_players=standings['ranked_players'],
             player_count=len(tournament_players),
             total_matches=total_matches,
             total_byes=total_byes,
@@ -994,43 +647,6 @@ def view_tournament(tournament_id):
             is_creator=is_creator
         )
     else:
-        # Compute previous round standings for pre-round and in-progress phase after round 1
-        previous_round_ranked_players = []
-        if current_round and current_round.round_number > 1 and current_round.status in ['not started', 'in progress']:
-            # Find the previous round
-            prev_round = next((r for r in rounds if r.round_number == current_round.round_number - 1), None)
-            if prev_round:
-                # Use TournamentResult if available (after round completed), else compute
-                prev_results = TournamentResult.query.filter_by(tournament_id=tournament_id).order_by(TournamentResult.rank).all()
-                if prev_results:
-                    for result in prev_results:
-                        player = players.get(result.player_id)
-                        if not player:
-                            continue
-                        player_result = {
-                            'id': player.id,
-                            'name': player.user.username if player.user_id else f"{player.guest_firstname} {player.guest_lastname}",
-                            'wins': result.wins,
-                            'losses': result.losses,
-                            'owp': result.opponent_win_percentage or 0,
-                            'oowp': result.opp_opp_win_percentage or 0,
-                            'rank': result.rank
-                        }
-                        previous_round_ranked_players.append(player_result)
-                else:
-                    # Fallback: use compute_rankings for previous round
-                    prev_rankings = compute_rankings(tournament_id, tournament.format)
-                    for idx, rp in enumerate(prev_rankings, 1):
-                        player_obj = None
-                        for p in tournament_players:
-                            if (hasattr(p, 'user') and rp.get('name') == p.user.username) or (rp.get('name') == f"{p.guest_firstname} {p.guest_lastname}"):
-                                player_obj = p
-                                break
-                        rp_copy = dict(rp)
-                        if player_obj:
-                            rp_copy['id'] = player_obj.id
-                        rp_copy['rank'] = idx
-                        previous_round_ranked_players.append(rp_copy)
         # Use the regular tournament template for in-progress tournaments
         return render_template(
             'tournament.html',
@@ -1042,12 +658,73 @@ def view_tournament(tournament_id):
             players=players,
             matches_by_round=matches_by_round,
             current_matches=current_matches,
-            ranked_players=ranked_players,
-            previous_round_ranked_players=previous_round_ranked_players,
-            player_stats=player_stats,  # Add back player_stats for pairings table
+            ranked_players=standings['ranked_players'],
+            previous_round_ranked_players=standings['previous_round_ranked_players'],
+            player_stats=standings['player_stats'],  # Add back player_stats for pairings table
             view_state=view_state
         )
 
+
+def tournament_standings(tournament, rounds, current_round, players, all_matches):
+    """Standings shown on the tournament page, built from already loaded rows.
+
+    Returns a dict with ranked_players, previous_round_ranked_players and
+    player_stats. The result only depends on data that bumps Tournament.version
+    when it changes, so view_tournament caches it per version.
+    """
+    # Use TournamentResult for completed tournaments, live rankings otherwise
+    if tournament.status == 'completed':
+        return {
+            'ranked_players': stored_rankings(tournament.id, players),
+            'previous_round_ranked_players': [],
+            'player_stats': {}
+        }
+
+    ranked_players = compute_rankings(tournament.id, tournament.format)
+    # Also build player_stats for the pairings table
+    player_stats = {
+        rp['id']: {'wins': rp['wins'], 'losses': rp['losses']}
+        for rp in ranked_players
+    }
+
+    # Compute previous round standings for pre-round and in-progress phase after round 1
+    previous_round_ranked_players = []
+    if current_round and current_round.round_number > 1 and current_round.status in ['not started', 'in progress']:
+        # Use TournamentResult if available (after round completed), else compute
+        previous_round_ranked_players = stored_rankings(tournament.id, players)
+        if not previous_round_ranked_players:
+            # Fallback: rank on the matches from the rounds already completed
+            previous_round_ranked_players = ranked_standings(tournament.id, tournament.format, completed_rounds_only=True)
+
+    return {
+        'ranked_players': ranked_players,
+        'previous_round_ranked_players': previous_round_ranked_players,
+        'player_stats': player_stats
+    }
+
+
+def stored_rankings(tournament_id, players):
+    """Ranking rows from the stored TournamentResult rows, in rank order."""
+    tournament_results = TournamentResult.query.filter_by(
+        tournament_id=tournament_id
+    ).order_by(TournamentResult.rank).all()
+    ranked_players = []
+    for result in tournament_results:
+        player = players.get(result.player_id)
+        if not player:
+            continue
+        ranked_players.append({
+            'id': player.id,
+            'name': player.user.username if player.user else f"{player.guest_firstname} {player.guest_lastname}",
+            'wins': result.wins,
+            'losses': result.losses,
+            'owp': result.opponent_win_percentage or 0,
+            'oowp': result.opp_opp_win_percentage or 0,
+            'rank': result.rank
+        })
+    return ranked_players
+
+
 @main.route('/tournament/<int:tournament_id>/completed', methods=['GET'])
 @login_required
 def view_tournament_completed(tournament_id):
@@ -1055,7 +732,9 @@ def view_tournament_completed(tournament_id):
     tournament = db.session.get(Tournament, tournament_id) or abort(404)
     if tournament.status != 'completed':
         tournament.status = 'completed'
+        bump_version(tournament)
         db.session.commit()
+        invalidate_users(tournament.created_by)
     
     # Redirect to the main tournament view, which will now render the completed template
     return redirect(url_for('main.view_tournament', tournament_id=tournament_id))
@@ -1080,6 +759,7 @@ def start_round(tournament_id):
                 status='not started'
             )
             db.session.add(current_round)
+            bump_version(tournament)
             db.session.commit()
         else:
             return jsonify(success=False, message="All rounds have been completed"), 400
@@ -1087,6 +767,7 @@ def start_round(tournament_id):
     # Change status to 'in progress' if not already
     if current_round.status == 'not started':
         current_round.status = 'in progress'
+        bump_version(tournament)
         db.session.commit()
         
     return jsonify(success=True)
@@ -1107,33 +788,39 @@ def complete_round(tournament_id):
     if not current_round:
         return jsonify(success=False, message="No round in progress"), 400
     
-    # Get match results from request
-    match_results = request.json.get('match_results', [])
+    # Get match results from request (JSON or an uploaded CSV)
+    try:
+        match_results = submitted_match_results()
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
     
-    # Get all matches for this round to validate completeness
-    all_matches = Match.query.filter_by(round_id=current_round.id).all()
-    non_bye_matches = [m for m in all_matches if not m.is_bye]
+    # Check every result against this round's matches, loaded in one query
+    matches = round_matches(current_round.id)
+    winners, errors = check_match_results(match_results, matches)
+    if errors:
+        return jsonify(error_response_data(errors)), 400
     
     # Check if all non-bye matches have a result
-    if len(match_results) < len(non_bye_matches):
+    final_winners = {match_id: winners.get(match_id, match.winner_id) for match_id, match in matches.items()}
+    if any(final_winners[match_id] is None for match_id, match in matches.items() if not match.is_bye):
         return jsonify(success=False, message="Not all matches have results"), 400
     
-    # Update match results
-    for result in match_results:
-        match_id = result.get('match_id')
-        winner_id = result.get('winner_id')
-        
-        match = db.session.get(Match, match_id)
-        if match and match.round_id == current_round.id:
-            match.winner_id = winner_id
-            match.status = 'completed'
+    # Update match results, including any saved earlier, in one statement
+    write_winners({match_id: winner_id for match_id, winner_id in final_winners.items() if winner_id is not None},
+                  status='completed')
+    
+    # Move single elimination winners into the next round's bracket slots
+    advance_winners(tournament_id, [
+        (match.bracket_slot, final_winners[match_id]) for match_id, match in matches.items()
+        if match.bracket_slot and final_winners[match_id]
+    ])
     
     # Mark round as completed
     current_round.status = 'completed'
-    db.session.commit()
+    bump_version(tournament)
     
-    # Update tournament results and tiebreakers
-    update_tournament_results(tournament_id)
+    # Update tournament results and tiebreakers (commits the round with them)
+    update_tournament_results(tournament_id, current_round)
     
     return jsonify(success=True)
 
@@ -1145,18 +832,52 @@ def save_results(tournament_id):
     """Save match results without completing the round."""
     tournament = db.session.get(Tournament, tournament_id) or abort(404)
     
-    # Get match results from request
-    match_results = request.json.get('match_results', [])
+    # Get match results from request (JSON or an uploaded CSV)
+    try:
+        match_results = submitted_match_results()
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+    
+    # Results can only change this tournament's matches; load those named in one query
+    matches = tournament_matches(tournament_id, submitted_match_ids(match_results))
+    winners, errors = check_match_results(match_results, matches, scope='tournament')
+    if errors:
+        return jsonify(error_response_data(errors)), 400
+    
+    changed_matches = [matches[match_id]._replace(winner_id=winner_id) for match_id, winner_id in winners.items()
+                       if matches[match_id].winner_id != winner_id]
+    changed_round_ids = {match.round_id for match in changed_matches}
+    completed_round_ids = {
+        round_id for (round_id,) in
+        db.session.query(Round.id).filter(Round.id.in_(changed_round_ids), Round.status == 'completed')
+    } if changed_round_ids else set()
+
+    # Winners of completed single elimination rounds have already moved up the
+    # bracket, and into the next round's matches if it has been paired. Those
+    # can only be handed to the other player, and only while the next round's
+    # match has no result.
+    moved = {
+        match.bracket_slot: (matches[match.id].winner_id, match.winner_id) for match in changed_matches
+        if match.bracket_slot and match.round_id in completed_round_ids
+    }
+    next_matches = bracket_matches(tournament_id, {slot // 2 for slot in moved if slot > 1})
+    if any(next_matches[slot // 2].winner_id is not None or None in (old_winner, new_winner)
+           for slot, (old_winner, new_winner) in moved.items() if slot // 2 in next_matches):
+        return jsonify(success=False,
+                       message="Results that have been played on in the next round can't be changed"), 400
     
     # Update match results
-    for result in match_results:
-        match_id = result.get('match_id')
-        winner_id = result.get('winner_id')
-        
-        match = db.session.get(Match, match_id)
-        if match:
-            match.winner_id = winner_id
+    write_winners({match.id: match.winner_id for match in changed_matches})
+
+    # Stored standings already include completed rounds, so editing one of
+    # those means the next round completion has to rebuild them in full
+    if completed_round_ids:
+        TournamentResult.query.filter_by(tournament_id=tournament_id).update({'rounds_applied': None})
+        advance_winners(tournament_id, [(slot, new_winner) for slot, (_, new_winner) in moved.items()])
+        replace_players(next_matches.values(),
+                        {old_winner: new_winner for old_winner, new_winner in moved.values() if old_winner})
     
+    bump_version(tournament)
     db.session.commit()
     return jsonify(success=True)
 
@@ -1167,47 +888,53 @@ def next_round(tournament_id):
     """Create the next round for the tournament."""
     tournament = db.session.get(Tournament, tournament_id) or abort(404)
     
-    # Get the current round
-    current_round = Round.query.filter_by(
-        tournament_id=tournament_id, 
-        status='completed'
-    ).order_by(Round.round_number.desc()).first()
+    # Load players, rounds, matches and results once for the checks and the pairings
+    snapshot = TournamentSnapshot.load(tournament)
     
-    if not current_round:
+    # Get the current round
+    completed = snapshot.completed_rounds()
+    if not completed:
         return jsonify(success=False, message="No completed round found"), 400
+    current_round = completed[-1]
     
     # Verify all matches in the current round have winners
-    incomplete_matches = Match.query.filter_by(
-        round_id=current_round.id,
-        winner_id=None,
-        is_bye=False
-    ).count()
+    incomplete_matches = sum(
+        1 for match in snapshot.matches_in_round(current_round.round_number)
+        if match.winner_id is None and not match.is_bye
+    )
     
     if incomplete_matches > 0:
         return jsonify(success=False, message="Not all matches have been completed"), 400
     
-    # Get all rounds for this tournament
-    rounds = Round.query.filter_by(tournament_id=tournament_id).order_by(Round.round_number).all()
-    completed_rounds = sum(1 for r in rounds if r.status == 'completed')
+    completed_rounds = len(completed)
     
     if completed_rounds >= tournament.total_rounds:
         # All rounds are completed, mark the tournament as finished
         tournament.status = 'completed'
+        bump_version(tournament)
         db.session.commit()
+        invalidate_users(tournament.created_by)
         return jsonify(success=True)
     
-    # Create the next round
+    # Rounds published at the start already have their matches
     next_round_number = completed_rounds + 1
+    if any(r.round_number == next_round_number for r in snapshot.rounds):
+        bump_version(tournament)
+        db.session.commit()
+        return jsonify(success=True)
+    
+    # Create the next round
     new_round = Round(
         tournament_id=tournament_id,
         round_number=next_round_number,
         status='not started'
     )
     db.session.add(new_round)
-    db.session.commit()
+    bump_version(tournament)
+    db.session.flush()
     
-    # Create match pairings for the new round
-    create_pairings_for_round(tournament, new_round)
+    # Create match pairings for the new round (commits the round with them)
+    create_pairings_for_round(tournament, new_round, snapshot)
     
     return jsonify(success=True)
 
@@ -1215,7 +942,7 @@ def next_round(tournament_id):
 @login_required
 def send_results_to_players(tournament_id):
     tournament = db.session.get(Tournament, tournament_id) or abort(404)
-    players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
+    emails = [email for (email,) in db.session.query(TournamentPlayer.email).filter_by(tournament_id=tournament_id)]
 
     ranked_players = compute_rankings(tournament_id, tournament.format)
     total_matches = Match.query.join(Round, Match.round_id == Round.id).filter(Round.tournament_id == tournament.id).count()
@@ -1224,536 +951,292 @@ def send_results_to_players(tournament_id):
         Match.is_bye == True
     ).count()
 
-    for player in players:
-        if not player.email:
-            continue
+    # Every player gets the same email, so render it once and let the mail queue deliver it
+    html_body = render_template(
+        "components/tournament_results_email.html",
+        tournament=tournament,
+        ranked_players=ranked_players,
+        total_matches=total_matches,
+        total_byes=total_byes
+    )
+    mail_queue.enqueue(tournament_id, 'results', f"Tournament Results: {tournament.title}", html_body, emails)
 
-        html_body = render_template(
-            "components/tournament_results_email.html",
-            tournament=tournament,
-            ranked_players=ranked_players,
-            total_matches=total_matches,
-            total_byes=total_byes
-        )
+    flash("Results are being sent to all players!", "success")
+    return redirect(url_for('main.dashboard'))
 
-        msg = Message(subject=f"Tournament Results: {tournament.title}",
-                      recipients=[player.email])
-        msg.html = html_body
-        mail.send(msg)
+@main.route('/tournament/<int:tournament_id>/email_status')
+@login_required
+def tournament_email_status(tournament_id):
+    """Progress of the results/pairings emails queued for a tournament."""
+    tournament = db.session.get(Tournament, tournament_id) or abort(404)
+    if tournament.created_by != current_user.id:
+        abort(403)
+    return jsonify(mail_queue.status(tournament_id))
 
-    flash("Results sent to all players!", "success")
-    return redirect(url_for('main.dashboard'))
+@main.route('/tournament/<int:tournament_id>/bracket')
+@login_required
+def tournament_bracket(tournament_id):
+    """The single elimination bracket as JSON, read with one query.
+
+    rounds holds a list of [player1, player2] slot pairs per round and then the
+    champion's slot; each player is {'id', 'name', 'seed'} or null.
+    """
+    rows = (
+        db.session.query(BracketSlot.slot, BracketSlot.seed, TournamentPlayer, User)
+        .outerjoin(TournamentPlayer, BracketSlot.player_id == TournamentPlayer.id)
+        .outerjoin(User, TournamentPlayer.user_id == User.id)
+        .filter(BracketSlot.tournament_id == tournament_id)
+        .all()
+    )
+    if not rows:
+        abort(404)
+
+    # Seeds are only stored on the leaves
+    seeds = {player.id: seed for slot, seed, player, user in rows if player and seed}
+    slot_players = {}
+    for slot, seed, player, user in rows:
+        if player:
+            if user:
+                name = f"{user.first_name} {user.last_name}"
+            else:
+                name = f"{player.guest_firstname} {player.guest_lastname}"
+            slot_players[slot] = {'id': player.id, 'name': name, 'seed': seeds.get(player.id)}
 
-def compute_rankings(tournament_id, format):
-    # Get all tournament players
-    players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
-
-    # Initialize stats for each player
-    player_stats = {p.id: {"player": p, "wins": 0, "losses": 0, "opponents": [], "head_to_head": {}} for p in players}
-
-    # Get the matches for this tournament
-    matches = Match.query.join(Round, Match.round_id == Round.id)\
-        .filter(Round.tournament_id == tournament_id).all()
-
-    # Process each match
-    for match in matches:
-        p1 = match.player1_id
-        p2 = match.player2_id
-        winner = match.winner_id
-
-        # Handle bye: Player2 is None, meaning player 1 got a bye
-        if match.is_bye:
-            if p1:
-                # Player 1 gets the win
-                player_stats[p1]["wins"] += 1
-                player_stats[p1]["opponents"].append(None)  # No opponent for player1 in bye
-            # Do NOT update p2 if p2 is None (prevents KeyError)
-            continue
+    size = (len(rows) + 1) // 2
+    return jsonify(rounds=[[list(pair) for pair in pairs] for pairs in bracket_rounds(slot_players, size)])
 
-        # Track the players' opponents if it's a real match (i.e., no bye)
-        if p1 and p2:  # Ensure both players exist
-            player_stats[p1]["opponents"].append(p2)
-            player_stats[p2]["opponents"].append(p1)
-
-        # Track wins and losses
-        if winner == p1:
-            player_stats[p1]["wins"] += 1
-            if p2 is not None:
-                player_stats[p2]["losses"] += 1
-            # Head-to-head only if both players exist
-            if p2 is not None:
-                player_stats[p1]["head_to_head"][p2] = player_stats[p1]["head_to_head"].get(p2, 0) + 1
-        elif winner == p2:
-            if p2 is not None:
-                player_stats[p2]["wins"] += 1
-            player_stats[p1]["losses"] += 1
-            if p2 is not None:
-                player_stats[p2]["head_to_head"][p1] = player_stats[p2]["head_to_head"].get(p1, 0) + 1
-
-    # Calculate OWP (Opponent Win Percentage) and OOWP (Opponents' Opponent Win Percentage)
-    standings = []
-
-    for player_id, stats in player_stats.items():
-        record = {
-            'wins': stats['wins'],
-            'losses': stats['losses'],
-            'owp': 0.0,
-            'oowp': 0.0
-        }
-        
-        opponents = stats["opponents"]
-        opp_wp_list = []
-
-        # Calculate OWP: Average win percentage of the player's opponents
-        for opp_id in opponents:
-            if opp_id:  # Skip None (bye)
-                opp_results = TournamentResult.query.filter_by(player_id=opp_id, tournament_id=tournament_id).first()
-                if opp_results:
-                    total_games = opp_results.wins + opp_results.losses
-                    if total_games > 0:
-                        opp_win_pct = opp_results.wins / total_games
-                    else:
-                        opp_win_pct = 0.0
-                    
-                    opp_wp_list.append(opp_win_pct)
-            
-        # Calculate average opponent win percentage
-        if opp_wp_list:
-            record['owp'] = sum(opp_wp_list) / len(opp_wp_list)
-        
-        # Calculate OOWP: Average OWP of the player's opponents
-        oowp_list = []
-        for opp_id in opponents:
-            if opp_id:  # Skip None (bye)
-                opp_results = TournamentResult.query.filter_by(player_id=opp_id, tournament_id=tournament_id).first()
-                if opp_results:
-                    oowp_list.append(opp_results.opponent_win_percentage or 0)
-            
-        # Calculate opponents' opponent win percentage (OOWP)
-        if oowp_list:
-            record['oowp'] = sum(oowp_list) / len(oowp_list)
-        
-        # Add player's data to the standings
-        p = stats["player"]
-        
-        # Use the guest's name if user_id is None
-        if p.user_id:
-            user = db.session.get(User, p.user_id)
-            player_name = f"{user.first_name} {user.last_name}" if user else f"{p.guest_firstname} {p.guest_lastname}"
-        else:
-            player_name = f"{p.guest_firstname} {p.guest_lastname}"
-
-        standings.append({
-            "name": player_name,
-            "wins": record['wins'],
-            "losses": record['losses'],
-            "owp": round(record['owp'], 3),
-            "oowp": round(record['oowp'], 3)
-        })
+def compute_rankings(tournament_id, format):
+    """Live standings for a tournament, including results saved mid-round.
 
-    # Sort the standings: by wins, then OWP, then OOWP
-    standings.sort(key=lambda x: (-x["wins"], -x["owp"], -x["oowp"]))
+    The tallies, tiebreakers and ranking are all worked out by the database
+    in one query (see standings_query).
+    """
+    return ranked_standings(tournament_id, format)
 
-    return standings
 
+def create_pairings_for_round(tournament, current_round, snapshot=None):
+    """Create match pairings for the current round based on tournament format.
 
-def create_pairings_for_round(tournament, current_round):
-    """Create match pairings for the current round based on tournament format."""
-    tournament_players = TournamentPlayer.query.filter_by(tournament_id=tournament.id).all()
+    Every strategy reads from the same TournamentSnapshot and returns
+    (player1_id, player2_id, is_bye) tuples, with the winner's bracket slot
+    as a fourth item for single elimination, which are inserted in one go.
+    """
+    if snapshot is None:
+        snapshot = TournamentSnapshot.load(tournament)
     
     if tournament.format == 'swiss':
-        create_swiss_pairings(tournament, current_round, tournament_players)
+        pairings = create_swiss_pairings(snapshot, current_round)
     elif tournament.format == 'single elimination':
-        create_single_elimination_pairings(tournament, current_round, tournament_players)
+        pairings = create_single_elimination_pairings(snapshot, current_round)
     elif tournament.format == 'round robin':
-        create_round_robin_pairings(tournament, current_round, tournament_players)
-    
+        pairings = create_round_robin_pairings(snapshot, current_round)
+    else:
+        pairings = []
+    
+    if pairings:
+        db.session.execute(insert(Match).execution_options(render_nulls=True), [
+            {'round_id': current_round.id, 'status': 'not started', 'bracket_slot': None,
+             **dict(zip(('player1_id', 'player2_id', 'is_bye', 'bracket_slot'), pairing))}
+            for pairing in pairings
+        ])
     db.session.commit()
 
 
-def create_swiss_pairings(tournament, current_round, players):
-    """Create pairings for Swiss tournament format."""
-    # Get player standings based on wins and tiebreakers
-    player_standings = []
-    
-    for player in players:
-        # Get player's tournament result
-        result = TournamentResult.query.filter_by(
-            tournament_id=tournament.id,
-            player_id=player.id
-        ).first()
-        
-        if not result:
-            result = TournamentResult(
-                tournament_id=tournament.id,
-                player_id=player.id,
-                game_type=tournament.game_type,
-                wins=0,
-                losses=0,
-                opponent_win_percentage=0.0,
-                opp_opp_win_percentage=0.0
-            )
-            db.session.add(result)
-        
-        player_standings.append({
-            'player_id': player.id,
-            'wins': result.wins,
-            'losses': result.losses,
-            'owp': result.opponent_win_percentage or 0.0,
-            'oowp': result.opp_opp_win_percentage or 0.0,
-            'paired': False  # Flag to track if player has been paired in this round
-        })
-    
-    # Sort by score (wins), then by tiebreakers
-    player_standings.sort(key=lambda x: (-x['wins'], -x['owp'], -x['oowp']))
-    
-    # Get previously paired opponents to avoid re-pairing
-    previous_pairings = set()
-    previous_rounds = Round.query.filter(
-        Round.tournament_id == tournament.id,
-        Round.round_number < current_round.round_number
-    ).all()
-    
-    for round_obj in previous_rounds:
-        matches = Match.query.filter_by(round_id=round_obj.id).all()
-        for match in matches:
-            if match.player1_id and match.player2_id:
-                pair = tuple(sorted([match.player1_id, match.player2_id]))
-                previous_pairings.add(pair)
-    
-    # Create pairings for the current round
-    matches = []
-    
-    # Pair players with the same score as much as possible
-    score_groups = {}
-    for player in player_standings:
-        score = player['wins']
-        if score not in score_groups:
-            score_groups[score] = []
-        score_groups[score].append(player)
-    
-    # Process each score group
-    for score in sorted(score_groups.keys(), reverse=True):
-        players_group = score_groups[score]
-        
-        while len(players_group) > 1:
-            player1 = players_group[0]
-            players_group.pop(0)
-            
-            # Try to find an opponent not previously paired with player1
-            paired = False
-            for i, player2 in enumerate(players_group):
-                pair = tuple(sorted([player1['player_id'], player2['player_id']]))
-                if pair not in previous_pairings:
-                    matches.append((player1['player_id'], player2['player_id']))
-                    players_group.pop(i)
-                    paired = True
-                    break
-            
-            # If no unpaired opponent found, pair with the first available
-            if not paired and players_group:
-                player2 = players_group[0]
-                players_group.pop(0)
-                matches.append((player1['player_id'], player2['player_id']))
-    
-    # Handle odd number of players with a bye
-    remaining_players = []
-    for score in sorted(score_groups.keys(), reverse=True):
-        remaining_players.extend(score_groups[score])
-    
-    if remaining_players:
-        # Give bye to the lowest-ranked player who hasn't had a bye yet
-        player_with_bye = remaining_players[-1]['player_id']
-        
-        # Check if this player already had a bye
-        had_bye = Match.query.join(Round).filter(
-            Round.tournament_id == tournament.id,
-            Match.player1_id == player_with_bye,
-            Match.is_bye == True
-        ).first()
-        
-        if had_bye:
-            # Try to find someone else for the bye
-            for player in reversed(player_standings):
-                if player['player_id'] != player_with_bye:
-                    had_bye = Match.query.join(Round).filter(
-                        Round.tournament_id == tournament.id,
-                        Match.player1_id == player['player_id'],
-                        Match.is_bye == True
-                    ).first()
-                    
-                    if not had_bye:
-                        player_with_bye = player['player_id']
-                        break
-        
-        # Create a bye match
-        bye_match = Match(
-            round_id=current_round.id,
-            player1_id=player_with_bye,
-            player2_id=None,
-            is_bye=True,
-            status='not started'
-        )
-        db.session.add(bye_match)
-    
-    # Create matches in the database
-    for player1_id, player2_id in matches:
-        match = Match(
-            round_id=current_round.id,
-            player1_id=player1_id,
-            player2_id=player2_id,
-            is_bye=False,
-            status='not started'
-        )
-        db.session.add(match)
+def create_swiss_pairings(snapshot, current_round):
+    """Create pairings for Swiss tournament format.
+
+    The standings and pairing history come from the snapshot and are handed
+    to the engine named by SWISS_PAIRING_ENGINE (see swiss_pairing).
+    """
+    pairs, player_with_bye = swiss_pairings(
+        snapshot.swiss_players(),
+        snapshot.pairing_history(current_round.round_number),
+        engine=current_app.config.get('SWISS_PAIRING_ENGINE', 'matching'),
+        window=current_app.config.get('SWISS_PAIRING_WINDOW', DEFAULT_WINDOW)
+    )
 
+    pairings = [(player1_id, player2_id, False) for player1_id, player2_id in pairs]
+    if player_with_bye is not None:
+        pairings.append((player_with_bye, None, True))
+    return pairings
+
+
+def create_single_elimination_pairings(snapshot, current_round):
+    """Create pairings for single elimination tournament format.
+
+    With a stored bracket the round's matches are the slot pairs below the
+    round's winner slots. Tournaments started before brackets were stored
+    pair the previous round's winners in match order.
+    """
+    if snapshot.bracket:
+        pairings = [
+            (player1_id, player2_id, player2_id is None, winner_slot)
+            for winner_slot, player1_id, player2_id in
+            round_pairings(snapshot.bracket, snapshot.bracket_size, current_round.round_number)
+        ]
+        # A player without an opponent goes straight through
+        advance_winners(snapshot.tournament.id, [(slot, p1) for p1, p2, is_bye, slot in pairings if is_bye])
+        return pairings
 
-def create_single_elimination_pairings(tournament, current_round, players):
-    """Create pairings for single elimination tournament format."""
     # For first round: random seeding
     if current_round.round_number == 1:
-        import random
-        player_ids = [p.id for p in players]
+        player_ids = list(snapshot.player_ids)
         # Special case: if exactly 2 players, just pair them (no byes)
         if len(player_ids) == 2:
-            match = Match(
-                round_id=current_round.id,
-                player1_id=player_ids[0],
-                player2_id=player_ids[1],
-                is_bye=False,
-                status='not started'
-            )
-            db.session.add(match)
-        else:
-            random.shuffle(player_ids)
-            # Add byes for power of 2
-            next_power_of_2 = 2 ** (tournament.total_rounds)
-            while len(player_ids) < next_power_of_2:
-                player_ids.append(None)  # None represents a bye
-            # Create first round matches
-            for i in range(0, len(player_ids), 2):
-                player1_id = player_ids[i]
-                player2_id = player_ids[i+1] if i+1 < len(player_ids) else None
-                is_bye = player2_id is None
-                match = Match(
-                    round_id=current_round.id,
-                    player1_id=player1_id,
-                    player2_id=player2_id,
-                    is_bye=is_bye,
-                    status='not started'
-                )
-                db.session.add(match)
-    else:
-        # For subsequent rounds: winners of previous round
-        prev_round = Round.query.filter_by(
-            tournament_id=tournament.id,
-            round_number=current_round.round_number - 1
-        ).first()
-        prev_matches = Match.query.filter_by(round_id=prev_round.id).order_by(Match.id).all()
-        # Create matches based on winners from previous round
-        for i in range(0, len(prev_matches), 2):
-            match1 = prev_matches[i]
-            match2 = prev_matches[i+1] if i+1 < len(prev_matches) else None
-            player1_id = match1.winner_id if match1 and match1.winner_id else None
-            player2_id = match2.winner_id if match2 and match2.winner_id else None
-            is_bye = player2_id is None and player1_id is not None
-            match = Match(
-                round_id=current_round.id,
-                player1_id=player1_id,
-                player2_id=player2_id,
-                is_bye=is_bye,
-                status='not started'
-            )
-            db.session.add(match)
-
-
-def create_round_robin_pairings(tournament, current_round, players):
-    """Create pairings for round robin tournament format."""
-    player_ids = [p.id for p in players]
-    n = len(player_ids)
-    
-    # Handle odd number of players
-    has_bye = False
-    if n % 2 != 0:
-        player_ids.append(None)  # Add a bye
-        n += 1
-        has_bye = True
-    
-    round_num = current_round.round_number
-    
+            return [(player_ids[0], player_ids[1], False)]
+        random.shuffle(player_ids)
+        # Add byes for power of 2
+        next_power_of_2 = 2 ** (snapshot.tournament.total_rounds)
+        while len(player_ids) < next_power_of_2:
+            player_ids.append(None)  # None represents a bye
+        # Create first round matches
+        pairings = []
+        for i in range(0, len(player_ids), 2):
+            player1_id = player_ids[i]
+            player2_id = player_ids[i+1] if i+1 < len(player_ids) else None
+            pairings.append((player1_id, player2_id, player2_id is None))
+        return pairings
+
+    # For subsequent rounds: winners of previous round
+    prev_matches = snapshot.matches_in_round(current_round.round_number - 1)
     pairings = []
+    for i in range(0, len(prev_matches), 2):
+        match1 = prev_matches[i]
+        match2 = prev_matches[i+1] if i+1 < len(prev_matches) else None
+        player1_id = match1.winner_id if match1 and match1.winner_id else None
+        player2_id = match2.winner_id if match2 and match2.winner_id else None
+        is_bye = player2_id is None and player1_id is not None
+        pairings.append((player1_id, player2_id, is_bye))
+    return pairings
+
+
+def create_round_robin_pairings(snapshot, current_round):
+    """Create pairings for round robin tournament format.
+
+    The pairings come from the schedule stored when the tournament started.
+    Tournaments started before schedules were stored fall back to the circle
+    method over the players in registration order.
+    """
+    tournament = snapshot.tournament
+    if tournament.round_robin_schedule:
+        schedule = unpack_schedule(tournament.round_robin_schedule)
+    else:
+        schedule = round_robin_schedule(snapshot.player_ids, tournament.double_round_robin)
     
-    if round_num <= n - 1:
-        fixed = player_ids[0]
-        rotating = player_ids[1:]
-        
-        rotation = (round_num - 1) % (n - 1)
-        rotated = rotating[-rotation:] + rotating[:-rotation]
-        
-        for i in range(n // 2):
-            if i == 0:
-                p1, p2 = fixed, rotated[i]
-            else:
-                p1, p2 = rotated[i], rotated[n - 1 - i]
-            
-            # Ensure player1_id is always not None
-            if p1 is None and p2 is not None:
-                p1, p2 = p2, None
-            elif p1 is None and p2 is None:
-                continue  # Skip invalid pairing (shouldn't occur, but safe check)
+    if current_round.round_number > len(schedule):
+        return []
+    return [(p1, p2, p2 is None) for p1, p2 in schedule[current_round.round_number - 1]]
 
-            pairings.append((p1, p2))
-    
-    # Create matches in the database
-    for player1_id, player2_id in pairings:
-        is_bye = player2_id is None
-        
-        match = Match(
-            round_id=current_round.id,
-            player1_id=player1_id,
-            player2_id=player2_id,
-            is_bye=is_bye,
-            status='not started'
-        )
-        db.session.add(match)
 
+def update_tournament_results(tournament_id, completed_round=None):
+    """Update tournament results and tiebreakers after a round is completed.
 
-def update_tournament_results(tournament_id):
-    """Update tournament results and tiebreakers after a round is completed."""
+    When completed_round is given and the stored results are up to date with
+    the round before it, only that round's matches are applied to the stored
+    aggregates. Otherwise every completed match is tallied from scratch.
+    """
     tournament =  db.session.get(Tournament, tournament_id)
+    previous_totals = user_result_totals(tournament_id)
+
+    if completed_round is not None and apply_round_results(tournament, completed_round):
+        apply_result_totals(tournament.game_type, previous_totals, user_result_totals(tournament_id))
+        db.session.commit()
+        invalidate_tournament(tournament_id)
+        return
     
     # Get all players in this tournament
-    players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
-    player_ids = [p.id for p in players]
-    
-    # Get all matches across all rounds
-    rounds = Round.query.filter_by(tournament_id=tournament_id).all()
-    round_ids = [r.id for r in rounds]
-    matches = Match.query.filter(Match.round_id.in_(round_ids), Match.status == "completed").all()
-    
-    # Build stats for each player
-    stats = {pid: {"wins": 0, "losses": 0, "opponents": [], "head_to_head": {}} for pid in player_ids}
-    for match in matches:
-        p1, p2, winner = match.player1_id, match.player2_id, match.winner_id
-        # Byes: only p1 gets a win
-        if match.is_bye:
-            if p1:
-                stats[p1]["wins"] += 1
-            continue
-        # Track opponents
-        if p1 and p2:
-            stats[p1]["opponents"].append(p2)
-            stats[p2]["opponents"].append(p1)
-        # Track wins/losses
-        if winner == p1:
-            stats[p1]["wins"] += 1
-            if p2:
-                stats[p2]["losses"] += 1
-                stats[p1]["head_to_head"][p2] = stats[p1]["head_to_head"].get(p2, 0) + 1
-        elif winner == p2:
-            stats[p2]["wins"] += 1
-            stats[p1]["losses"] += 1
-            stats[p2]["head_to_head"][p1] = stats[p2]["head_to_head"].get(p1, 0) + 1
-
-    # Calculate OWP and OOWP for Swiss
-    owp = {}
-    oowp = {}
-    if tournament.format == "swiss":
-        for pid in player_ids:
-            opps = stats[pid]["opponents"]
-            opp_wp = []
-            for opp in opps:
-                if opp in stats:
-                    opp_wins = stats[opp]["wins"]
-                    opp_losses = stats[opp]["losses"]
-                    total = opp_wins + opp_losses
-                    if total > 0:
-                        opp_wp.append(opp_wins / total)
-            owp[pid] = sum(opp_wp) / len(opp_wp) if opp_wp else 0.0
-        for pid in player_ids:
-            opps = stats[pid]["opponents"]
-            opp_owp = [owp[opp] for opp in opps if opp in owp]
-            oowp[pid] = sum(opp_owp) / len(opp_owp) if opp_owp else 0.0
-
-    # Prepare ranking list
-    ranking = []
-    for pid in player_ids:
-        entry = {
-            "player_id": pid,
-            "wins": stats[pid]["wins"],
-            "losses": stats[pid]["losses"],
-            "owp": owp[pid] if tournament.format == "swiss" else 0.0,
-            "oowp": oowp[pid] if tournament.format == "swiss" else 0.0,
-            "head_to_head": stats[pid]["head_to_head"]
-        }
-        ranking.append(entry)
-
-    # Sort ranking based on tournament format
-    if tournament.format == "swiss":
-        ranking.sort(key=lambda x: (-x["wins"], -x["owp"], -x["oowp"]))
-    elif tournament.format == "round robin":
-        # First by wins, then head-to-head if only two tied, else OWP/OOWP
-        def rr_sort_key(x):
-            return (-x["wins"],)
-        ranking.sort(key=rr_sort_key)
-        # Now resolve ties by head-to-head if only two tied
-        i = 0
-        while i < len(ranking) - 1:
-            j = i
-            # Find group of tied players
-            while j + 1 < len(ranking) and ranking[j]["wins"] == ranking[j+1]["wins"]:
-                j += 1
-            if j > i:
-                tied = ranking[i:j+1]
-                if len(tied) == 2:
-                    a, b = tied[0], tied[1]
-                    # If a beat b, a stays ahead; if b beat a, swap
-                    if a["head_to_head"].get(b["player_id"], 0) > b["head_to_head"].get(a["player_id"], 0):
-                        pass  # a stays ahead
-                    elif b["head_to_head"].get(a["player_id"], 0) > a["head_to_head"].get(b["player_id"], 0):
-                        ranking[i], ranking[i+1] = b, a
-                # If more than two tied, use OWP/OOWP as fallback
-                else:
-                    # Calculate OWP/OOWP for these players
-                    for entry in tied:
-                        opps = stats[entry["player_id"]]["opponents"]
-                        opp_wp = []
-                        for opp in opps:
-                            if opp in stats:
-                                opp_wins = stats[opp]["wins"]
-                                opp_losses = stats[opp]["losses"]
-                                total = opp_wins + opp_losses
-                                if total > 0:
-                                    opp_wp.append(opp_wins / total)
-                        entry["owp"] = sum(opp_wp) / len(opp_wp) if opp_wp else 0.0
-                    tied.sort(key=lambda x: -x["owp"])
-                    ranking[i:j+1] = tied
-            i = j + 1
-    else:  # single elimination
-        ranking.sort(key=lambda x: -x["wins"])
+    player_ids = [pid for (pid,) in db.session.query(TournamentPlayer.id).filter_by(tournament_id=tournament_id).order_by(TournamentPlayer.id)]
+    
+    # Get all completed matches across all rounds
+    matches = (
+        db.session.query(Match.player1_id, Match.player2_id, Match.winner_id, Match.is_bye)
+        .join(Round, Match.round_id == Round.id)
+        .filter(Round.tournament_id == tournament_id, Match.status == "completed")
+        .all()
+    )
+    rounds_applied = Round.query.filter_by(tournament_id=tournament_id, status='completed').count()
+    
+    stats = {pid: new_player_stats() for pid in player_ids}
+    tally_matches(stats, matches)
+    ranking = rank_players(tournament.format, stats)
 
     # Delete existing results for this tournament
     TournamentResult.query.filter_by(tournament_id=tournament_id).delete()
     
-    # Create new tournament results with ranks
-    for idx, entry in enumerate(ranking, 1):
-        new_result = TournamentResult(
-            tournament_id=tournament_id,
-            player_id=entry["player_id"],
-            game_type=tournament.game_type,
-            rank=idx,  # Assign rank based on sorted position
-            wins=entry["wins"],
-            losses=entry["losses"],
-            opponent_win_percentage=entry["owp"],
-            opp_opp_win_percentage=entry["oowp"]
-        )
-        db.session.add(new_result)
-    
+    # Create new tournament results with ranks, in one executemany INSERT
+    if ranking:
+        db.session.execute(insert(TournamentResult), [
+            {
+                "tournament_id": tournament_id,
+                "player_id": entry["player_id"],
+                "game_type": tournament.game_type,
+                "rank": idx,  # Assign rank based on sorted position
+                "wins": entry["wins"],
+                "losses": entry["losses"],
+                "opponent_win_percentage": entry["owp"],
+                "opp_opp_win_percentage": entry["oowp"],
+                "rounds_applied": rounds_applied,
+                **stored_aggregates(entry, stats)
+            }
+            for idx, entry in enumerate(ranking, 1)
+        ])
+
+    # Keep the players' UserStat rows in step with their new results
+    apply_result_totals(tournament.game_type, previous_totals, user_result_totals(tournament_id))
     db.session.commit()
+    invalidate_tournament(tournament_id)
+
+
+def apply_round_results(tournament, completed_round):
+    """Apply one completed round to the stored results with a bulk UPDATE.
+
+    Returns False without changing anything if the stored results are missing
+    a player or have not been kept up to date round by round, in which case
+    the caller should rebuild them.
+    """
+    results = TournamentResult.query.filter_by(tournament_id=tournament.id).order_by(TournamentResult.player_id).all()
+    player_count = db.session.query(func.count(TournamentPlayer.id)).filter_by(tournament_id=tournament.id).scalar()
+    if not results or len(results) != player_count:
+        return False
+    if any(r.rounds_applied != completed_round.round_number - 1 for r in results):
+        return False
+
+    matches = (
+        db.session.query(Match.player1_id, Match.player2_id, Match.winner_id, Match.is_bye)
+        .filter(Match.round_id == completed_round.id, Match.status == "completed")
+        .all()
+    )
+
+    result_ids = {r.player_id: r.id for r in results}
+    stats = {r.player_id: stats_from_result(r) for r in results}
+    tally_matches(stats, matches)
+    ranking = rank_players(tournament.format, stats)
+
+    db.session.execute(update(TournamentResult), [
+        {
+            "id": result_ids[entry["player_id"]],
+            "rank": idx,
+            "wins": entry["wins"],
+            "losses": entry["losses"],
+            "opponent_win_percentage": entry["owp"],
+            "opp_opp_win_percentage": entry["oowp"],
+            "rounds_applied": completed_round.round_number,
+            **stored_aggregates(entry, stats)
+        }
+        for idx, entry in enumerate(ranking, 1)
+    ])
+    return True
+
 
 # Helper functions
 def validate_tournament_data(data):
-    """Reusable validation logic with original error messages"""
+    """Reusable validation logic with original error messages.
+
+    The accounts named in the roster and the creator's friendships with them
+    are loaded with a fixed number of queries. When the data is valid the
+    result carries the resolved accounts under 'users', ready to be passed to
+    create_tournament_players.
+    """
     invalid_usernames = []
     email_with_accounts = []
     duplicate_usernames = []
@@ -1762,7 +1245,11 @@ def validate_tournament_data(data):
     used_usernames = {}
     used_emails = {}
 
-    for i, player_data in enumerate(data.get('players', [])):
+    players_data = data.get('players', [])
+    users_by_username, users_by_email = resolve_player_users(players_data)
+    accepted_ids = friend_ids(current_user.id)
+
+    for i, player_data in enumerate(players_data):
         # Check for duplicate usernames within the tournament
         if 'username' in player_data and player_data['username']:
             username = player_data['username'].lower()
@@ -1775,21 +1262,12 @@ def validate_tournament_data(data):
                 if not (i == 0 and data.get('include_creator_as_player', False) and 
                        player_data.get('user_id') == current_user.id):
                     # Verify username exists in the database
-                    existing_user = db.session.query(User).filter_by(username=player_data['username']).first()
+                    existing_user = users_by_username.get(player_data['username'])
                     if not existing_user:
                         invalid_usernames.append(player_data['username'])
                     else:
                         # Check if the tournament creator is friends with this user
-                        friendship = Friend.query.filter(
-                            (
-                                (Friend.user_id == current_user.id) & (Friend.friend_id == existing_user.id)
-                            ) | (
-                                (Friend.user_id == existing_user.id) & (Friend.friend_id == current_user.id)
-                            ),
-                            Friend.status == 'accepted'
-                        ).first()
-                        
-                        if not friendship and player_data['username'] != current_user.username:
+                        if existing_user.id not in accepted_ids and player_data['username'] != current_user.username:
                             non_friend_usernames.append(player_data['username'])
         
         # Check for duplicate emails within the tournament
@@ -1802,8 +1280,7 @@ def validate_tournament_data(data):
                 
                 # Check if email is linked to TourneyPro account but "No" was selected
                 if (not player_data.get('has_tourney_pro_account', True)):
-                    existing_user = db.session.query(User).filter_by(email=player_data['email']).first()
-                    if existing_user:
+                    if player_data['email'] in users_by_email:
                         email_with_accounts.append(player_data['email'])
     
     # Return validation results with original error messages
@@ -1883,85 +1360,187 @@ def validate_tournament_data(data):
             }
         }
 
-    return {'valid': True}
+    return {'valid': True, 'users': (users_by_username, users_by_email)}
 
-def create_tournament_player(tournament_id, player_data):
-    """Reusable player creation logic"""
-    new_player = TournamentPlayer(
-        tournament_id=tournament_id,
-        guest_firstname=player_data.get('guest_firstname', ''),
-        guest_lastname=player_data.get('guest_lastname', ''),
-        email=player_data.get('email', ''),
-        is_confirmed=player_data.get('is_confirmed', False)
-    )
+def resolve_player_users(players_data):
+    """Look up the accounts a roster refers to with one IN query for usernames and one for emails.
+
+    Returns ({username: User}, {email: User}).
+    """
+    usernames = {p['username'] for p in players_data if p.get('username')}
+    emails = {p['email'] for p in players_data if p.get('email')}
+
+    users_by_username = {u.username: u for u in User.query.filter(User.username.in_(usernames))} if usernames else {}
+    users_by_email = {u.email: u for u in User.query.filter(User.email.in_(emails))} if emails else {}
+    return users_by_username, users_by_email
+
+def tournament_player_values(tournament_id, player_data, users_by_username, users_by_email):
+    """Column values for one roster entry, linked to its account if it has one"""
+    values = {
+        'tournament_id': tournament_id,
+        'user_id': None,
+        'guest_firstname': player_data.get('guest_firstname', ''),
+        'guest_lastname': player_data.get('guest_lastname', ''),
+        'email': player_data.get('email', ''),
+        'is_confirmed': player_data.get('is_confirmed', False)
+    }
 
+    existing_user = None
     if 'user_id' in player_data and player_data['user_id']:
-        new_player.user_id = player_data['user_id']
+        values['user_id'] = player_data['user_id']
         if player_data['user_id'] == current_user.id:
-            new_player.guest_firstname = current_user.first_name
-            new_player.guest_lastname = current_user.last_name
+            existing_user = current_user
     elif 'username' in player_data and player_data['username']:
-        existing_user = db.session.query(User).filter_by(username=player_data['username']).first()
-        if existing_user:
-            new_player.user_id = existing_user.id
-            new_player.guest_firstname = existing_user.first_name
-            new_player.guest_lastname = existing_user.last_name
+        existing_user = users_by_username.get(player_data['username'])
     elif player_data.get('email'):
-        existing_user = db.session.query(User).filter_by(email=player_data['email']).first()
-        if existing_user:
-            new_player.user_id = existing_user.id
-            new_player.guest_firstname = existing_user.first_name
-            new_player.guest_lastname = existing_user.last_name
-
-    return new_player
-
-def create_match(tournament_id, round_number, player1_id, player2_id=None, is_bye=False, status='not started'):
-    """Helper to create match records with original structure"""
-    # First create or get the round
-    round_obj = Round.query.filter_by(
-        tournament_id=tournament_id,
-        round_number=round_number
-    ).first()
-    
-    if not round_obj:
-        round_obj = Round(
-            tournament_id=tournament_id,
-            round_number=round_number,
-            status='not started'
-        )
-        db.session.add(round_obj)
-        db.session.flush()
-    
-    # Then create the match
-    new_match = Match(
-        round_id=round_obj.id,
-        player1_id=player1_id,
-        player2_id=player2_id,
-        status='not started'
+        existing_user = users_by_email.get(player_data['email'])
+
+    if existing_user:
+        values['user_id'] = existing_user.id
+        values['guest_firstname'] = existing_user.first_name
+        values['guest_lastname'] = existing_user.last_name
+
+    return values
+
+def create_tournament_players(tournament_id, players_data, users=None):
+    """Insert a tournament's roster with one bulk INSERT and return the new player ids.
+
+    users is the resolved ({username: User}, {email: User}) pair from
+    validate_tournament_data; it is looked up again only if not given. The ids
+    come back sorted rather than in roster order: asking the database to match
+    RETURNING rows to parameters makes SQLite insert one row at a time.
+    """
+    if not players_data:
+        return []
+    users_by_username, users_by_email = users if users is not None else resolve_player_users(players_data)
+    rows = [
+        tournament_player_values(tournament_id, player_data, users_by_username, users_by_email)
+        for player_data in players_data
+    ]
+    return sorted(db.session.execute(insert(TournamentPlayer).returning(TournamentPlayer.id), rows).scalars())
+
+def submitted_match_results():
+    """The results posted to complete_round or save_results.
+
+    Either JSON with a match_results list, a CSV file uploaded as 'file', or
+    a text/csv body (see match_results.parse_results_csv). Raises ValueError
+    if the results cannot be read.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        return parse_results_csv(upload.read().decode('utf-8-sig'))
+    if request.mimetype == 'text/csv':
+        return parse_results_csv(request.get_data(as_text=True))
+    match_results = (request.get_json(silent=True) or {}).get('match_results', [])
+    if not isinstance(match_results, list):
+        raise ValueError("match_results must be a list")
+    return match_results
+
+def first_round_pairs(player_ids):
+    """Random first-round pairings as (player1_id, player2_id) tuples.
+
+    With an odd number of players the last one drawn gets a bye, which is
+    returned with player2_id set to None.
+    """
+    player_ids = list(player_ids)
+    random.shuffle(player_ids)
+    return [
+        (player_ids[i], player_ids[i + 1] if i + 1 < len(player_ids) else None)
+        for i in range(0, len(player_ids), 2)
+    ]
+
+def advance_winners(tournament_id, winners):
+    """Move single elimination winners up the bracket.
+
+    winners is a list of (bracket_slot, player_id) pairs; each is a single
+    keyed update of one BracketSlot row, sent together as one executemany.
+    """
+    if not winners:
+        return
+    slots = BracketSlot.__table__
+    db.session.execute(
+        update(slots)
+        .where(slots.c.tournament_id == bindparam('tournament'), slots.c.slot == bindparam('target_slot'))
+        .values(player_id=bindparam('winner')),
+        [{'tournament': tournament_id, 'target_slot': slot, 'winner': player_id} for slot, player_id in winners]
     )
-    db.session.add(new_match)
-    return new_match
+
+def bootstrap_tournament(tournament, players_data, users=None):
+    """Create a starting tournament's players, first round and first-round matches.
+
+    A round robin has its whole schedule worked out and stored here as well,
+    and with publish_all_rounds set every round is created up front. A single
+    elimination tournament gets its bracket tree, with entrants placed by
+    standard seeding in random seed order.
+    Everything is written with bulk INSERT ... RETURNING statements, so the
+    number of queries does not grow with the number of players. Returns
+    (player_ids, round_ids, match_ids).
+    """
+    player_ids = create_tournament_players(tournament.id, players_data, users)
+
+    if tournament.format == 'round robin':
+        # Random seating, then the same schedule for the rest of the tournament
+        seating = list(player_ids)
+        random.shuffle(seating)
+        schedule = round_robin_schedule(seating, tournament.double_round_robin)
+        tournament.round_robin_schedule = pack_schedule(schedule)
+        tournament.total_rounds = len(schedule)
+        published = [
+            [(player1_id, player2_id, None) for player1_id, player2_id in pairs]
+            for pairs in (schedule if tournament.publish_all_rounds else schedule[:1])
+        ]
+    elif tournament.format == 'single elimination':
+        seeds = list(player_ids)
+        random.shuffle(seeds)
+        slots = build_bracket(seeds)
+        db.session.execute(insert(BracketSlot).execution_options(render_nulls=True), [
+            {'tournament_id': tournament.id, 'slot': slot, 'seed': seed, 'player_id': player_id}
+            for slot, (seed, player_id) in slots.items()
+        ])
+        size = (len(slots) + 1) // 2
+        leaves = {slot: player_id for slot, (_, player_id) in slots.items() if slot >= size}
+        published = [[
+            (player1_id, player2_id, winner_slot)
+            for winner_slot, player1_id, player2_id in round_pairings(leaves, size, 1)
+        ]]
+    else:
+        published = [[(player1_id, player2_id, None) for player1_id, player2_id in first_round_pairs(player_ids)]]
+
+    round_ids = dict(db.session.execute(
+        insert(Round).returning(Round.round_number, Round.id),
+        [{'tournament_id': tournament.id, 'round_number': number, 'status': 'not started'}
+         for number in range(1, len(published) + 1)]
+    ).all()) if published else {}
+
+    match_rows = [
+        {
+            'round_id': round_ids[number],
+            'player1_id': player1_id,
+            'player2_id': player2_id,
+            'is_bye': player2_id is None,
+            'status': 'not started',
+            'bracket_slot': winner_slot
+        }
+        for number, pairs in enumerate(published, 1)
+        for player1_id, player2_id, winner_slot in pairs
+    ]
+    # render_nulls sends None as NULL so byes and matches share one multi-row INSERT
+    match_insert = insert(Match).execution_options(render_nulls=True).returning(Match.id)
+    match_ids = sorted(db.session.execute(match_insert, match_rows).scalars()) if match_rows else []
+
+    return player_ids, sorted(round_ids.values()), match_ids
+
 
 @main.route('/search_players')
+@login_required
 def search_players():
-    query = request.args.get('query', '')
-    
-    if not query or len(query) < 1:
+    """Typeahead matches for a partly typed username, friends first."""
+    query = request.args.get('query', '').strip()
+    if not query:
         return jsonify({'players': []})
 
-    search_term = f"%{query}%"
-    players = User.query.filter(
-        User.username.ilike(search_term)
-    ).limit(10).all()
-    
-    results = []
-    for player in players:
-        results.append({
-            'id': player.id,
-            'username': player.username,
-        })
-    
-    return jsonify({'players': results})
+    players = username_index.search(query, friend_ids(current_user.id), exclude={current_user.id})
+    return jsonify({'players': players})
 
 @main.route('/send_invite', methods=['POST'])
 @login_required
@@ -1996,11 +1575,9 @@ def send_invite():
 @main.route('/friends/respond/<int:request_id>', methods=['POST'])
 @login_required
 def respond_friend_request(request_id):
-    fr = Friend.query.filter_by(
-        user_id=request_id,
-        friend_id=current_user.id,
-        status='pending'
-    ).first_or_404()
+    fr = get_edge(request_id, current_user.id)
+    if fr is None or fr.requested_by != request_id or fr.status != 'pending':
+        abort(404)
 
     resp = request.form.get('response')
     if resp == 'accept':
@@ -2009,6 +1586,7 @@ def respond_friend_request(request_id):
         db.session.delete(fr)
 
     db.session.commit()
+    invalidate_friends(request_id, current_user.id)
     return redirect(url_for('main.view_requests'))
 
 @main.route('/friends/request', methods=['POST'])
@@ -2019,36 +1597,40 @@ def send_friend_request():
     if not friend_id:
         return jsonify(success=False, message="No user selected"), 400
 
-    if db.session.get(User, friend_id) is None:
+    friend = db.session.get(User, friend_id)
+    if friend is None:
         return jsonify(success=False, message="User not found"), 404
+    friend_id = friend.id
+    if friend_id == current_user.id:
+        return jsonify(success=False, message="You can't send yourself a friend request."), 400
 
-    existing = Friend.query.filter_by(
-        user_id=current_user.id,
-        friend_id=friend_id
-    ).first()
-    if existing:
+    existing = get_edge(current_user.id, friend_id)
+    if existing and existing.status == 'accepted':
+        return jsonify(success=False,
+                       message="You are already friends with this player."), 409
+    if existing and existing.requested_by == current_user.id:
         return jsonify(success=False,
                        message="You have already sent this player a friend request."), 409
 
-    fr = Friend(
-        user_id=current_user.id,
-        friend_id=friend_id,
-        status='pending'
-    )
-    db.session.add(fr)
+    if existing:
+        # They already asked us, so asking back accepts their request
+        existing.status = 'accepted'
+    else:
+        db.session.add(Friend.between(current_user.id, friend_id))
     db.session.commit()
+    invalidate_friends(current_user.id, friend_id)
     return jsonify(success=True)
 
 @main.route('/friends/edit/<int:request_id>', methods=['POST'])
 @login_required
 def edit_friend_request(request_id):
-    fr = Friend.query.filter_by(
-        user_id   = request_id,
-        friend_id = current_user.id
-    ).first_or_404()
+    fr = get_edge(request_id, current_user.id)
+    if fr is None or fr.requested_by != request_id:
+        abort(404)
 
     fr.status = 'pending'
     db.session.commit()
+    invalidate_friends(request_id, current_user.id)
     return redirect(url_for('main.view_requests'))
 
 @main.route('/get_friends')
@@ -2056,25 +1638,13 @@ def edit_friend_request(request_id):
 def get_friends():
     try:
         # Get all accepted friends for the current user
-        friends = Friend.query.filter(
-            ((Friend.user_id == current_user.id) | 
-             (Friend.friend_id == current_user.id)) &
-            (Friend.status == 'accepted')
-        ).all()
-        
-        friend_list = []
-        for friend in friends:
-            # Determine which user is the friend (not the current user)
-            friend_id = friend.friend_id if friend.user_id == current_user.id else friend.user_id
-            friend_user = db.session.get(User, friend_id)
-            if friend_user:
-                friend_list.append({
-                    'id': friend_user.id,
-                    'username': friend_user.username,
-                    'first_name': friend_user.first_name,
-                    'last_name': friend_user.last_name,
-                    'email': friend_user.email
-                })
+        friend_list = [{
+            'id': friend_user.id,
+            'username': friend_user.username,
+            'first_name': friend_user.first_name,
+            'last_name': friend_user.last_name,
+            'email': friend_user.email
+        } for friend_user in friend_users(current_user.id)]
         
         return jsonify({
             'success': True,
@@ -2148,20 +1718,15 @@ def send_round_pairings(tournament_id):
         flash("No active round found.", "error")
         return redirect(url_for('main.view_tournament', tournament_id=tournament_id))
     
-    # Get all players and their matches
-    players = TournamentPlayer.query.filter_by(tournament_id=tournament_id).all()
+    # Get all players (with their users) and their matches
+    players = TournamentPlayer.query.options(joinedload(TournamentPlayer.user)).filter_by(tournament_id=tournament_id).all()
     matches = Match.query.filter_by(round_id=current_round.id).all()
     
     # Create players dict for template
     players_dict = {p.id: p for p in players}
     
     # Get user info for registered players
-    player_users = {}
-    for player in players:
-        if player.user_id:
-            user = db.session.get(User, player.user_id)
-            if user:
-                player_users[player.id] = user
+    player_users = {player.id: player.user for player in players if player.user}
     
     # Get player stats
     player_stats = {}
@@ -2172,38 +1737,26 @@ def send_round_pairings(tournament_id):
             'losses': result.losses
         }
     
-    # Track if any emails were sent
-    emails_sent = 0
-    
-    # Send email to each player
-    for player in players:
-        if not player.email:
-            continue
-            
-        html_body = render_template(
-            "components/round_pairings_email.html",
-            tournament=tournament,
-            current_round=current_round,
-            matches=matches,
-            players=players_dict,
-            player_users=player_users,
-            player_stats=player_stats
-        )
-        
-        try:
-            msg = Message(
-                subject=f"Round {current_round.round_number} Pairings - {tournament.title}",
-                recipients=[player.email],
-                html=html_body
-            )
-            mail.send(msg)
-            emails_sent += 1
-        except Exception as e:
-            print(f"Error sending email to {player.email}: {str(e)}")
-            continue
+    # The pairings email is the same for every player: render it once and queue it
+    html_body = render_template(
+        "components/round_pairings_email.html",
+        tournament=tournament,
+        current_round=current_round,
+        matches=matches,
+        players=players_dict,
+        player_users=player_users,
+        player_stats=player_stats
+    )
+    emails_queued = mail_queue.enqueue(
+        tournament_id,
+        'pairings',
+        f"Round {current_round.round_number} Pairings - {tournament.title}",
+        html_body,
+        [player.email for player in players]
+    )
     
-    if emails_sent > 0:
-        flash(f"Round pairings sent to players!", "success")
+    if emails_queued > 0:
+        flash(f"Round pairings are being sent to players!", "success")
     else:
         flash("No emails were sent. Please check that players have valid email addresses.", "warning")
     
@@ -2221,33 +1774,13 @@ def user_preview(username):
     if not user:
         return "User not found", 404
 
-    from sqlalchemy.orm import aliased
-    from collections import defaultdict
-    TP = aliased(TournamentPlayer)
-
-    # 获取该用户参与的比赛数据
-    all_results = (
-        db.session.query(TournamentResult, Tournament)
-        .join(Tournament, TournamentResult.tournament_id == Tournament.id)
-        .join(TP, TournamentResult.player_id == TP.id)
-        .filter(TP.user_id == user.id)
-        .all()
-    )
-
-    # 分组：Top 3 卡片
-    grouped_results = defaultdict(list)
-    for result, tournament in all_results:
-        grouped_results[tournament.game_type].append((result, tournament))
+    history = get_player_history(user.id)
 
     # ✅ 根据用户偏好进行排序（wins 或 winrate）
-    for game_type in grouped_results:
-        if user.preferred_top3_sorting == "winrate":
-            grouped_results[game_type].sort(
-                key=lambda x: (x[0].wins / (x[0].wins + x[0].losses)) if (x[0].wins + x[0].losses) > 0 else 0,
-                reverse=True
-            )
-        else:
-            grouped_results[game_type].sort(key=lambda x: x[0].wins, reverse=True)
+    if user.preferred_top3_sorting == "winrate":
+        grouped_results = history.grouped_by_winrate
+    else:
+        grouped_results = history.grouped_by_wins
 
     # ✅ 如果用户设置了 preferred_game_type，只保留该类型的结果
     if user.preferred_game_type and user.preferred_game_type in grouped_results:
@@ -2255,72 +1788,12 @@ def user_preview(username):
             user.preferred_game_type: grouped_results[user.preferred_game_type]
         }
 
-    # 最近 3 场卡片
-    last_3_results = sorted(all_results, key=lambda x: x[1].created_at, reverse=True)[:3]
-
-    # 计算胜率
-    total_stats = (
-        db.session.query(
-            func.sum(TournamentResult.wins),
-            func.sum(TournamentResult.losses)
-        )
-        .join(TP, TournamentResult.player_id == TP.id)
-        .filter(TP.user_id == user.id)
-        .first()
-    )
-    total_wins = total_stats[0] or 0
-    total_losses = total_stats[1] or 0
-    total_games = total_wins + total_losses
-    total_winrate = round(total_wins / total_games * 100, 1) if total_games > 0 else 0.0
-
     # 获取统计数据
     user_stats = db.session.query(UserStat).filter_by(user_id=user.id).all()
+    _, _, total_winrate = stat_totals(user_stats)
 
     # 最近主办比赛（Admin 卡片）
-    recent_tournaments = []
-    base_q = (
-        db.session.query(Tournament)
-        .filter_by(created_by=user.id, status='completed')  # Add status='completed' filter
-        .order_by(Tournament.created_at.desc())
-    )
-    recent = base_q.limit(6).all()
-
-    for tourney in recent:
-        rows = (
-            db.session.query(TournamentPlayer, TournamentResult, User)
-            .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
-            .outerjoin(User, TournamentPlayer.user_id == User.id)
-            .filter(TournamentPlayer.tournament_id == tourney.id)
-            .all()
-        )
-
-        standings = []
-        for player, result, u in rows:
-            if u:
-                display_name = u.username
-            else:
-                first = player.guest_firstname or ""
-                last_initial = player.guest_lastname[0] if player.guest_lastname else ""
-                display_name = f"{first} {last_initial}".strip() or "Unknown"
-
-            standings.append({
-                'username': display_name,
-                'wins': result.wins,
-                'losses': result.losses,
-                'owp': round(result.opponent_win_percentage * 100, 2),
-                'opp_owp': round(result.opp_opp_win_percentage * 100, 2)
-            })
-
-        if len(standings) < 3:
-            continue
-
-        standings.sort(key=lambda p: (p['wins'], p['opp_owp']), reverse=True)
-
-        recent_tournaments.append({
-            'id': tourney.id,
-            'title': tourney.title,
-            'standings': standings
-        })
+    recent_tournaments = get_hosted_standings(user.id, limit=6, completed_only=True)
 
     return render_template(
         "components/friend_profile_preview.html",
@@ -2328,11 +1801,12 @@ def user_preview(username):
         total_winrate=total_winrate,
         user_stats=user_stats,
         grouped_results=grouped_results,
-        last_3_results=last_3_results,
+        last_3_results=history.last_three,
         recent_tournaments=recent_tournaments,
         game_types=list(grouped_results.keys())
     )
 
+
 @main.route('/tournament/<int:tournament_id>/edit')
 @login_required
 def edit_tournament(tournament_id):
@@ -2341,14 +1815,14 @@ def edit_tournament(tournament_id):
         flash("You don't have permission to edit that tournament.", "error")
         return redirect(url_for('main.view_tournament', tournament_id=tournament_id))
 
-    rows = TournamentPlayer.query.filter_by(
+    rows = TournamentPlayer.query.options(joinedload(TournamentPlayer.user)).filter_by(
         tournament_id=tournament.id
     ).all()
 
     players_data = []
     for p in rows:
         if p.user_id:
-            user = db.session.get(User, p.user_id)
+            user = p.user
             players_data.append({
                 "id": p.id,
                 "user_id": user.id,
@@ -2382,9 +1856,7 @@ def edit_tournament(tournament_id):
             "is_confirmed": True
         })
 
-    sent = Friend.query.filter_by(user_id=current_user.id, status='accepted').all()
-    recv = Friend.query.filter_by(friend_id=current_user.id, status='accepted').all()
-    accepted = [f.recipient for f in sent] + [f.sender for f in recv]
+    accepted = friend_users(current_user.id)
     accepted_friend_usernames = [u.username for u in accepted]
     accepted_friend_details  = [
         {"username":u.username, "first_name":u.first_name, "last_name":u.last_name}
@@ -2427,6 +1899,7 @@ def delete_tournament(tournament_id):
         # Finally delete the tournament
         db.session.delete(tournament)
         db.session.commit()
+        invalidate_users(current_user.id)
         
         return jsonify({
             'success': True,
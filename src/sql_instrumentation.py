@@ -0,0 +1,151 @@
+"""Per-request SQL statement counts and timings, and a slow-query log.
+
+Off unless SQL_INSTRUMENTATION is set in the app config:
+
+    'headers'  every response carries a summary of the request's SQL in
+               X-SQL-* and Server-Timing headers (for development, where
+               the browser's network tab shows them)
+    'log'      one JSON line per request is logged to the sql_instrumentation
+               logger (for production)
+
+Each summary has the endpoint, the number of statements, the total time
+spent in the database, the SQL_SLOWEST_KEPT slowest statements and any
+statement text that ran SQL_REPEAT_THRESHOLD or more times in the request,
+which is what an N+1 query pattern (one query per row of an earlier result)
+looks like. With either setting, a statement slower than SQL_SLOW_QUERY_MS is
+logged as a warning on its own, inside a request or not.
+"""
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+MODES = ('headers', 'log')
+# Longest piece of SQL put in a log line
+SQL_PREVIEW_LENGTH = 300
+
+
+def normalize(statement):
+    """The statement on one line, so the same SQL always looks the same."""
+    return ' '.join(statement.split())
+
+
+def preview(sql):
+    return sql if len(sql) <= SQL_PREVIEW_LENGTH else sql[:SQL_PREVIEW_LENGTH] + '...'
+
+
+class RequestStats:
+    """The statements run while handling one request."""
+
+    def __init__(self, slowest_kept):
+        self.statements = 0
+        self.seconds = 0.0
+        self.slowest_kept = slowest_kept
+        self._slowest = []  # min-heap of (seconds, sql), so the fastest kept is dropped first
+        self.counts = Counter()
+
+    def add(self, sql, seconds):
+        self.statements += 1
+        self.seconds += seconds
+        self.counts[sql] += 1
+        if len(self._slowest) < self.slowest_kept:
+            heapq.heappush(self._slowest, (seconds, sql))
+        elif self._slowest and seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (seconds, sql))
+
+    def slowest(self):
+        """(seconds, sql) of the slowest statements, slowest first."""
+        return sorted(self._slowest, reverse=True)
+
+    def repeated(self, threshold):
+        """(sql, times run) for statements run at least threshold times, most repeated first."""
+        return [(sql, count) for sql, count in self.counts.most_common() if count >= threshold]
+
+
+class SQLInstrumentation:
+    """Collects RequestStats for each request from the app's engines."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def init_app(self, app):
+        mode = app.config.get('SQL_INSTRUMENTATION')
+        if not mode:
+            return
+        if mode not in MODES:
+            raise ValueError(f"SQL_INSTRUMENTATION must be one of {', '.join(MODES)}, not {mode!r}")
+        slow_seconds = app.config.get('SQL_SLOW_QUERY_MS', 100) / 1000
+        repeat_threshold = app.config.get('SQL_REPEAT_THRESHOLD', 5)
+        slowest_kept = app.config.get('SQL_SLOWEST_KEPT', 3)
+        if mode == 'log' and logger.level == logging.NOTSET:
+            # Request lines are logged at INFO, which the default logging setup drops
+            logger.setLevel(logging.INFO)
+            if not logger.hasHandlers():
+                logger.addHandler(logging.StreamHandler())
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('sql_instrumentation_start', []).append(time.perf_counter())
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - conn.info['sql_instrumentation_start'].pop()
+            sql = normalize(statement)
+            stats = g.get('sql_stats') if has_request_context() else None
+            if stats is not None:
+                stats.add(sql, seconds)
+            if seconds >= slow_seconds:
+                logger.warning(json.dumps({
+                    'slow_query_ms': round(seconds * 1000, 2),
+                    'endpoint': request.endpoint if has_request_context() else None,
+                    'sql': preview(sql)
+                }))
+
+        def handle_error(context):
+            # A failed statement never reaches after_cursor_execute
+            if context.connection is not None and context.connection.info.get('sql_instrumentation_start'):
+                context.connection.info['sql_instrumentation_start'].pop()
+
+        with app.app_context():
+            engines = list(self.db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(engine, 'handle_error', handle_error)
+
+        @app.before_request
+        def start_request_stats():
+            g.sql_stats = RequestStats(slowest_kept)
+
+        @app.after_request
+        def report_request_stats(response):
+            stats = g.pop('sql_stats', None)
+            if stats is None:
+                return response
+            repeated = stats.repeated(repeat_threshold)
+            if mode == 'headers':
+                slowest = stats.slowest()
+                response.headers['X-SQL-Statements'] = str(stats.statements)
+                response.headers['X-SQL-Time-Ms'] = f"{stats.seconds * 1000:.2f}"
+                response.headers['X-SQL-Slowest-Ms'] = f"{slowest[0][0] * 1000:.2f}" if slowest else "0.00"
+                response.headers['X-SQL-Repeated'] = str(len(repeated))
+                response.headers.add('Server-Timing',
+                                     f'db;dur={stats.seconds * 1000:.2f};desc="{stats.statements} statements"')
+                for sql, count in repeated:
+                    logger.warning("Possible N+1 in %s: ran %d times: %s", request.endpoint, count, preview(sql))
+            else:
+                logger.info(json.dumps({
+                    'endpoint': request.endpoint,
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'statements': stats.statements,
+                    'db_ms': round(stats.seconds * 1000, 2),
+                    'slowest': [{'ms': round(seconds * 1000, 2), 'sql': preview(sql)}
+                                for seconds, sql in stats.slowest()],
+                    'repeated': [{'count': count, 'sql': preview(sql)} for sql, count in repeated]
+                }))
+            return response
@@ -0,0 +1,39 @@
+"""Per-connection SQLite settings.
+
+SQLITE_PRAGMAS in the app config maps pragma names to values, for example
+{'journal_mode': 'WAL', 'busy_timeout': 30000}. They are set on every new
+connection from a connect-event hook, in the order given, so each pooled
+connection gets the same settings. Databases other than SQLite are left
+alone.
+"""
+from sqlalchemy import event
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+class SQLitePragmas:
+    """Sets SQLITE_PRAGMAS on each connection of the app's engines."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def init_app(self, app):
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        if not pragmas:
+            return
+
+        def on_connect(dbapi_connection, connection_record):
+            apply_pragmas(dbapi_connection, pragmas)
+
+        with app.app_context():
+            engines = list(self.db.engines.values())
+        for engine in engines:
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', on_connect)
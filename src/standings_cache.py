@@ -0,0 +1,24 @@
+from cache import LRUCache
+
+
+class StandingsCache(LRUCache):
+    """LRU cache for computed tournament standings.
+
+    Entries are keyed on (tournament_id, version). Every mutation that can
+    change standings bumps Tournament.version, so stale entries are never read
+    again and simply age out of the cache.
+    """
+
+    def __init__(self, max_size=256):
+        super().__init__('STANDINGS_CACHE_SIZE', max_size)
+
+    def get(self, tournament):
+        return super().get((tournament.id, tournament.version or 0))
+
+    def set(self, tournament, value):
+        super().set((tournament.id, tournament.version or 0), value)
+
+
+def bump_version(tournament):
+    """Mark a tournament's cached standings as out of date."""
+    tournament.version = (tournament.version or 0) + 1
@@ -0,0 +1,169 @@
+"""Live tournament standings worked out by the database.
+
+standings_select builds a single SELECT that tallies each player's wins and
+losses with GROUP BY, averages the opponents' win percentages (and theirs in
+turn) for the Swiss tiebreakers, and numbers the players with ROW_NUMBER()
+following the same rules as rankings.rank_players:
+
+    swiss               wins, then OWP, then OOWP
+    round robin         wins, then head-to-head when exactly two players
+                        are tied, or OWP when more are
+    single elimination  wins
+
+Tiebreakers that agree to nine decimal places count as equal, since the
+database may add up the same percentages in a different order, and players
+still tied keep registration order. The query only uses standard SQL, so it
+runs the same on SQLite and PostgreSQL.
+"""
+from sqlalchemy import Float, and_, case, cast, false, func, literal, select, true, union_all
+from db import db
+from models import Match, Round, TournamentPlayer, User
+
+
+def standings_select(tournament_id, tournament_format, completed_rounds_only=False):
+    """The standings query: one row per player, best first.
+
+    Columns are player_id, wins, losses, owp, oowp, rank and the player's
+    names (user_first_name and user_last_name are null for guests).
+    """
+    round_filter = [Round.tournament_id == tournament_id]
+    if completed_rounds_only:
+        round_filter.append(Round.status == 'completed')
+    matches = (
+        select(Match.player1_id, Match.player2_id, Match.winner_id, Match.is_bye)
+        .join(Round, Match.round_id == Round.id)
+        .where(*round_filter)
+        .cte('tournament_matches')
+    )
+    m = matches.c
+    # Games with a result, once from each player's side
+    decided = and_(func.coalesce(m.is_bye, false()) == false(), m.winner_id.isnot(None))
+    games = union_all(
+        select(
+            m.player1_id.label('player_id'),
+            m.player2_id.label('opponent_id'),
+            case((m.winner_id == m.player1_id, 1), else_=0).label('won'),
+            case((and_(m.winner_id == m.player2_id, m.player2_id.isnot(None)), 1), else_=0).label('lost')
+        ).where(decided),
+        select(
+            m.player2_id,
+            m.player1_id,
+            case((m.winner_id == m.player2_id, 1), else_=0),
+            case((m.winner_id == m.player1_id, 1), else_=0)
+        ).where(decided, m.player2_id.isnot(None))
+    ).cte('games')
+    byes = (
+        select(m.player1_id.label('player_id'), func.count().label('byes'))
+        .where(m.is_bye == true())
+        .group_by(m.player1_id)
+        .cte('byes')
+    )
+
+    records = (
+        select(
+            TournamentPlayer.id.label('player_id'),
+            (func.coalesce(func.sum(games.c.won), 0) + func.coalesce(func.max(byes.c.byes), 0)).label('wins'),
+            func.coalesce(func.sum(games.c.lost), 0).label('losses')
+        )
+        .select_from(TournamentPlayer)
+        .outerjoin(games, games.c.player_id == TournamentPlayer.id)
+        .outerjoin(byes, byes.c.player_id == TournamentPlayer.id)
+        .where(TournamentPlayer.tournament_id == tournament_id)
+        .group_by(TournamentPlayer.id)
+        .cte('records')
+    )
+    player = records.alias('player')
+    opponent = records.alias('opponent')
+
+    # Average win percentage of the opponents played, one entry per game;
+    # opponents without a decided game are left out
+    owp = (
+        select(
+            games.c.player_id,
+            func.avg(cast(opponent.c.wins, Float) / (opponent.c.wins + opponent.c.losses)).label('owp')
+        )
+        .join(opponent, opponent.c.player_id == games.c.opponent_id)
+        .where(opponent.c.wins + opponent.c.losses > 0)
+        .group_by(games.c.player_id)
+        .cte('owp')
+    )
+    opponent_owp = owp.alias('opponent_owp')
+    oowp = (
+        select(games.c.player_id, func.avg(func.coalesce(opponent_owp.c.owp, 0.0)).label('oowp'))
+        .join(opponent, opponent.c.player_id == games.c.opponent_id)
+        .outerjoin(opponent_owp, opponent_owp.c.player_id == games.c.opponent_id)
+        .group_by(games.c.player_id)
+        .cte('oowp')
+    )
+    # Wins against players on the same number of wins, for two-way round robin ties
+    head_to_head = (
+        select(games.c.player_id, func.sum(games.c.won).label('wins'))
+        .join(player, player.c.player_id == games.c.player_id)
+        .join(opponent, opponent.c.player_id == games.c.opponent_id)
+        .where(player.c.wins == opponent.c.wins)
+        .group_by(games.c.player_id)
+        .cte('head_to_head')
+    )
+    tiers = (
+        select(
+            records.c.player_id,
+            records.c.wins,
+            records.c.losses,
+            func.coalesce(owp.c.owp, 0.0).label('owp'),
+            func.coalesce(oowp.c.oowp, 0.0).label('oowp'),
+            func.coalesce(head_to_head.c.wins, 0).label('head_to_head'),
+            func.count().over(partition_by=records.c.wins).label('tied')
+        )
+        .select_from(records)
+        .outerjoin(owp, owp.c.player_id == records.c.player_id)
+        .outerjoin(oowp, oowp.c.player_id == records.c.player_id)
+        .outerjoin(head_to_head, head_to_head.c.player_id == records.c.player_id)
+        .cte('tiers')
+    )
+    t = tiers.c
+    owp_key, oowp_key = func.round(t.owp * 1e9), func.round(t.oowp * 1e9)
+
+    if tournament_format == 'swiss':
+        owp_column, oowp_column = t.owp, t.oowp
+        order = [t.wins.desc(), owp_key.desc(), oowp_key.desc()]
+    elif tournament_format == 'round robin':
+        # OWP is only worked out (and shown) for ties of three or more
+        owp_column, oowp_column = case((t.tied > 2, t.owp), else_=0.0), literal(0.0)
+        order = [t.wins.desc(), case((t.tied == 2, t.head_to_head)).desc(), case((t.tied > 2, owp_key)).desc()]
+    else:
+        owp_column = oowp_column = literal(0.0)
+        order = [t.wins.desc()]
+    rank = func.row_number().over(order_by=order + [t.player_id])
+
+    return (
+        select(
+            t.player_id,
+            t.wins,
+            t.losses,
+            owp_column.label('owp'),
+            oowp_column.label('oowp'),
+            rank.label('rank'),
+            User.first_name.label('user_first_name'),
+            User.last_name.label('user_last_name'),
+            TournamentPlayer.guest_firstname,
+            TournamentPlayer.guest_lastname
+        )
+        .select_from(tiers)
+        .join(TournamentPlayer, TournamentPlayer.id == t.player_id)
+        .outerjoin(User, TournamentPlayer.user_id == User.id)
+        .order_by(rank)
+    )
+
+
+def ranked_standings(tournament_id, tournament_format, completed_rounds_only=False):
+    """Ranking rows (id, name, wins, losses, owp, oowp, rank), best first, from one query."""
+    return [{
+        'id': row.player_id,
+        'name': (f"{row.user_first_name} {row.user_last_name}" if row.user_first_name is not None
+                 else f"{row.guest_firstname} {row.guest_lastname}"),
+        'wins': row.wins,
+        'losses': row.losses,
+        'owp': round(row.owp, 3),
+        'oowp': round(row.oowp, 3),
+        'rank': row.rank
+    } for row in db.session.execute(standings_select(tournament_id, tournament_format, completed_rounds_only))]
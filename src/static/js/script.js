@@ -22,6 +22,12 @@ function initTournamentForm() {
   // Check if we're on the tournament form page
   if (!competitorCountSelect) return;
 
+  // Round robin options only apply to round robin tournaments
+  const roundRobinOptions = document.getElementById('roundRobinOptions');
+  document.getElementById('tournamentType').addEventListener('change', function() {
+    roundRobinOptions.style.display = this.value === 'round robin' ? '' : 'none';
+  });
+
   // Current user info (passed from Flask via window object)
   const currentUser = {
     id: window.currentUserId || "",
@@ -1036,6 +1042,9 @@ function resetForm() {
     document.getElementById('gameType').selectedIndex = 0;
     document.getElementById('competitorCount').selectedIndex = 0;
     document.getElementById('isCompetitor').checked = false;
+    document.getElementById('doubleRoundRobin').checked = false;
+    document.getElementById('publishAllRounds').checked = false;
+    document.getElementById('roundRobinOptions').style.display = 'none';
     
     // Clear any errors
     clearError();
@@ -1272,7 +1281,9 @@ function resetForm() {
         game_type: document.getElementById('gameType').value,
         include_creator_as_player: isCompetitorCheckbox.checked,
         created_by: currentUser.id,
-        round_time_minutes: parseInt(document.getElementById('roundTimeLimit').value)
+        round_time_minutes: parseInt(document.getElementById('roundTimeLimit').value),
+        double_round_robin: document.getElementById('doubleRoundRobin').checked,
+        publish_all_rounds: document.getElementById('publishAllRounds').checked
     };
 
     // Include tournament ID if we're editing an existing tournament
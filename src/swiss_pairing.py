@@ -0,0 +1,199 @@
+"""Swiss pairing engines.
+
+An engine takes the players in standings order and the tournament's pairing
+history, both already loaded into memory, and returns (pairs, bye_player_id).
+Engines are registered in PAIRING_ENGINES and picked with the
+SWISS_PAIRING_ENGINE config key.
+
+The default 'matching' engine finds the minimum-cost perfect matching over
+the pairing graph, where an edge costs more the further apart the two
+players' scores are and a great deal more for a rematch, and a bye costs
+more for higher scores and for players who already had one. Solving that
+exactly over the complete graph (Edmonds' blossom algorithm) is cubic in the
+number of players, which is far too slow in pure Python for large events, so
+each player is only connected to the next few players in the standings
+(SWISS_PAIRING_WINDOW). Over that banded graph the optimum is found exactly
+with a dynamic programme that is linear in the number of players. If the
+result still contains a rematch the band is widened while the work stays
+within WINDOW_BUDGET, so small events are solved over the complete graph.
+"""
+from collections import Counter, namedtuple
+
+SwissPlayer = namedtuple('SwissPlayer', ['player_id', 'wins', 'owp', 'oowp'])
+
+# Edge and bye costs used by the matching engine
+REMATCH_PENALTY = 10000
+REPEAT_BYE_PENALTY = 10000
+SCORE_GAP_PENALTY = 100
+BYE_SCORE_PENALTY = 100
+
+DEFAULT_WINDOW = 6
+# Largest players * 2 ** window the matching engine will widen its band to
+WINDOW_BUDGET = 2 ** 17
+
+
+class PairingHistory:
+    """Who has played whom, and who has had a bye, in earlier rounds."""
+
+    def __init__(self, matches=()):
+        self.meetings = Counter()
+        self.byes = Counter()
+        for player1_id, player2_id, is_bye in matches:
+            self.add(player1_id, player2_id, is_bye)
+
+    def add(self, player1_id, player2_id, is_bye=False):
+        if is_bye or player2_id is None:
+            self.byes[player1_id] += 1
+        else:
+            self.meetings[frozenset((player1_id, player2_id))] += 1
+
+    def times_met(self, player1_id, player2_id):
+        return self.meetings[frozenset((player1_id, player2_id))]
+
+
+def sort_standings(players):
+    """Order SwissPlayers by score, then by tiebreakers."""
+    return sorted(players, key=lambda p: (-p.wins, -p.owp, -p.oowp))
+
+
+def pair_cost(player1, player2, history):
+    gap = player1.wins - player2.wins
+    return REMATCH_PENALTY * history.times_met(player1.player_id, player2.player_id) + SCORE_GAP_PENALTY * gap * gap
+
+
+def bye_cost(player, history):
+    return REPEAT_BYE_PENALTY * history.byes[player.player_id] + BYE_SCORE_PENALTY * player.wins
+
+
+def matching_pairings(standings, history, window=DEFAULT_WINDOW):
+    """Minimum-cost pairing of the standings, each player paired within `window` places.
+
+    The window is widened two places at a time while the pairing contains a
+    rematch and the next window fits in WINDOW_BUDGET.
+    """
+    n = len(standings)
+    pairs, bye_player_id = banded_matching(standings, history, window)
+    while window < n and n << (window + 2) <= WINDOW_BUDGET and \
+            any(history.times_met(a, b) for a, b in pairs):
+        window += 2
+        pairs, bye_player_id = banded_matching(standings, history, window)
+    return pairs, bye_player_id
+
+
+def banded_matching(standings, history, window):
+    """Exact minimum-cost pairing where partners are at most `window` - 1 places apart.
+
+    The dynamic programme walks the standings in order. Its state is which of
+    the next `window` players have already been paired with someone above
+    them, plus whether the bye has been given out. Ties in cost go to the
+    partner closest in the standings.
+    """
+    n = len(standings)
+    window = max(2, min(window, n))
+    needs_bye = n % 2 == 1
+
+    # layers[i] maps (mask, bye_given) -> (cost, previous state, choice) on reaching player i
+    layers = [{(0, False): (0, None, None)}]
+    for i in range(n):
+        layer = {}
+        player = standings[i]
+
+        def relax(state, cost, previous, choice):
+            if state not in layer or cost < layer[state][0]:
+                layer[state] = (cost, previous, choice)
+
+        for (mask, bye_given), (cost, _, _) in layers[i].items():
+            previous = (mask, bye_given)
+            if mask & 1:
+                relax((mask >> 1, bye_given), cost, previous, None)
+                continue
+            if needs_bye and not bye_given:
+                relax((mask >> 1, True), cost + bye_cost(player, history), previous, 'bye')
+            for offset in range(1, window):
+                j = i + offset
+                if j >= n:
+                    break
+                if mask & (1 << offset):
+                    continue
+                edge = pair_cost(player, standings[j], history) + offset
+                relax(((mask | (1 << offset)) >> 1, bye_given), cost + edge, previous, j)
+        layers.append(layer)
+
+    # Walk the choices back from the finished state
+    pairs = []
+    bye_player_id = None
+    state = (0, needs_bye)
+    for i in range(n, 0, -1):
+        _, previous, choice = layers[i][state]
+        if choice == 'bye':
+            bye_player_id = standings[i - 1].player_id
+        elif choice is not None:
+            pairs.append((standings[i - 1].player_id, standings[choice].player_id))
+        state = previous
+    pairs.reverse()
+    return pairs, bye_player_id
+
+
+def greedy_pairings(standings, history, window=None):
+    """The original score-group pairer, kept for comparison.
+
+    Pairs each score group top-down with the first opponent not met before,
+    falling back to a rematch. Players left over in one group move down to
+    the next, and the lowest-ranked player left at the end without a previous
+    bye gets the bye.
+    """
+    pairs = []
+    groups = {}
+    for player in standings:
+        groups.setdefault(player.wins, []).append(player)
+
+    leftover = []
+    for score in sorted(groups, reverse=True):
+        group = leftover + groups[score]
+        leftover = []
+        while len(group) > 1:
+            player1 = group.pop(0)
+            for i, player2 in enumerate(group):
+                if not history.times_met(player1.player_id, player2.player_id):
+                    break
+            else:
+                i = 0
+            player2 = group.pop(i)
+            pairs.append((player1.player_id, player2.player_id))
+        leftover = group
+
+    bye_player_id = None
+    if leftover:
+        bye_player_id = leftover[0].player_id
+        if history.byes[bye_player_id]:
+            # Swap the bye with the lowest-ranked paired player who has not had one
+            for player in reversed(standings):
+                if not history.byes[player.player_id]:
+                    for k, pair in enumerate(pairs):
+                        if player.player_id in pair:
+                            other = pair[0] if pair[1] == player.player_id else pair[1]
+                            pairs[k] = (other, bye_player_id) if pair[0] == other else (bye_player_id, other)
+                            bye_player_id = player.player_id
+                            break
+                    break
+    return pairs, bye_player_id
+
+
+PAIRING_ENGINES = {
+    'matching': matching_pairings,
+    'greedy': greedy_pairings,
+}
+
+
+def swiss_pairings(players, history, engine='matching', window=DEFAULT_WINDOW):
+    """Pair SwissPlayers for the next round with the named engine."""
+    return PAIRING_ENGINES[engine](sort_standings(players), history, window)
+
+
+def pairing_quality(pairs, bye_player_id, players, history):
+    """(rematches, total squared score gap, repeat byes) for a set of pairings."""
+    wins = {p.player_id: p.wins for p in players}
+    rematches = sum(1 for a, b in pairs if history.times_met(a, b))
+    score_gap = sum((wins[a] - wins[b]) ** 2 for a, b in pairs)
+    repeat_byes = 1 if bye_player_id is not None and history.byes[bye_player_id] else 0
+    return rematches, score_gap, repeat_byes
@@ -0,0 +1,102 @@
+"""Time single elimination brackets from start to champion.
+
+Run from src with:  python -m tests.benchmarkBracket
+
+For each field size a tournament is started in an in-memory database and
+played out with random winners. The table shows the time to build the
+bracket, the statements and time to start the tournament, the slowest round
+(pairing it from the stored bracket and advancing every winner) and the
+statements that round took, and the time to load the whole bracket.
+"""
+import random
+import time
+from sqlalchemy import event
+from app import create_app
+from bracket import build_bracket, round_pairings
+from config import TestConfig
+from db import db
+from models import BracketSlot, Tournament
+from routes import advance_winners, bootstrap_tournament
+
+FIELDS = [8, 100, 1000, 4096]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def load_bracket(tournament_id):
+    return {
+        slot: player_id for slot, player_id in
+        db.session.query(BracketSlot.slot, BracketSlot.player_id).filter_by(tournament_id=tournament_id)
+        if player_id is not None
+    }
+
+
+def run(num_players, counter, rng):
+    _, build_time = timed(lambda: build_bracket(list(range(num_players))))
+
+    tournament = Tournament(title=f'Knockout {num_players}', format='single elimination',
+                            game_type='Chess', status='active', created_by=None)
+    db.session.add(tournament)
+    db.session.flush()
+    players = [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(num_players)]
+    counter.count = 0
+    _, start_time = timed(lambda: bootstrap_tournament(tournament, players))
+    start_statements = counter.count
+    db.session.commit()
+
+    slowest, round_statements = 0.0, 0
+    bracket = load_bracket(tournament.id)
+    size = (len(db.session.query(BracketSlot.id).filter_by(tournament_id=tournament.id).all()) + 1) // 2
+    round_number = 1
+    while 1 not in bracket:
+        def play_round():
+            winners = [
+                (slot, player1_id if player2_id is None else rng.choice((player1_id, player2_id)))
+                for slot, player1_id, player2_id in round_pairings(bracket, size, round_number)
+            ]
+            advance_winners(tournament.id, winners)
+            db.session.commit()
+            return winners
+
+        counter.count = 0
+        winners, elapsed = timed(play_round)
+        if elapsed > slowest:
+            slowest, round_statements = elapsed, counter.count
+        bracket.update(winners)
+        round_number += 1
+
+    _, load_time = timed(lambda: load_bracket(tournament.id))
+    return build_time, start_statements, start_time, slowest, round_statements, load_time
+
+
+def main():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        counter = StatementCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        rng = random.Random(0)
+        print(f"{'players':>7} {'build':>9} {'start':>20} {'slowest round':>22} {'load':>9}")
+        for num_players in FIELDS:
+            build_time, start_statements, start_time, slowest, round_statements, load_time = \
+                run(num_players, counter, rng)
+            print(f"{num_players:>7} {build_time * 1000:>6.1f} ms "
+                  f"{start_statements:>4} stmts {start_time * 1000:>6.1f} ms "
+                  f"{round_statements:>4} stmts {slowest * 1000:>8.1f} ms "
+                  f"{load_time * 1000:>6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
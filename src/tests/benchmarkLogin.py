@@ -0,0 +1,132 @@
+"""Login throughput during a check-in burst, with and without the hashing pool.
+
+Run from src with:  python -m tests.benchmarkLogin
+
+One app, as one threaded server worker would run it, gets LOGINS threads
+posting to /login as fast as they can while BROWSERS threads keep loading
+the dashboard. It runs once hashing on the request threads
+(PASSWORD_HASH_WORKERS = 0) and once with a pool of --workers processes,
+each for --seconds on a fresh SQLite file. The table shows logins per
+second and the dashboard's requests per second and response times, which
+is where hashing on the request threads hurts.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from app import create_app
+from config import DeploymentConfig
+from db import db, password_hasher
+from models import User
+
+LOGINS = 16
+BROWSERS = 4
+USERS = 200
+DURATION = 10.0
+PASSWORD = 'check-in'
+
+
+def mode_config(path, workers):
+    class LoginBenchmarkConfig(DeploymentConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        MAIL_QUEUE_WORKERS = 0
+        PASSWORD_HASH_WORKERS = workers
+    return LoginBenchmarkConfig
+
+
+def setup(app):
+    """USERS players sharing one password hash (hashing each would take a while)."""
+    with app.app_context():
+        db.create_all()
+        password_hash = password_hasher.hash(PASSWORD)
+        db.session.add_all([
+            User(username=f'player{i}', email=f'player{i}@example.com', first_name='Player',
+                 last_name=str(i), password_hash=password_hash)
+            for i in range(USERS)
+        ])
+        db.session.commit()
+        return db.session.query(User.id).filter_by(username='player0').scalar()
+
+
+def log_in(app, number, deadline, timings, failures):
+    # No cookies, so every post is a fresh login rather than a redirect for a logged in user
+    client = app.test_client(use_cookies=False)
+    i = number
+    while time.time() < deadline:
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': f'player{i % USERS}', 'password': PASSWORD})
+        record(response.status_code == 302 and '/dashboard' in response.headers.get('Location', ''),
+               start, timings, failures)
+        i += LOGINS
+
+
+def browse(app, user_id, deadline, timings, failures):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    while time.time() < deadline:
+        start = time.perf_counter()
+        record(client.get('/dashboard').status_code == 200, start, timings, failures)
+
+
+def record(ok, start, timings, failures):
+    if ok:
+        timings.append(time.perf_counter() - start)
+    else:
+        failures.append(start)
+
+
+def run(workers, seconds):
+    """(login timings, login failures, dashboard timings, dashboard failures) for one pool size."""
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(mode_config(os.path.join(directory, 'login.db'), workers))
+        user_id = setup(app)
+        # Start the pool before the clock does
+        password_hasher.verify(password_hasher.hash(PASSWORD), PASSWORD)
+
+        logins, login_failures, views, view_failures = [], [], [], []
+        deadline = time.time() + seconds
+        threads = [threading.Thread(target=log_in, args=(app, i, deadline, logins, login_failures))
+                   for i in range(LOGINS)]
+        threads += [threading.Thread(target=browse, args=(app, user_id, deadline, views, view_failures))
+                    for _ in range(BROWSERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        password_hasher.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+        return logins, login_failures, views, view_failures
+
+
+def summary(timings, failures, seconds):
+    if not timings:
+        return f"{0:>7.1f} {len(failures):>6} {'-':>8} {'-':>8}"
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    return (f"{len(timings) / seconds:>7.1f} {len(failures):>6} "
+            f"{statistics.median(timings) * 1000:>5.0f} ms {p95 * 1000:>5.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="hashing processes in the pool")
+    parser.add_argument('--seconds', type=float, default=DURATION, help="length of each run")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    print(f"{LOGINS} threads logging in, {BROWSERS} loading the dashboard, {args.seconds:.0f} s per run, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'hashing':>12} {'request':>10} {'per s':>7} {'failed':>6} {'median':>8} {'p95':>8}")
+    for label, workers in (('inline', 0), (f'pool of {args.workers}', args.workers)):
+        logins, login_failures, views, view_failures = run(workers, args.seconds)
+        print(f"{label:>12} {'login':>10} {summary(logins, login_failures, args.seconds)}")
+        print(f"{'':>12} {'dashboard':>10} {summary(views, view_failures, args.seconds)}")
+
+
+if __name__ == '__main__':
+    main()
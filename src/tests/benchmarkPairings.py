@@ -0,0 +1,54 @@
+"""Compare the Swiss pairing engines on simulated tournaments.
+
+Run from src with:  python -m tests.benchmarkPairings
+
+Each event is played out round by round with random winners. For every
+engine the table shows the slowest single round, and totals over all rounds
+of rematches, squared score gaps between opponents, and repeat byes.
+"""
+import random
+import time
+from swiss_pairing import PAIRING_ENGINES, PairingHistory, SwissPlayer, pairing_quality, swiss_pairings
+
+EVENTS = [(8, 5), (9, 6), (16, 8), (33, 8), (128, 7), (1000, 10)]
+SEEDS = 5
+
+
+def simulate(num_players, num_rounds, engine, seed):
+    rng = random.Random(seed)
+    wins = dict.fromkeys(range(num_players), 0)
+    history = PairingHistory()
+    totals = [0, 0, 0]
+    slowest = 0.0
+    for _ in range(num_rounds):
+        players = [SwissPlayer(pid, wins[pid], 0.0, 0.0) for pid in wins]
+        start = time.perf_counter()
+        pairs, bye_player_id = swiss_pairings(players, history, engine)
+        slowest = max(slowest, time.perf_counter() - start)
+
+        quality = pairing_quality(pairs, bye_player_id, players, history)
+        totals = [total + value for total, value in zip(totals, quality)]
+        for player1_id, player2_id in pairs:
+            history.add(player1_id, player2_id)
+            wins[rng.choice((player1_id, player2_id))] += 1
+        if bye_player_id is not None:
+            history.add(bye_player_id, None, is_bye=True)
+            wins[bye_player_id] += 1
+    return slowest, totals
+
+
+def main():
+    print(f"{'players':>7} {'rounds':>6} {'engine':>9} {'slowest round':>14} {'rematches':>9} {'score gap':>9} {'repeat byes':>11}")
+    for num_players, num_rounds in EVENTS:
+        for engine in PAIRING_ENGINES:
+            slowest, totals = 0.0, [0, 0, 0]
+            for seed in range(SEEDS):
+                event_slowest, event_totals = simulate(num_players, num_rounds, engine, seed)
+                slowest = max(slowest, event_slowest)
+                totals = [total + value for total, value in zip(totals, event_totals)]
+            print(f"{num_players:>7} {num_rounds:>6} {engine:>9} {slowest * 1000:>11.1f} ms "
+                  f"{totals[0]:>9} {totals[1]:>9} {totals[2]:>11}")
+
+
+if __name__ == '__main__':
+    main()
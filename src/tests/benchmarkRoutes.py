@@ -0,0 +1,254 @@
+"""Latency and SQL statement counts of the main routes, checked against a baseline.
+
+Run from src with:  python -m tests.benchmarkRoutes
+
+For each database size a SQLite file is filled by generate_load_db with a
+fixed seed, and the routes are driven through the Flask test client with
+the DeploymentConfig profile. Every route gets one warm-up request and then
+ITERATIONS timed ones. The dashboard, analytics and account pages are
+always requested as the same two users, so that user's cached row, history
+and friend ids are dropped before each of them; otherwise only cache hits
+would be measured. As in timeit, garbage collection is paused while a
+request is timed, so a collection of earlier garbage isn't charged to
+whichever route happens to run into it. The table shows the median and 95th
+percentile response times and the most statements any one request ran.
+
+Results are compared with tests/benchmarkBaseline.json. A route regresses
+when it runs more statements than its baseline, or when its p95 is more
+than --tolerance times the baseline p95 and at least SLACK_MS slower; any
+regression makes the run exit with status 1. Statement counts do not depend
+on the machine, response times do, so refresh the baseline with
+--update-baseline on the machine the checks run on.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from sqlalchemy import event, func
+from app import create_app
+from config import DeploymentConfig
+from db import db
+from friend_graph import friend_users, invalidate_friends
+from generate_load_db import generate
+from identity import invalidate_identity
+from models import Match, Round, Tournament, TournamentPlayer, User
+from player_history import invalidate_users
+
+SIZES = {
+    'small': dict(users=500, friends_per_user=10, tournaments=200, players=8),
+    'medium': dict(users=5000, friends_per_user=10, tournaments=2000, players=16),
+    'large': dict(users=50000, friends_per_user=10, tournaments=20000, players=32),
+}
+DEFAULT_SIZES = ['small', 'medium']
+ROUTES = ['dashboard', 'analytics', 'account', 'view_tournament', 'complete_round', 'next_round', 'start_tournament']
+ITERATIONS = 20
+BASELINE = os.path.join(os.path.dirname(__file__), 'benchmarkBaseline.json')
+TOLERANCE = 1.5
+SLACK_MS = 5.0
+
+
+def size_config(path):
+    class BenchmarkConfig(DeploymentConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        MAIL_QUEUE_WORKERS = 0
+    return BenchmarkConfig
+
+
+def logged_in_client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+class RouteTimer:
+    """Times requests and counts the SQL statements each one runs."""
+
+    def __init__(self):
+        self.statements = 0
+        self.samples = {route: [] for route in ROUTES}
+
+    def __call__(self, *args):
+        self.statements += 1
+
+    def request(self, route, send, record=True):
+        self.statements = 0
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            response = send()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if response.status_code != 200 or (response.is_json and response.get_json().get('success') is False):
+            raise RuntimeError(f"{route} failed with {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        if record:
+            self.samples[route].append((elapsed, self.statements))
+        return response
+
+    def results(self):
+        results = {}
+        for route, samples in self.samples.items():
+            timings = [elapsed for elapsed, _ in samples]
+            results[route] = {
+                'p50_ms': round(statistics.median(timings) * 1000, 2),
+                'p95_ms': round(statistics.quantiles(timings, n=20)[-1] * 1000, 2),
+                'statements': max(statements for _, statements in samples)
+            }
+        return results
+
+
+def forget_user(user_id):
+    """Drop everything cached for a user, so their next request runs every query a first visit does."""
+    invalidate_identity(user_id)
+    invalidate_users(user_id)
+    invalidate_friends(user_id)
+
+
+def busiest_host():
+    return db.session.query(Tournament.created_by).filter(Tournament.created_by.isnot(None)) \
+        .group_by(Tournament.created_by).order_by(func.count().desc(), Tournament.created_by).first()[0]
+
+
+def busiest_player():
+    return db.session.query(TournamentPlayer.user_id).filter(TournamentPlayer.user_id.isnot(None)) \
+        .group_by(TournamentPlayer.user_id).order_by(func.count().desc(), TournamentPlayer.user_id).first()[0]
+
+
+def start_payload(host_id, num_players, number):
+    """A new Swiss tournament: the host's friends with accounts, then guests."""
+    usernames = [username for (username,) in friend_users(host_id, User.username)[:num_players // 2]]
+    players = [{'username': username} for username in usernames]
+    players += [{'guest_firstname': 'Guest', 'guest_lastname': str(i), 'email': f"bench{number}.{i}@example.com",
+                 'has_tourney_pro_account': False} for i in range(num_players - len(players))]
+    return {'title': f'Benchmark {number}', 'format': 'swiss', 'game_type': 'Chess',
+            'include_creator_as_player': False, 'players': players}
+
+
+def play_round(app, timer, clients, tournament_id, record):
+    """Complete a tournament's round in progress, pair the next one and start it."""
+    with app.app_context():
+        created_by = db.session.get(Tournament, tournament_id).created_by
+        round_id = db.session.query(Round.id).filter_by(tournament_id=tournament_id, status='in progress').scalar()
+        results = [
+            {'match_id': match_id, 'winner_id': random.choice((player1_id, player2_id))}
+            for match_id, player1_id, player2_id in
+            db.session.query(Match.id, Match.player1_id, Match.player2_id).filter_by(round_id=round_id, is_bye=False)
+        ]
+    if created_by not in clients:
+        clients[created_by] = logged_in_client(app, created_by)
+    client = clients[created_by]
+    timer.request('complete_round', lambda: client.post(f'/tournament/{tournament_id}/complete_round',
+                                                        json={'match_results': results}), record)
+    timer.request('next_round', lambda: client.post(f'/tournament/{tournament_id}/next_round'), record)
+    client.post(f'/tournament/{tournament_id}/start_round')
+
+
+def run(size, iterations):
+    """Seed a database of the given size and time every route; returns {route: result}."""
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(size_config(os.path.join(directory, 'benchmark.db')))
+        with app.app_context():
+            db.create_all()
+            generate(seed=0, **SIZES[size])
+            host_id, player_id = busiest_host(), busiest_player()
+            viewed = [tournament_id for (tournament_id,) in
+                      db.session.query(Tournament.id).filter_by(status='active').order_by(Tournament.id)]
+            played = [tournament_id for (tournament_id,) in
+                      db.session.query(Tournament.id).filter_by(status='active', format='swiss').order_by(Tournament.id)]
+            # Enough rounds left that no tournament finishes during the run
+            Tournament.query.filter(Tournament.id.in_(played)).update({'total_rounds': 1000})
+            db.session.commit()
+            timer = RouteTimer()
+            event.listen(db.engine, 'before_cursor_execute', timer)
+
+        host, player = logged_in_client(app, host_id), logged_in_client(app, player_id)
+        clients = {host_id: host}
+        for i in range(iterations + 1):
+            record = i > 0  # the first pass warms up caches and connections
+            forget_user(host_id)
+            timer.request('dashboard', lambda: host.get('/dashboard'), record)
+            forget_user(player_id)
+            timer.request('analytics', lambda: player.get('/analytics'), record)
+            forget_user(player_id)
+            timer.request('account', lambda: player.get('/account'), record)
+            tournament_id = viewed[i % len(viewed)]
+            timer.request('view_tournament', lambda: host.get(f'/tournament/{tournament_id}'), record)
+            play_round(app, timer, clients, played[i % len(played)], record)
+            with app.app_context():
+                payload = start_payload(host_id, SIZES[size]['players'], i)
+            timer.request('start_tournament', lambda: host.post('/start_tournament', json=payload), record)
+        return timer.results()
+
+
+def regressions(result, baseline, tolerance):
+    """Reasons a route's result is worse than its baseline."""
+    reasons = []
+    if result['statements'] > baseline['statements']:
+        reasons.append(f"{result['statements']} statements, baseline {baseline['statements']}")
+    if result['p95_ms'] > baseline['p95_ms'] * tolerance and result['p95_ms'] - baseline['p95_ms'] >= SLACK_MS:
+        reasons.append(f"p95 {result['p95_ms']:.1f} ms, baseline {baseline['p95_ms']:.1f} ms")
+    return reasons
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help=f"comma separated database sizes from {', '.join(SIZES)}")
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help="timed requests per route")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed p95 slowdown factor")
+    parser.add_argument('--update-baseline', action='store_true', help="save these results as the baseline")
+    args = parser.parse_args()
+    args.sizes = [size.strip() for size in args.sizes.split(',')]
+    unknown = set(args.sizes) - set(SIZES)
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+    if args.iterations < 2:
+        parser.error("--iterations must be at least 2")
+    return args
+
+
+def main():
+    args = parse_args()
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = False
+    print(f"{'size':>6} {'route':>16} {'p50':>9} {'p95':>9} {'stmts':>5}  baseline p95 / stmts")
+    for size in args.sizes:
+        results = run(size, args.iterations)
+        for route, result in results.items():
+            expected = baseline.get(size, {}).get(route)
+            if expected is None:
+                status = "no baseline"
+            else:
+                reasons = regressions(result, expected, args.tolerance)
+                failed = failed or bool(reasons)
+                status = f"{expected['p95_ms']:>8.1f} ms / {expected['statements']:<4} " + \
+                         ("REGRESSED: " + "; ".join(reasons) if reasons else "ok")
+            print(f"{size:>6} {route:>16} {result['p50_ms']:>6.1f} ms {result['p95_ms']:>6.1f} ms "
+                  f"{result['statements']:>5}  {status}")
+        if args.update_baseline:
+            baseline[size] = results
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
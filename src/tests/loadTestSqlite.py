@@ -0,0 +1,170 @@
+"""Concurrent round completions against spectators on a SQLite file.
+
+Run from src with:  python -m tests.loadTestSqlite
+
+Each organiser process runs its own Swiss tournament, repeatedly starting a
+round, posting every result to complete_round and generating the next
+round, while spectator processes keep loading random tournament pages.
+Every process has its own app and connection pool, as separate server
+workers would. The same load runs once with SQLite's defaults and once with
+the DeploymentConfig engine profile (WAL, busy timeout and so on), each on a
+fresh database file. The table shows requests served, requests that failed
+(for example with "database is locked") and response times.
+"""
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from app import create_app
+from config import Config, DeploymentConfig
+from db import db
+from models import Match, Round, Tournament, User
+
+ORGANISERS = 4
+SPECTATORS = 8
+PLAYERS = 16
+DURATION = 10.0
+PROFILES = {'default': Config, 'deployment': DeploymentConfig}
+
+
+def profile_config(profile, path):
+    class LoadTestConfig(PROFILES[profile]):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        MAIL_QUEUE_WORKERS = 0
+    return LoadTestConfig
+
+
+def logged_in_client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def setup(app):
+    """An organiser and their started tournament per organiser process."""
+    with app.app_context():
+        db.create_all()
+        organisers = []
+        for i in range(ORGANISERS):
+            user = User(username=f'organiser{i}', email=f'organiser{i}@example.com',
+                        first_name='Organiser', last_name=str(i), password_hash='unused')
+            db.session.add(user)
+            db.session.commit()
+            organisers.append(user.id)
+
+    tournaments = []
+    for user_id in organisers:
+        response = logged_in_client(app, user_id).post('/start_tournament', json={
+            'title': 'Load test', 'format': 'swiss', 'game_type': 'Chess',
+            'include_creator_as_player': False,
+            'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(PLAYERS)]
+        })
+        tournaments.append((user_id, response.get_json()['tournament_id']))
+
+    with app.app_context():
+        # Enough rounds that no organiser runs out during the test
+        Tournament.query.update({'total_rounds': 10000})
+        db.session.commit()
+    return tournaments
+
+
+def organise(app, user_id, tournament_id, deadline, timings, failures):
+    random.seed(tournament_id)
+    client = logged_in_client(app, user_id)
+    while time.time() < deadline:
+        client.post(f'/tournament/{tournament_id}/start_round')
+        with app.app_context():
+            round_id = db.session.query(Round.id).filter_by(
+                tournament_id=tournament_id, status='in progress').scalar()
+            results = [
+                {'match_id': match_id, 'winner_id': random.choice((player1_id, player2_id))}
+                for match_id, player1_id, player2_id in
+                db.session.query(Match.id, Match.player1_id, Match.player2_id)
+                .filter_by(round_id=round_id, is_bye=False)
+            ]
+        start = time.perf_counter()
+        response = client.post(f'/tournament/{tournament_id}/complete_round', json={'match_results': results})
+        record(response, start, timings, failures)
+        client.post(f'/tournament/{tournament_id}/next_round')
+
+
+def spectate(app, user_id, tournament_ids, deadline, timings, failures):
+    client = logged_in_client(app, user_id)
+    while time.time() < deadline:
+        start = time.perf_counter()
+        response = client.get(f'/tournament/{random.choice(tournament_ids)}')
+        record(response, start, timings, failures)
+
+
+def record(response, start, timings, failures):
+    if response.status_code == 200:
+        timings.append(time.perf_counter() - start)
+    else:
+        failures.append(response.status_code)
+
+
+def worker(profile, path, kind, args, ready, results):
+    """Run one organiser or spectator in its own process and report back."""
+    app = create_app(profile_config(profile, path))
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    timings, failures = [], []
+    target = organise if kind == 'write' else spectate
+    # Start the clock once every process has started up
+    ready.wait()
+    target(app, *args, time.time() + DURATION, timings, failures)
+    results.put((kind, timings, failures))
+
+
+def run(profile):
+    """(write timings, write failures, read timings, read failures) for one profile."""
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'load.db')
+        app = create_app(profile_config(profile, path))
+        tournaments = setup(app)
+        with app.app_context():
+            db.engine.dispose()
+        tournament_ids = [tournament_id for _, tournament_id in tournaments]
+
+        results = context.Queue()
+        jobs = [('write', (user_id, tournament_id)) for user_id, tournament_id in tournaments]
+        jobs += [('read', (tournaments[0][0], tournament_ids))] * SPECTATORS
+        ready = context.Barrier(len(jobs))
+        processes = [context.Process(target=worker, args=(profile, path, kind, args, ready, results))
+                     for kind, args in jobs]
+        for process in processes:
+            process.start()
+
+        totals = {'write': ([], []), 'read': ([], [])}
+        for _ in processes:
+            kind, timings, failures = results.get()
+            totals[kind][0].extend(timings)
+            totals[kind][1].extend(failures)
+        for process in processes:
+            process.join()
+        return totals['write'] + totals['read']
+
+
+def summary(timings, failures):
+    if not timings:
+        return f"{0:>6} {len(failures):>6} {'-':>8} {'-':>8}"
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    return (f"{len(timings):>6} {len(failures):>6} "
+            f"{statistics.median(timings) * 1000:>5.1f} ms {p95 * 1000:>5.1f} ms")
+
+
+def main():
+    print(f"{ORGANISERS} organisers completing rounds, {SPECTATORS} spectators, {DURATION:.0f} s per profile")
+    print(f"{'profile':>10} {'request':>14} {'served':>6} {'failed':>6} {'median':>8} {'p95':>8}")
+    for profile in PROFILES:
+        writes, write_failures, reads, read_failures = run(profile)
+        print(f"{profile:>10} {'complete_round':>14} {summary(writes, write_failures)}")
+        print(f"{'':>10} {'view':>14} {summary(reads, read_failures)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,62 @@
 import unittest
+import io
 import json
+import os
+import re
+import tempfile
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+from sqlalchemy import event, inspect
 from app import create_app, db
-from models import User
+from models import Friend, User, Tournament, TournamentPlayer, TournamentResult, Round, Match, UserStat
 from config import TestConfig   
+from username_index import SEARCH_TABLE, is_search_table
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    # Minimal local SMTP server: records delivered messages, refuses recipients containing "bounce"
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'RCPT':
+                if 'bounce' in line:
+                    self.reply('550 no such user')
+                else:
+                    recipients.append(line.split(':', 1)[1].strip('<> '))
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline().strip() != b'.':
+                    pass
+                self.server.messages.append(recipients)
+                recipients = []
+                self.reply('250 OK')
+            else:  # MAIL, RSET, NOOP
+                recipients = [] if command == 'RSET' else recipients
+                self.reply('250 OK')
 
 class RoutesTestCase(unittest.TestCase):
     def setUp(self):
@@ -29,6 +83,92 @@ class RoutesTestCase(unittest.TestCase):
         db.drop_all()
         self.app_context.pop()
 
+    def create_swiss_tournament(self, num_players, completed_rounds=1):
+        # Helper: active swiss tournament where player 2k always beats player 2k+1
+        tournament = Tournament(title='Test Swiss', game_type='Chess', format='swiss',
+                                created_by=self.test_user_id, status='active',
+                                num_players=num_players, total_rounds=completed_rounds + 1)
+        db.session.add(tournament)
+        db.session.flush()
+        players = [TournamentPlayer(tournament_id=tournament.id, guest_firstname='Guest',
+                                    guest_lastname=str(i)) for i in range(num_players)]
+        # Every other player has a TourneyPro account
+        for i, player in enumerate(players[1::2]):
+            player.user = User(username=f'player{tournament.id}_{i}', email=f'player{tournament.id}_{i}@example.com',
+                               first_name='Player', last_name=str(i), password_hash='unused')
+        db.session.add_all(players)
+        db.session.flush()
+        for round_number in range(1, completed_rounds + 1):
+            round_obj = Round(tournament_id=tournament.id, round_number=round_number, status='completed')
+            db.session.add(round_obj)
+            db.session.flush()
+            for i in range(0, num_players - 1, 2):
+                db.session.add(Match(round_id=round_obj.id, player1_id=players[i].id,
+                                     player2_id=players[i + 1].id, winner_id=players[i].id,
+                                     status='completed'))
+        db.session.commit()
+        return tournament, players
+
+    def create_round_in_progress(self, num_players):
+        # Helper: a swiss tournament with round one stored and round two in progress without results
+        from routes import update_tournament_results
+        tournament, players = self.create_swiss_tournament(num_players)
+        update_tournament_results(tournament.id)
+        round_two = Round(tournament_id=tournament.id, round_number=2, status='in progress')
+        db.session.add(round_two)
+        db.session.flush()
+        matches = [Match(round_id=round_two.id, player1_id=players[i + offset].id,
+                         player2_id=players[i + offset + 2].id, status='in progress')
+                   for i in range(0, num_players, 4) for offset in (0, 1)]
+        db.session.add_all(matches)
+        db.session.commit()
+        return tournament.id, [(m.id, m.player1_id, m.player2_id) for m in matches]
+
+    @contextmanager
+    def outside_app_context(self):
+        # Helper: make requests without the app context pushed in setUp. While it is pushed,
+        # every request shares its g, where Flask-Login keeps the user loaded by the first
+        # request, so later requests would not log in, log out or load the user themselves
+        self.app_context.pop()
+        try:
+            yield
+        finally:
+            self.app_context.push()
+
+    def count_statements(self, func):
+        # Helper: run func and return how many SQL statements it executed
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements)
+
+    def table_scans(self, func):
+        # Helper: run func and return the full table scans in the query plans of the statements it ran
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and not statement.lstrip().upper().startswith('INSERT'):
+                statements.append((statement, parameters))
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        scans = set()
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            # Plans name aliased tables by their alias; scans of CTEs and subqueries are fine
+            aliases = {alias: table for table, alias in re.findall(r'(\w+) AS (\w+)', statement)}
+            for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                match = re.match(r'SCAN (\w+)$', row[-1])
+                if match and aliases.get(match.group(1), match.group(1)) in db.metadata.tables:
+                    scans.add((aliases.get(match.group(1), match.group(1)), ' '.join(statement.split())))
+        return scans
+
     def test_landing_authenticated_redirect(self):
         # Test GET /
         # When user is logged in, landing page should redirect to /dashboard with status 302
@@ -88,6 +228,177 @@ class RoutesTestCase(unittest.TestCase):
         self.assertIn('players', data)
         self.assertEqual(data['players'], [])
 
+    def test_search_players_prefix_index(self):
+        # Usernames starting with the query come from the in-memory index, friends first,
+        # then usernames containing it; the searcher and other processes' sign ups are handled
+        from db import username_index
+        users = {name: User(username=name, email=f'{name}@example.com', first_name='First', last_name='Last',
+                            password_hash='unused') for name in ('alice', 'alfred', 'Alan', 'bob', 'malice', 'Zalf')}
+        db.session.add_all(users.values())
+        db.session.flush()
+        db.session.add_all([Friend.between(users['Alan'].id, self.test_user_id, 'accepted'),
+                            Friend.between(self.test_user_id, users['Zalf'].id)])
+        db.session.commit()
+        search = lambda query: [(p['username'], p['is_friend']) for p in
+                                self.client.get(f'/search_players?query={query}').get_json()['players']]
+
+        self.assertEqual(search('AL'), [('Alan', True), ('alfred', False), ('alice', False)])
+        self.assertEqual(search('test'), [])
+        self.assertEqual(self.count_statements(lambda: search('al')), 0)  # index and friend ids are cached
+        modes = ['scan'] + (['fts5'] if username_index.has_search_table() else [])
+        for mode in modes:
+            with mock.patch.object(username_index, 'substring', mode):
+                self.assertEqual(search('ali'), [('alice', False), ('malice', False)])
+                self.assertEqual(search('alf'), [('alfred', False), ('Zalf', False)])
+
+        # A sign up shows straight away, a user added by another process once the index refreshes
+        with self.outside_app_context():
+            anonymous = self.app.test_client()
+            anonymous.post('/signup', data={'first_name': 'New', 'last_name': 'User', 'username': 'alberta',
+                                            'email': 'alberta@example.com', 'password': 'secret'})
+            self.assertEqual(anonymous.get('/search_players?query=al').status_code, 302)
+        self.assertEqual(search('alb'), [('alberta', False)])
+        db.session.add(User(username='albert', email='albert@example.com', first_name='First', last_name='Last',
+                            password_hash='unused'))
+        db.session.commit()
+        self.assertEqual(search('alb'), [('alberta', False)])
+        with mock.patch('username_index.time.monotonic', return_value=time.monotonic() + 60):
+            self.assertEqual(search('alb'), [('albert', False), ('alberta', False)])
+
+    def test_search_players_during_index_refresh(self):
+        # A due refresh queries for new users without holding the index lock, so searches
+        # arriving meanwhile answer from the usernames already loaded
+        from db import username_index
+        self.assertEqual([p['username'] for p in username_index.search('test')], ['testuser'])
+        started, release = threading.Event(), threading.Event()
+        def slow_query(last_id):
+            started.set()
+            release.wait(5)
+            return []
+        with mock.patch.object(username_index, '_users_after', side_effect=slow_query):
+            refresh = threading.Thread(target=username_index.refresh, kwargs={'force': True})
+            refresh.start()
+            self.assertTrue(started.wait(5))
+            self.assertEqual([p['username'] for p in username_index.search('test')], ['testuser'])
+            self.assertFalse(release.is_set())
+            release.set()
+            refresh.join()
+
+    def test_friend_requests_keep_one_row_per_pair(self):
+        # Requests, accepts, edits and declines update the single row for a pair
+        # and drop both users' cached friend ids
+        from friend_graph import friend_ids
+        users = {}
+        for name in ('ann', 'ben', 'cat'):
+            users[name] = User(username=name, email=f'{name}@example.com', first_name='First', last_name='Last',
+                               password_hash='unused')
+        db.session.add_all(users.values())
+        db.session.flush()
+        ann, ben, cat = (users[name].id for name in ('ann', 'ben', 'cat'))
+        db.session.add_all([Friend.between(ann, self.test_user_id), Friend.between(cat, self.test_user_id)])
+        db.session.commit()
+        friends = lambda: [f['username'] for f in self.client.get('/get_friends').get_json()['friends']]
+        request_friend = lambda friend_id: self.client.post('/friends/request', json={'friend_id': friend_id})
+
+        self.assertEqual(friends(), [])
+        self.assertEqual(friend_ids(ann), frozenset())
+        requests = lambda: re.findall(r'user-username">([^<]*)<', self.client.get('/requests').get_data(as_text=True))
+        self.assertEqual(sorted(requests()), ['ann', 'cat'])
+
+        self.client.post(f'/friends/respond/{ann}', data={'response': 'accept'})
+        self.assertEqual(friends(), ['ann'])
+        self.assertEqual(friend_ids(ann), {self.test_user_id})
+        self.assertEqual(self.count_statements(lambda: friend_ids(self.test_user_id)), 0)
+        # Changes made by other processes are picked up once the entry expires
+        with mock.patch('cache.time.monotonic', return_value=time.monotonic() + 60):
+            self.assertEqual(self.count_statements(lambda: friend_ids(self.test_user_id)), 1)
+
+        # Asking someone who already asked us accepts their request
+        self.assertTrue(request_friend(cat).get_json()['success'])
+        self.assertEqual(friends(), ['ann', 'cat'])
+        self.assertTrue(request_friend(ben).get_json()['success'])
+        self.assertEqual(request_friend(ben).status_code, 409)
+        self.assertEqual(request_friend(ann).status_code, 409)
+        self.assertEqual(request_friend(self.test_user_id).status_code, 400)
+        self.assertEqual(friends(), ['ann', 'cat'])
+        self.assertEqual(sorted(requests()), ['ann', 'cat'])  # ben's request is ours, not incoming
+
+        self.client.post(f'/friends/edit/{ann}')
+        self.assertEqual(friends(), ['cat'])
+        self.assertEqual(friend_ids(ann), frozenset())
+        self.assertEqual(self.client.post(f'/friends/respond/{ben}', data={'response': 'accept'}).status_code, 404)
+        self.client.post(f'/friends/respond/{ann}', data={'response': 'decline'})
+
+        rows = db.session.query(Friend.user_id, Friend.friend_id, Friend.requested_by, Friend.status).all()
+        self.assertEqual(sorted(rows), sorted([
+            (self.test_user_id, ben, self.test_user_id, 'pending'),
+            (self.test_user_id, cat, cat, 'accepted')
+        ]))
+
+    def test_login_upgrades_outdated_password_hash(self):
+        # A hash made with an older work factor is replaced on the next successful login
+        from werkzeug.security import generate_password_hash
+        from db import password_hasher
+        user = db.session.get(User, self.test_user_id)
+        user.password_hash = generate_password_hash('password', 'pbkdf2:sha256:1000')
+        db.session.commit()
+        stored = lambda: db.session.query(User.password_hash).filter_by(id=self.test_user_id).scalar()
+
+        login = lambda password: self.app.test_client().post(
+            '/login', data={'username': 'testuser', 'password': password})
+        with self.outside_app_context():
+            self.assertNotIn('/dashboard', login('wrong').headers.get('Location', ''))
+        self.assertTrue(stored().startswith('pbkdf2:sha256:1000$'))
+        with self.outside_app_context():
+            self.assertIn('/dashboard', login('password').headers['Location'])
+        self.assertTrue(stored().startswith(password_hasher.method + '$'))
+        self.assertFalse(password_hasher.needs_rehash(stored()))
+        with self.outside_app_context():
+            self.assertIn('/dashboard', login('password').headers['Location'])
+
+    def test_password_hashing_in_worker_processes(self):
+        # With workers configured, hashes are made and checked in the process pool
+        from db import password_hasher
+        with mock.patch.object(password_hasher, 'workers', 1):
+            try:
+                password_hash = password_hasher.hash('secret')
+                self.assertTrue(password_hasher.verify(password_hash, 'secret'))
+                self.assertFalse(password_hasher.verify(password_hash, 'wrong'))
+                self.assertEqual(len(password_hasher._pool._processes), 1)
+            finally:
+                password_hasher.shutdown()
+
+    def test_logged_in_user_read_once_until_changed(self):
+        # The logged in user's row is read once, then comes from the identity cache until
+        # it is updated, deleted or the cache period runs out
+        user_reads = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if re.search(r'FROM users WHERE users.id = ', ' '.join(statement.split())):
+                user_reads.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', before_cursor_execute)
+        account = lambda: self.client.get('/account')
+
+        with self.outside_app_context():
+            for _ in range(3):
+                self.assertEqual(account().status_code, 200)
+        self.assertEqual(len(user_reads), 1)
+
+        with self.outside_app_context():
+            self.client.post('/update_profile', data={'first_name': 'Renamed'})
+            self.assertIn('Renamed', account().get_data(as_text=True))
+        self.assertEqual(len(user_reads), 2)
+        with self.outside_app_context(), mock.patch('cache.time.monotonic', return_value=time.monotonic() + 60):
+            account()
+        self.assertEqual(len(user_reads), 3)
+
+        db.session.delete(db.session.get(User, self.test_user_id))
+        db.session.commit()
+        with self.outside_app_context():
+            self.assertIn('/login', account().headers['Location'])
+        with self.client.session_transaction() as sess:
+            self.assertNotIn('_user_id', sess)
+
     def test_send_friend_request_no_data(self):
         # Test POST /friends/request without JSON payload
         # Should respond with 400 and JSON error message for missing 'friend_id'
@@ -107,5 +418,724 @@ class RoutesTestCase(unittest.TestCase):
         self.assertIsInstance(data['friends'], list)
         self.assertEqual(len(data['friends']), 0)
 
+    def test_compute_rankings_query_count(self):
+        # compute_rankings should rank winners first with a fixed number of queries
+        from routes import compute_rankings
+        small, _ = self.create_swiss_tournament(4)
+        large, _ = self.create_swiss_tournament(64)
+        rankings = compute_rankings(small.id, small.format)
+        self.assertEqual([r['wins'] for r in rankings], [1, 1, 0, 0])
+        self.assertEqual(rankings[0]['owp'], 0.0)
+        self.assertEqual(rankings[2]['owp'], 1.0)
+        small_id, large_id = small.id, large.id
+        small_count = self.count_statements(lambda: compute_rankings(small_id, 'swiss'))
+        large_count = self.count_statements(lambda: compute_rankings(large_id, 'swiss'))
+        self.assertEqual(small_count, large_count)
+
+    def test_standings_query_matches_ranking_rules(self):
+        # The SQL standings should order players exactly as rankings.compute_standings does
+        import random
+        from rankings import compute_standings
+        from standings_query import ranked_standings
+        for seed in range(20):
+            rng = random.Random(seed)
+            for tournament_format in ('swiss', 'round robin', 'single elimination'):
+                tournament = Tournament(title='Random', game_type='Chess', format=tournament_format,
+                                        created_by=self.test_user_id, status='active')
+                db.session.add(tournament)
+                db.session.flush()
+                players = [TournamentPlayer(tournament_id=tournament.id, guest_firstname='Guest',
+                                            guest_lastname=str(i)) for i in range(rng.randint(2, 12))]
+                db.session.add_all(players)
+                db.session.flush()
+                player_ids = [p.id for p in players]
+                matches = []
+                for round_number in range(1, rng.randint(1, 6) + 1):
+                    round_obj = Round(tournament_id=tournament.id, round_number=round_number, status='completed')
+                    db.session.add(round_obj)
+                    db.session.flush()
+                    pool = player_ids[:]
+                    rng.shuffle(pool)
+                    while len(pool) >= 2:
+                        a, b = pool.pop(), pool.pop()
+                        matches.append(Match(round_id=round_obj.id, player1_id=a, player2_id=b,
+                                             winner_id=rng.choice([a, b, a, b, None]), is_bye=False))
+                    if pool:
+                        matches.append(Match(round_id=round_obj.id, player1_id=pool[0], is_bye=True))
+                db.session.add_all(matches)
+                db.session.flush()
+
+                expected = [(e['player_id'], e['wins'], e['losses'], round(e['owp'], 3), round(e['oowp'], 3))
+                            for e in compute_standings(tournament_format, player_ids, matches)]
+                actual = [(r['id'], r['wins'], r['losses'], r['owp'], r['oowp'])
+                          for r in ranked_standings(tournament.id, tournament_format)]
+                self.assertEqual(actual, expected, (seed, tournament_format))
+
+    def test_incremental_results_match_full_rebuild(self):
+        # Applying only the newest round should store the same standings as a full rebuild
+        from routes import update_tournament_results
+        tournament, players = self.create_swiss_tournament(8)
+        update_tournament_results(tournament.id)
+        round_two = Round(tournament_id=tournament.id, round_number=2, status='completed')
+        db.session.add(round_two)
+        db.session.flush()
+        for a, b in [(0, 2), (1, 3), (4, 6), (5, 7)]:
+            db.session.add(Match(round_id=round_two.id, player1_id=players[a].id, player2_id=players[b].id,
+                                 winner_id=players[b].id, status='completed'))
+        db.session.commit()
+
+        def stored_standings():
+            return [(r.player_id, r.rank, r.wins, r.losses, r.opponent_win_percentage,
+                     r.opp_opp_win_percentage, r.rounds_applied)
+                    for r in TournamentResult.query.filter_by(tournament_id=tournament.id).order_by(TournamentResult.rank)]
+
+        update_tournament_results(tournament.id, round_two)
+        incremental = stored_standings()
+        self.assertTrue(all(row[-1] == 2 for row in incremental))
+        update_tournament_results(tournament.id)
+        self.assertEqual(incremental, stored_standings())
+
+    def test_view_tournament_query_count(self):
+        # The tournament page should issue the same number of statements for 8 or 256 players
+        from routes import update_tournament_results
+        counts = []
+        for num_players in (8, 256):
+            tournament, players = self.create_swiss_tournament(num_players)
+            update_tournament_results(tournament.id)
+            round_two = Round(tournament_id=tournament.id, round_number=2, status='in progress')
+            db.session.add(round_two)
+            db.session.flush()
+            for i in range(0, num_players, 2):
+                db.session.add(Match(round_id=round_two.id, player1_id=players[i].id,
+                                     player2_id=players[i + 1].id, winner_id=players[i + 1].id))
+            db.session.commit()
+            url = f'/tournament/{tournament.id}'
+            db.session.expire_all()
+            counts.append(self.count_statements(lambda: self.assertEqual(self.client.get(url).status_code, 200)))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_view_tournament_reuses_standings_until_version_bump(self):
+        # Repeated views skip ranking until a mutation bumps the tournament version
+        import routes
+        tournament, players = self.create_swiss_tournament(4)
+        tournament_id, loser_id = tournament.id, players[1].id
+        match_id = Match.query.filter_by(player1_id=players[0].id).first().id
+        url = f'/tournament/{tournament_id}'
+        with mock.patch('routes.tournament_standings', wraps=routes.tournament_standings) as standings:
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(standings.call_count, 1)
+            response = self.client.post(f'/tournament/{tournament_id}/save_results',
+                                        json={'match_results': [{'match_id': match_id, 'winner_id': loser_id}]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(standings.call_count, 2)
+
+    def test_dashboard_keyset_pagination(self):
+        # Active tournaments the user plays in are paged by created_at/id without repeats
+        from routes import DASHBOARD_PAGE_SIZE
+        host = User(username='host', email='host@example.com', first_name='Host', last_name='User', password_hash='unused')
+        db.session.add(host)
+        db.session.flush()
+        for i in range(DASHBOARD_PAGE_SIZE + 6):
+            tournament = Tournament(title=f'Event {i}', game_type='Chess', format='swiss',
+                                    created_by=host.id, status='active', total_rounds=3)
+            db.session.add(tournament)
+            db.session.flush()
+            db.session.add(TournamentPlayer(tournament_id=tournament.id, user_id=self.test_user_id))
+            db.session.add(Round(tournament_id=tournament.id, round_number=1, status='completed'))
+            db.session.add(Round(tournament_id=tournament.id, round_number=2, status='in progress'))
+        db.session.commit()
+
+        first_page = self.client.get('/dashboard').data.decode()
+        first_ids = re.findall(r'data-tourney-id="(\d+)"', first_page)
+        self.assertEqual(len(first_ids), DASHBOARD_PAGE_SIZE)
+        self.assertIn('2 / 3 Rounds', first_page)
+        self.assertIn('data-player="true"', first_page)
+        cursor = re.search(r'before=(\d+)', first_page).group(1)
+        second_page = self.client.get(f'/dashboard?status=in+progress+player&before={cursor}').data.decode()
+        second_ids = re.findall(r'data-tourney-id="(\d+)"', second_page)
+        self.assertEqual(len(second_ids), 6)
+        self.assertFalse(set(first_ids) & set(second_ids))
+        self.assertNotIn('before=', second_page)
+
+    def test_player_history_cached_until_results_change(self):
+        # History is served from the cache until the user's tournament results change
+        from player_history import get_player_history
+        from routes import update_tournament_results
+        tournament, players = self.create_swiss_tournament(4)
+        players[0].user_id = self.test_user_id
+        db.session.commit()
+        update_tournament_results(tournament.id)
+        self.assertEqual(get_player_history(self.test_user_id).results[0][0].wins, 1)
+        self.assertEqual(self.count_statements(lambda: get_player_history(self.test_user_id)), 0)
+        # Changes made by other processes are picked up once the entry expires
+        with mock.patch('cache.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertEqual(self.count_statements(lambda: get_player_history(self.test_user_id)), 1)
+
+        round_two = Round(tournament_id=tournament.id, round_number=2, status='completed')
+        db.session.add(round_two)
+        db.session.flush()
+        db.session.add(Match(round_id=round_two.id, player1_id=players[0].id, player2_id=players[2].id,
+                             winner_id=players[0].id, status='completed'))
+        db.session.commit()
+        update_tournament_results(tournament.id, round_two)
+        history = get_player_history(self.test_user_id)
+        self.assertEqual((history.results[0][0].wins, history.results[0][0].losses), (2, 0))
+        self.assertEqual(history.last_three[0][1].title, 'Test Swiss')
+        for url in ('/account', '/analytics', '/user_preview/testuser'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_user_stats_follow_tournament_results(self):
+        # UserStat is adjusted by each results update and agrees with a full rebuild
+        from routes import update_tournament_results
+        from user_stats import rebuild_user_stats
+        tournament, players = self.create_swiss_tournament(4)
+        players[0].user_id = self.test_user_id
+        db.session.commit()
+
+        def stat_row():
+            stat = UserStat.query.filter_by(user_id=self.test_user_id, game_type=tournament.game_type).one()
+            return stat.games_played, stat.games_won, stat.games_lost
+
+        update_tournament_results(tournament.id)
+        self.assertEqual(stat_row(), (1, 1, 0))
+
+        round_two = Round(tournament_id=tournament.id, round_number=2, status='completed')
+        db.session.add(round_two)
+        db.session.flush()
+        db.session.add(Match(round_id=round_two.id, player1_id=players[2].id, player2_id=players[0].id,
+                             winner_id=players[2].id, status='completed'))
+        db.session.commit()
+        update_tournament_results(tournament.id, round_two)
+        self.assertEqual(stat_row(), (2, 1, 1))
+
+        # A full rebuild of the same results leaves the totals unchanged
+        update_tournament_results(tournament.id)
+        self.assertEqual(stat_row(), (2, 1, 1))
+        rebuild_user_stats()
+        self.assertEqual(stat_row(), (2, 1, 1))
+        self.assertEqual(self.client.get('/account').status_code, 200)
+
+    def test_results_email_queued_and_sent_over_one_connection(self):
+        # The route returns without sending; the worker delivers over one SMTP connection per batch
+        from db import mail, mail_queue
+        server = StubSMTPServer()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1], MAIL_USE_TLS=False,
+                               MAIL_SUPPRESS_SEND=False, MAIL_DEFAULT_SENDER='host@example.com',
+                               MAIL_USERNAME=None, MAIL_QUEUE_BATCH_SIZE=10, MAIL_QUEUE_STATUS_LIMIT=2)
+        mail.init_app(self.app)
+        mail_queue.init_app(self.app)
+
+        tournament, players = self.create_swiss_tournament(6)
+        for i, player in enumerate(players):
+            player.email = f'bounce{i}@example.com' if i == 5 else f'guest{i}@example.com'
+        db.session.commit()
+
+        with mock.patch('routes.render_template', wraps=__import__('routes').render_template) as render:
+            response = self.client.post(f'/tournament/{tournament.id}/send_results')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sum(1 for c in render.call_args_list
+                             if c.args[0] == 'components/tournament_results_email.html'), 1)
+
+        mail_queue.join()
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(sorted(r for m in server.messages for r in m),
+                         [f'guest{i}@example.com' for i in range(5)])
+        status = json.loads(self.client.get(f'/tournament/{tournament.id}/email_status').data)
+        self.assertEqual(status['results'], {'queued': 6, 'sent': 5, 'failed': ['bounce5@example.com'],
+                                             'finished': True})
+
+        # Only the most recently used MAIL_QUEUE_STATUS_LIMIT tournaments keep their statuses
+        for other_id in (tournament.id + 1, tournament.id + 2):
+            mail_queue.enqueue(other_id, 'pairings', 'Pairings', '', [])
+        self.assertEqual(mail_queue.status(tournament.id), {})
+        self.assertEqual(mail_queue.status(tournament.id + 2)['pairings']['finished'], True)
+
+    def test_mail_status_counts_each_send_on_its_own(self):
+        # Messages still going out from an earlier send don't count towards a resend's status,
+        # and a batch that breaks partway only marks the recipients it hadn't reached as failed
+        from db import mail
+        from mail_queue import MailQueue
+        mail_queue = MailQueue(mail, workers=0)
+        recipients = [f'player{i}@example.com' for i in range(4)]
+        mail_queue.enqueue(1, 'pairings', 'Round 1', '<p>Round 1</p>', recipients)
+        first = mail_queue._jobs.get()
+        mail_queue.enqueue(1, 'pairings', 'Round 1', '<p>Round 1</p>', recipients)
+        mail_queue._record(first, sent=4)
+        mail_queue._jobs.task_done()
+        self.assertEqual(mail_queue.status(1)['pairings'], {'queued': 4, 'sent': 0, 'failed': [], 'finished': False})
+
+        connection = mock.MagicMock()
+        connection.__enter__.return_value = connection
+        connection.send.side_effect = [None, None, RuntimeError('connection lost')]
+        mail_queue.workers = 1
+        with mock.patch.object(mail, 'connect', return_value=connection):
+            mail_queue._start_workers()
+            mail_queue.join()
+        self.assertEqual(mail_queue.status(1)['pairings'], {'queued': 4, 'sent': 2, 'failed': recipients[2:],
+                                                            'finished': True})
+
+    def test_start_tournament_bulk_bootstrap(self):
+        # Starting a tournament takes the same handful of statements for 8 or 512 players
+        def start(num_players):
+            data = {'title': f'Big {num_players}', 'format': 'swiss', 'game_type': 'Chess',
+                    'include_creator_as_player': False,
+                    'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(num_players - 1)]
+                               + [{'username': 'testuser', 'user_id': self.test_user_id}]}
+            response = self.client.post('/start_tournament', json=data)
+            self.assertTrue(response.get_json()['success'])
+            return response.get_json()['tournament_id']
+
+        # The first start also loads the logged in user and their friend ids, which the
+        # test's app context and the friend cache keep for the later requests
+        first = self.count_statements(lambda: start(8))
+        small = self.count_statements(lambda: start(8))
+        statements = []
+        large = self.count_statements(lambda: statements.append(start(511)))
+        self.assertEqual(first, small + 2)
+        self.assertEqual(small, large)
+        self.assertLess(large, 15)
+
+        tournament = db.session.get(Tournament, statements[0])
+        self.assertEqual(tournament.total_rounds, 9)
+        self.assertEqual(TournamentPlayer.query.filter_by(tournament_id=tournament.id).count(), 511)
+        round_one = Round.query.filter_by(tournament_id=tournament.id, round_number=1).one()
+        matches = Match.query.filter_by(round_id=round_one.id).all()
+        self.assertEqual(len(matches), 256)
+        self.assertEqual([m.player2_id for m in matches if m.is_bye], [None])
+        paired = {m.player1_id for m in matches} | {m.player2_id for m in matches if m.player2_id}
+        self.assertEqual(len(paired), 511)
+        self.assertEqual(TournamentPlayer.query.filter_by(tournament_id=tournament.id,
+                                                          user_id=self.test_user_id).one().guest_firstname, 'Test')
+
+    def test_complete_round_bulk_results(self):
+        # A round's results are checked and written with the same statements for 8 or 512 players
+        counts = {}
+        for num_players in (8, 512):
+            tournament_id, matches = self.create_round_in_progress(num_players)
+            results = [{'match_id': match_id, 'winner_id': player2_id} for match_id, _, player2_id in matches]
+            self.client.get('/dashboard')
+            counts[num_players] = self.count_statements(lambda: self.assertTrue(self.client.post(
+                f'/tournament/{tournament_id}/complete_round', json={'match_results': results}).get_json()['success']))
+            stored = db.session.query(Match.id, Match.winner_id, Match.status).filter(
+                Match.id.in_([match_id for match_id, _, _ in matches])).all()
+            self.assertEqual(sorted(stored), sorted((m, p2, 'completed') for m, _, p2 in matches))
+        self.assertEqual(counts[8], counts[512])
+
+        # The same round uploaded as CSV, with extra columns, saved and then completed
+        tournament_id, matches = self.create_round_in_progress(8)
+        csv_text = 'match_id,player,winner_id\n' + ''.join(f'{m},Guest,{p1}\n' for m, p1, _ in matches)
+        response = self.client.post(f'/tournament/{tournament_id}/save_results',
+                                    data={'file': (io.BytesIO(csv_text.encode()), 'results.csv')})
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual({w for (w,) in db.session.query(Match.winner_id).filter(
+            Match.id.in_([m for m, _, _ in matches]))}, {p1 for _, p1, _ in matches})
+        response = self.client.post(f'/tournament/{tournament_id}/complete_round',
+                                    data=csv_text, content_type='text/csv')
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(Round.query.filter_by(tournament_id=tournament_id, round_number=2).one().status, 'completed')
+
+    def test_match_results_validation(self):
+        # Results naming other tournaments' matches or players are refused and nothing is written
+        tournament_id, matches = self.create_round_in_progress(8)
+        other_id, other_matches = self.create_round_in_progress(8)
+        (match_id, player1_id, player2_id), (second_id, _, second_player2_id) = matches[:2]
+        valid = [{'match_id': m, 'winner_id': p1} for m, p1, _ in matches]
+        invalid = {
+            'not part of this': valid + [{'match_id': other_matches[0][0], 'winner_id': other_matches[0][1]}],
+            'is not playing in match': [{'match_id': match_id, 'winner_id': second_player2_id}] + valid[1:],
+            'more than one result': valid + [{'match_id': match_id, 'winner_id': player2_id}],
+            'Invalid match id': valid + [{'match_id': 'abc', 'winner_id': player1_id}],
+            'Invalid winner id': [{'match_id': match_id, 'winner_id': 'x'}] + valid[1:],
+        }
+        for url in ('save_results', 'complete_round'):
+            for expected, results in invalid.items():
+                response = self.client.post(f'/tournament/{tournament_id}/{url}', json={'match_results': results})
+                self.assertEqual(response.status_code, 400, (url, expected))
+                data = response.get_json()
+                self.assertEqual(data['error_count'], 1)
+                self.assertIn(expected, data['errors'][0])
+        self.assertEqual(db.session.query(Match.id).filter(Match.winner_id.isnot(None), Match.id.in_(
+            [m for m, _, _ in matches + other_matches])).count(), 0)
+
+        response = self.client.post(f'/tournament/{tournament_id}/complete_round', json={'match_results': valid[1:]})
+        self.assertEqual(response.get_json()['message'], 'Not all matches have results')
+        response = self.client.post(f'/tournament/{tournament_id}/save_results',
+                                    data='match_id,winner\n1,2\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'], 'CSV is missing the winner_id column')
+
+    def test_validate_tournament_data_query_count(self):
+        # Saving a draft costs the same statements for 4 or 200 friends, and still catches bad entries
+        for i in range(200):
+            friend = User(username=f'friend{i}', email=f'friend{i}@example.com', first_name='Friend',
+                          last_name=str(i), password_hash='unused')
+            db.session.add(friend)
+            db.session.flush()
+            # Requests sent either way round
+            pair = (self.test_user_id, friend.id) if i % 2 else (friend.id, self.test_user_id)
+            db.session.add(Friend.between(pair[0], pair[1], 'accepted'))
+        db.session.commit()
+
+        def draft(num_friends, extra=()):
+            players = [{'username': f'friend{i}'} for i in range(num_friends)]
+            players += [{'guest_firstname': 'Guest', 'guest_lastname': str(i), 'email': f'guest{i}@example.com',
+                         'has_tourney_pro_account': False} for i in range(num_friends)]
+            data = {'title': 'Draft', 'format': 'swiss', 'game_type': 'Chess',
+                    'include_creator_as_player': False, 'players': players + list(extra)}
+            return self.client.post('/save_tournament', json=data)
+
+        draft(4)  # warm up: the first request also loads the logged-in user
+        self.assertEqual(self.count_statements(lambda: draft(4)), self.count_statements(lambda: draft(200)))
+        tournament_id = draft(200).get_json()['tournament_id']
+        linked = TournamentPlayer.query.filter(TournamentPlayer.tournament_id == tournament_id,
+                                               TournamentPlayer.user_id.isnot(None)).count()
+        self.assertEqual(linked, 200)
+
+        db.session.add(User(username='stranger', email='stranger@example.com', first_name='S', last_name='T',
+                            password_hash='unused'))
+        db.session.commit()
+        response = draft(4, [{'username': 'stranger'}])
+        self.assertEqual(response.get_json()['non_friend_usernames'], ['stranger'])
+        response = draft(4, [{'guest_firstname': 'S', 'email': 'stranger@example.com', 'has_tourney_pro_account': False}])
+        self.assertEqual(response.get_json()['emails_with_accounts'], ['stranger@example.com'])
+
+    def test_swiss_next_round_avoids_rematches(self):
+        # After two rounds greedy score-group pairing forces a rematch; the matching engine does not
+        from swiss_pairing import PairingHistory, SwissPlayer, pairing_quality, swiss_pairings
+        played = [[(1, 2, 1), (3, 4, 4), (5, 6, 5)], [(2, 4, 2), (5, 1, 1), (3, 6, 3)]]
+        wins = {1: 1, 2: 2, 3: 1, 4: 1, 5: 1, 6: 0}
+        history = PairingHistory((a, b, False) for matches in played for a, b, _ in matches)
+        swiss_players = [SwissPlayer(pid, w, 0.0, 0.0) for pid, w in wins.items()]
+        self.assertGreater(pairing_quality(*swiss_pairings(swiss_players, history, 'greedy'), swiss_players, history)[0], 0)
+
+        tournament, players = self.create_swiss_tournament(6, completed_rounds=0)
+        tournament.total_rounds = 3
+        ids = {n: players[n - 1].id for n in wins}
+        for round_number, matches in enumerate(played, 1):
+            round_obj = Round(tournament_id=tournament.id, round_number=round_number, status='completed')
+            db.session.add(round_obj)
+            db.session.flush()
+            for a, b, winner in matches:
+                db.session.add(Match(round_id=round_obj.id, player1_id=ids[a], player2_id=ids[b],
+                                     winner_id=ids[winner], status='completed'))
+        db.session.commit()
+        from routes import update_tournament_results
+        update_tournament_results(tournament.id)
+
+        response = self.client.post(f'/tournament/{tournament.id}/next_round')
+        self.assertTrue(response.get_json()['success'])
+        round_three = Round.query.filter_by(tournament_id=tournament.id, round_number=3).one()
+        pairs = [(m.player1_id, m.player2_id) for m in Match.query.filter_by(round_id=round_three.id)]
+        self.assertEqual(sorted(p for pair in pairs for p in pair), sorted(ids.values()))
+        earlier = {frozenset((ids[a], ids[b])) for matches in played for a, b, _ in matches}
+        self.assertFalse(earlier & {frozenset(pair) for pair in pairs})
+
+    def test_next_round_query_count(self):
+        # Generating pairings reads one snapshot, so its cost does not grow with the rounds played
+        from routes import update_tournament_results
+        counts = {}
+        for tournament_format in ('swiss', 'round robin', 'single elimination'):
+            for completed_rounds in (1, 5):
+                tournament, _ = self.create_swiss_tournament(8, completed_rounds)
+                tournament.format = tournament_format
+                tournament.total_rounds = completed_rounds + 2
+                db.session.commit()
+                update_tournament_results(tournament.id)
+                tournament_id = tournament.id
+                self.client.get('/dashboard')  # warm up: the first request also loads the logged-in user
+                counts[completed_rounds] = self.count_statements(
+                    lambda: self.assertTrue(self.client.post(f'/tournament/{tournament_id}/next_round').get_json()['success']))
+            self.assertEqual(counts[1], counts[5], tournament_format)
+            # Winners of round five meet in single elimination; everyone plays in the other formats
+            expected_matches = 2 if tournament_format == 'single elimination' else 4
+            self.assertEqual(Match.query.join(Round).filter(Round.tournament_id == tournament_id,
+                                                            Round.round_number == 6).count(), expected_matches)
+
+    def test_round_robin_schedule_stored_at_start(self):
+        # The schedule is built once; later rounds are materialised from it or published up front
+        from collections import Counter
+        from round_robin import unpack_schedule
+
+        def start(**options):
+            data = {'title': 'League', 'format': 'round robin', 'game_type': 'Chess',
+                    'include_creator_as_player': False, **options,
+                    'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(5)]}
+            return db.session.get(Tournament, self.client.post('/start_tournament', json=data).get_json()['tournament_id'])
+
+        def play_round(tournament):
+            self.client.post(f'/tournament/{tournament.id}/start_round')
+            round_obj = Round.query.filter_by(tournament_id=tournament.id, status='in progress').one()
+            results = [{'match_id': m.id, 'winner_id': m.player1_id}
+                       for m in Match.query.filter_by(round_id=round_obj.id, is_bye=False)]
+            self.client.post(f'/tournament/{tournament.id}/complete_round', json={'match_results': results})
+            self.assertTrue(self.client.post(f'/tournament/{tournament.id}/next_round').get_json()['success'])
+
+        def pairs_by_round(tournament):
+            rounds = {}
+            for number, p1, p2 in db.session.query(Round.round_number, Match.player1_id, Match.player2_id) \
+                    .join(Match, Match.round_id == Round.id).filter(Round.tournament_id == tournament.id):
+                rounds.setdefault(number, set()).add((p1, p2))
+            return rounds
+
+        weekly = start()
+        self.assertEqual(weekly.total_rounds, 5)
+        self.assertEqual(Round.query.filter_by(tournament_id=weekly.id).count(), 1)
+        play_round(weekly)
+        schedule = unpack_schedule(weekly.round_robin_schedule)
+        self.assertEqual(pairs_by_round(weekly), {1: set(schedule[0]), 2: set(schedule[1])})
+
+        league = start(double_round_robin=True, publish_all_rounds=True)
+        self.assertEqual(league.total_rounds, 10)
+        published = pairs_by_round(league)
+        self.assertEqual(len(published), 10)
+        meetings = Counter(frozenset(pair) for pairs in published.values() for pair in pairs if pair[1])
+        self.assertEqual(set(meetings.values()), {2})
+        self.assertEqual(len(meetings), 10)
+        play_round(league)
+        self.assertEqual(Round.query.filter_by(tournament_id=league.id).count(), 10)
+
+    def test_single_elimination_bracket(self):
+        # Byes go to the top seeds and each winner moves up one bracket slot
+        from models import BracketSlot
+        data = {'title': 'Knockout', 'format': 'single elimination', 'game_type': 'Chess',
+                'include_creator_as_player': False,
+                'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(6)]}
+        tournament_id = self.client.post('/start_tournament', json=data).get_json()['tournament_id']
+        tournament = db.session.get(Tournament, tournament_id)
+        self.assertEqual(tournament.total_rounds, 3)
+
+        slots = {s.slot: s for s in BracketSlot.query.filter_by(tournament_id=tournament_id)}
+        self.assertEqual(len(slots), 15)
+        seed_of = {s.player_id: s.seed for s in slots.values() if s.seed and s.player_id}
+        first_round = Match.query.join(Round).filter(Round.tournament_id == tournament_id).all()
+        self.assertEqual(sorted(seed_of[m.player1_id] for m in first_round if m.is_bye), [1, 2])
+        self.assertEqual({m.bracket_slot for m in first_round}, {4, 5, 6, 7})
+
+        def bracket_query_count():
+            db.session.expire_all()
+            return self.count_statements(lambda: self.client.get(f'/tournament/{tournament_id}/bracket'))
+
+        self.client.get('/dashboard')  # warm up: the first request also loads the logged-in user
+        queries = bracket_query_count()
+        for number in range(1, 4):
+            self.client.post(f'/tournament/{tournament_id}/start_round')
+            round_obj = Round.query.filter_by(tournament_id=tournament_id, round_number=number).one()
+            results = [{'match_id': m.id, 'winner_id': m.player1_id}
+                       for m in Match.query.filter_by(round_id=round_obj.id, is_bye=False)]
+            self.client.post(f'/tournament/{tournament_id}/complete_round', json={'match_results': results})
+            if number < 3:
+                self.assertTrue(self.client.post(f'/tournament/{tournament_id}/next_round').get_json()['success'])
+        self.assertEqual(bracket_query_count(), queries)
+
+        rounds = self.client.get(f'/tournament/{tournament_id}/bracket').get_json()['rounds']
+        self.assertEqual([len(r) for r in rounds], [4, 2, 1, 1])
+        final = rounds[2][0]
+        champion = rounds[3][0][0]
+        self.assertEqual(champion['id'], final[0]['id'])
+        self.assertEqual(champion['seed'], 1)
+
+    def test_single_elimination_result_corrected_after_next_round(self):
+        # Correcting a completed round moves the new winner into the paired next round,
+        # until that round's match has a result
+        from models import BracketSlot
+        data = {'title': 'Knockout', 'format': 'single elimination', 'game_type': 'Chess',
+                'include_creator_as_player': False,
+                'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(4)]}
+        tournament_id = self.client.post('/start_tournament', json=data).get_json()['tournament_id']
+        self.client.post(f'/tournament/{tournament_id}/start_round')
+        first_round = Match.query.join(Round).filter(Round.tournament_id == tournament_id).all()
+        self.client.post(f'/tournament/{tournament_id}/complete_round', json={
+            'match_results': [{'match_id': m.id, 'winner_id': m.player1_id} for m in first_round]})
+        self.assertTrue(self.client.post(f'/tournament/{tournament_id}/next_round').get_json()['success'])
+
+        corrected = first_round[0]
+        response = self.client.post(f'/tournament/{tournament_id}/save_results', json={
+            'match_results': [{'match_id': corrected.id, 'winner_id': corrected.player2_id}]})
+        self.assertTrue(response.get_json()['success'])
+        db.session.expire_all()
+        final = Match.query.filter_by(bracket_slot=1).join(Round).filter(Round.tournament_id == tournament_id).one()
+        self.assertIn(corrected.player2_id, (final.player1_id, final.player2_id))
+        self.assertNotIn(corrected.player1_id, (final.player1_id, final.player2_id))
+        self.assertEqual(BracketSlot.query.filter_by(tournament_id=tournament_id,
+                                                     slot=corrected.bracket_slot).one().player_id,
+                         corrected.player2_id)
+        rounds = self.client.get(f'/tournament/{tournament_id}/bracket').get_json()['rounds']
+        self.assertEqual({player['id'] for player in rounds[1][0]}, {final.player1_id, final.player2_id})
+
+        # Once the final has a result, the semi-final that fed it is fixed
+        self.client.post(f'/tournament/{tournament_id}/start_round')
+        self.client.post(f'/tournament/{tournament_id}/complete_round', json={
+            'match_results': [{'match_id': final.id, 'winner_id': corrected.player2_id}]})
+        response = self.client.post(f'/tournament/{tournament_id}/save_results', json={
+            'match_results': [{'match_id': corrected.id, 'winner_id': corrected.player1_id}]})
+        self.assertEqual(response.status_code, 400)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Match, corrected.id).winner_id, corrected.player2_id)
+
+    def test_load_generator_is_reproducible(self):
+        # The same seed should give the same rows, with results the app itself would store
+        from generate_load_db import generate
+        from routes import update_tournament_results
+
+        def generated_rows(seed):
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            counts = generate(users=30, friends_per_user=3, tournaments=12, players=7, rounds=3, seed=seed, batch_size=50)
+            return counts, {table.name: sorted(tuple(row) for row in db.session.execute(table.select()))
+                            for table in db.metadata.sorted_tables}
+
+        counts, rows = generated_rows(seed=1)
+        self.assertEqual(counts['users'], 30)
+        self.assertEqual(counts['friends'], 90)
+        self.assertEqual(counts['tournaments'], 12)
+        self.assertEqual(counts['tournament_players'], 84)
+        self.assertEqual(generated_rows(seed=1), (counts, rows))
+        self.assertNotEqual(generated_rows(seed=2)[1], rows)
+
+        def stored_results(tournament_id):
+            return [(r.player_id, r.rank, r.wins, r.losses, r.opponent_win_percentage, r.opp_opp_win_percentage,
+                     r.rounds_applied, r.opponent_ids, r.head_to_head)
+                    for r in TournamentResult.query.filter_by(tournament_id=tournament_id).order_by(TournamentResult.rank)]
+
+        played = Tournament.query.filter(Tournament.id.in_(db.session.query(TournamentResult.tournament_id))).all()
+        self.assertEqual({t.format for t in played}, {'swiss', 'round robin', 'single elimination'})
+        for tournament in played:
+            generated = stored_results(tournament.id)
+            update_tournament_results(tournament.id)
+            self.assertEqual(stored_results(tournament.id), generated)
+
+    def test_sql_instrumentation_headers(self):
+        # With SQL_INSTRUMENTATION = 'headers' responses report the request's statements
+        from db import sql_instrumentation
+        self.app.config['SQL_INSTRUMENTATION'] = 'headers'
+        sql_instrumentation.init_app(self.app)
+        tournament, _ = self.create_swiss_tournament(8)
+        tournament_id = tournament.id
+        self.client.get(f'/tournament/{tournament_id}')
+
+        responses = []
+        statements = self.count_statements(lambda: responses.append(self.client.get(f'/tournament/{tournament_id}')))
+        response = responses[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response.headers['X-SQL-Statements']), statements)
+        self.assertGreaterEqual(float(response.headers['X-SQL-Time-Ms']), float(response.headers['X-SQL-Slowest-Ms']))
+        self.assertEqual(response.headers['X-SQL-Repeated'], '0')
+        self.assertIn(f'desc="{statements} statements"', response.headers['Server-Timing'])
+
+    def test_sql_instrumentation_log(self):
+        # With SQL_INSTRUMENTATION = 'log' each request logs one JSON line, flagging repeated statements
+        from db import sql_instrumentation
+        self.app.config.update(SQL_INSTRUMENTATION='log', SQL_REPEAT_THRESHOLD=1, SQL_SLOWEST_KEPT=2)
+        sql_instrumentation.init_app(self.app)
+        with self.assertLogs('sql_instrumentation', level='INFO') as logs:
+            response = self.client.get('/dashboard')
+        self.assertNotIn('X-SQL-Statements', response.headers)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['endpoint'], line['method'], line['path'], line['status']),
+                         ('main.dashboard', 'GET', '/dashboard', 200))
+        self.assertGreater(line['statements'], 0)
+        self.assertEqual(len(line['slowest']), 2)
+        self.assertGreaterEqual(line['slowest'][0]['ms'], line['slowest'][1]['ms'])
+        # Every statement ran at least once, so with a threshold of one they are all listed
+        self.assertEqual(sum(r['count'] for r in line['repeated']), line['statements'])
+
+    def test_hot_routes_use_indexes(self):
+        # None of the routes hit while running a tournament may scan a whole table
+        if db.engine.dialect.name != 'sqlite':
+            self.skipTest('reads SQLite query plans')
+        from models import Invite
+        tournament, players = self.create_swiss_tournament(8, completed_rounds=2)
+        other = User.query.filter(User.id != self.test_user_id).first()
+        db.session.add_all([Friend.between(other.id, self.test_user_id, 'accepted'),
+                            Invite(tournament_id=tournament.id, sender_id=self.test_user_id,
+                                   recipient_id=other.id)])
+        db.session.commit()
+
+        knockout = self.client.post('/start_tournament', json={
+            'title': 'Knockout', 'format': 'single elimination', 'game_type': 'Chess',
+            'include_creator_as_player': False,
+            'players': [{'guest_firstname': 'Guest', 'guest_lastname': str(i)} for i in range(6)]
+        }).get_json()['tournament_id']
+
+        def visit():
+            for status in ('in progress player', 'in progress creator', 'draft creator', 'draft player', 'all'):
+                self.client.get(f'/dashboard?status={status}')
+            for url in (f'/tournament/{tournament.id}', f'/tournament/{knockout}/bracket', '/account',
+                        '/analytics', '/requests', '/get_friends', f'/user_preview/{other.username}',
+                        '/search_players?query=pla'):
+                self.client.get(url)
+            self.client.post(f'/tournament/{tournament.id}/next_round')
+            self.client.post(f'/tournament/{tournament.id}/start_round')
+            round_obj = Round.query.filter_by(tournament_id=tournament.id, round_number=3).one()
+            self.client.post(f'/tournament/{tournament.id}/complete_round', json={'match_results': [
+                {'match_id': m.id, 'winner_id': m.player1_id}
+                for m in Match.query.filter_by(round_id=round_obj.id, is_bye=False)
+            ]})
+
+        self.assertEqual(self.table_scans(visit), set())
+
+    def test_deployment_profile_sets_sqlite_pragmas(self):
+        # Every pooled connection to the deployment database gets the tuned pragmas
+        from config import DeploymentConfig
+        with tempfile.TemporaryDirectory() as directory:
+            class FileConfig(DeploymentConfig):
+                SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'app.db')
+
+            app = create_app(FileConfig)
+            with app.app_context():
+                self.assertEqual(db.engine.pool.size(), 10)
+                for _ in range(2):
+                    with db.engine.connect() as first, db.engine.connect() as second:
+                        for connection in (first, second):
+                            pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+                            self.assertEqual(pragma('journal_mode'), 'wal')
+                            self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+                            self.assertEqual(pragma('busy_timeout'), 30000)
+                            self.assertEqual(pragma('cache_size'), -65536)
+                db.engine.dispose()
+
+class MigrationsTestCase(unittest.TestCase):
+    # The migrations build exactly the schema in models.py, on SQLite and on
+    # PostgreSQL when TEST_DATABASE_URL points at one
+    def check_migrations(self, database_url):
+        from alembic.autogenerate import compare_metadata
+        from alembic.migration import MigrationContext
+        from flask_migrate import downgrade, upgrade
+
+        class MigrationConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = database_url
+
+        directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+        app = create_app(MigrationConfig)
+        with app.app_context():
+            # Start from an empty database even if an earlier run stopped half way
+            db.drop_all()
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP TABLE IF EXISTS alembic_version')
+            upgrade(directory=directory)
+            with db.engine.connect() as connection:
+                context = MigrationContext.configure(connection, opts={'include_name': is_search_table})
+                self.assertEqual(compare_metadata(context, db.metadata), [])
+                if connection.dialect.name == 'sqlite':
+                    self.assertTrue(inspect(connection).has_table(SEARCH_TABLE))
+            downgrade(directory=directory, revision='base')
+            db.engine.dispose()
+
+    def test_migrations_on_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check_migrations('sqlite:///' + os.path.join(directory, 'app.db'))
+
+    def test_migrations_on_postgresql(self):
+        database_url = os.getenv('TEST_DATABASE_URL', '')
+        if not database_url.startswith('postgresql'):
+            self.skipTest('set TEST_DATABASE_URL to a PostgreSQL database')
+        self.check_migrations(database_url)
+
 if __name__ == '__main__':
     unittest.main()
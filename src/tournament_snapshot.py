@@ -0,0 +1,100 @@
+"""A read-only view of a tournament's state for generating pairings.
+
+TournamentSnapshot.load fetches the players, rounds, matches and stored
+results of a tournament (and the bracket of a single elimination one) with
+one query each, so the pairing strategies can read any earlier round without
+going back to the database. The cost of loading does not depend on how many
+rounds have been played.
+"""
+from collections import defaultdict, namedtuple
+from db import db
+from models import BracketSlot, Match, Round, TournamentPlayer, TournamentResult
+from swiss_pairing import PairingHistory, SwissPlayer
+
+RoundState = namedtuple('RoundState', ['id', 'round_number', 'status'])
+MatchState = namedtuple('MatchState', ['id', 'round_id', 'player1_id', 'player2_id', 'winner_id', 'is_bye'])
+ResultState = namedtuple('ResultState', ['player_id', 'wins', 'losses', 'owp', 'oowp'])
+
+
+class TournamentSnapshot:
+    """Players, rounds, matches and results of one tournament, as plain tuples.
+
+    player_ids are in registration order, rounds are ordered by round number
+    and each round's matches by id. bracket maps each filled bracket slot to
+    its player, and is empty for tournaments without a stored bracket.
+    """
+
+    def __init__(self, tournament, player_ids, rounds, matches, results, bracket=None, bracket_size=0):
+        self.tournament = tournament
+        self.player_ids = player_ids
+        self.rounds = rounds
+        self.results = results
+        self.bracket = bracket or {}
+        self.bracket_size = bracket_size
+
+        round_numbers = {r.id: r.round_number for r in rounds}
+        self.matches_by_round = defaultdict(list)
+        for match in matches:
+            self.matches_by_round[round_numbers[match.round_id]].append(match)
+
+    @classmethod
+    def load(cls, tournament):
+        player_ids = [
+            pid for (pid,) in
+            db.session.query(TournamentPlayer.id).filter_by(tournament_id=tournament.id).order_by(TournamentPlayer.id)
+        ]
+        rounds = [
+            RoundState(*row) for row in
+            db.session.query(Round.id, Round.round_number, Round.status)
+            .filter_by(tournament_id=tournament.id)
+            .order_by(Round.round_number)
+        ]
+        matches = [
+            MatchState(*row) for row in
+            db.session.query(Match.id, Match.round_id, Match.player1_id, Match.player2_id, Match.winner_id, Match.is_bye)
+            .join(Round, Match.round_id == Round.id)
+            .filter(Round.tournament_id == tournament.id)
+            .order_by(Match.id)
+        ]
+        results = {
+            row[0]: ResultState(*row) for row in
+            db.session.query(
+                TournamentResult.player_id,
+                TournamentResult.wins,
+                TournamentResult.losses,
+                TournamentResult.opponent_win_percentage,
+                TournamentResult.opp_opp_win_percentage
+            ).filter_by(tournament_id=tournament.id)
+        }
+        bracket, bracket_size = {}, 0
+        if tournament.format == 'single elimination':
+            slots = db.session.query(BracketSlot.slot, BracketSlot.player_id).filter_by(tournament_id=tournament.id).all()
+            bracket = {slot: player_id for slot, player_id in slots if player_id is not None}
+            bracket_size = (len(slots) + 1) // 2
+        return cls(tournament, player_ids, rounds, matches, results, bracket, bracket_size)
+
+    def completed_rounds(self):
+        return [r for r in self.rounds if r.status == 'completed']
+
+    def matches_in_round(self, round_number):
+        return self.matches_by_round.get(round_number, [])
+
+    def pairing_history(self, before_round):
+        """Who met whom, and who had byes, in the rounds before before_round."""
+        return PairingHistory(
+            (match.player1_id, match.player2_id, match.is_bye)
+            for round_number, matches in self.matches_by_round.items()
+            if round_number < before_round
+            for match in matches
+        )
+
+    def swiss_players(self):
+        """A SwissPlayer per player from the stored results; players without one start from zero."""
+        players = []
+        for player_id in self.player_ids:
+            result = self.results.get(player_id)
+            if result:
+                players.append(SwissPlayer(player_id, result.wins or 0, result.owp or 0.0, result.oowp or 0.0))
+            else:
+                players.append(SwissPlayer(player_id, 0, 0.0, 0.0))
+        return players
@@ -0,0 +1,115 @@
+"""Keeps the materialized UserStat rows in step with TournamentResult.
+
+A user's UserStat row for a game type holds the sum of the wins and losses on
+all of their tournament results for that game type. Rows are adjusted by the
+difference a results update makes, so they never need a full recount outside
+of rebuild_user_stats.
+"""
+from sqlalchemy import func, insert, update
+from db import db
+from models import TournamentPlayer, TournamentResult, UserStat
+
+
+def user_result_totals(tournament_id):
+    """{user_id: (wins, losses)} from a tournament's results, for registered players only."""
+    rows = (
+        db.session.query(TournamentPlayer.user_id, TournamentResult.wins, TournamentResult.losses)
+        .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
+        .filter(TournamentResult.tournament_id == tournament_id, TournamentPlayer.user_id.isnot(None))
+        .all()
+    )
+    return {user_id: (wins or 0, losses or 0) for user_id, wins, losses in rows}
+
+
+def apply_result_totals(game_type, before, after):
+    """Adjust UserStat rows by the change between two user_result_totals snapshots."""
+    deltas = {}
+    for user_id in set(before) | set(after):
+        old_wins, old_losses = before.get(user_id, (0, 0))
+        new_wins, new_losses = after.get(user_id, (0, 0))
+        if (new_wins, new_losses) != (old_wins, old_losses):
+            deltas[user_id] = (new_wins - old_wins, new_losses - old_losses)
+    if not deltas:
+        return
+
+    # Existing rows are adjusted with one executemany UPDATE and new ones added with one INSERT
+    stats = {
+        user_id: (stat_id, won, lost) for stat_id, user_id, won, lost in
+        db.session.query(UserStat.id, UserStat.user_id, UserStat.games_won, UserStat.games_lost)
+        .filter(UserStat.user_id.in_(deltas), UserStat.game_type == game_type)
+    }
+    updates, inserts = [], []
+    for user_id, (won, lost) in deltas.items():
+        if user_id in stats:
+            stat_id, old_won, old_lost = stats[user_id]
+            updates.append({'id': stat_id, **game_totals((old_won or 0) + won, (old_lost or 0) + lost)})
+        else:
+            inserts.append({'user_id': user_id, 'game_type': game_type, **game_totals(won, lost)})
+    if updates:
+        db.session.execute(update(UserStat), updates)
+    if inserts:
+        db.session.execute(insert(UserStat), inserts)
+
+
+def game_totals(won, lost):
+    """UserStat column values for a number of games won and lost."""
+    played = won + lost
+    return {
+        'games_won': won,
+        'games_lost': lost,
+        'games_played': played,
+        'win_percentage': won / played if played > 0 else 0.0
+    }
+
+
+def add_games(stat, won, lost):
+    """Add won/lost games to a UserStat row and refresh its win percentage."""
+    for column, value in game_totals((stat.games_won or 0) + won, (stat.games_lost or 0) + lost).items():
+        setattr(stat, column, value)
+
+
+def stat_totals(user_stats):
+    """Overall (wins, games played, win rate %) across a user's UserStat rows."""
+    total_wins = sum(stat.games_won or 0 for stat in user_stats)
+    total_games = sum(stat.games_played or 0 for stat in user_stats)
+    total_winrate = round(total_wins / total_games * 100, 1) if total_games > 0 else 0.0
+    return total_wins, total_games, total_winrate
+
+
+def rebuild_user_stats():
+    """Recompute every UserStat row from TournamentResult in bulk.
+
+    Returns the number of rows written.
+    """
+    totals = (
+        db.session.query(
+            TournamentPlayer.user_id,
+            TournamentResult.game_type,
+            func.coalesce(func.sum(TournamentResult.wins), 0),
+            func.coalesce(func.sum(TournamentResult.losses), 0)
+        )
+        .join(TournamentResult, TournamentResult.player_id == TournamentPlayer.id)
+        .filter(TournamentPlayer.user_id.isnot(None))
+        .group_by(TournamentPlayer.user_id, TournamentResult.game_type)
+        .all()
+    )
+
+    rows = []
+    for user_id, game_type, won, lost in totals:
+        played = won + lost
+        if played == 0:
+            continue
+        rows.append({
+            'user_id': user_id,
+            'game_type': game_type,
+            'games_played': played,
+            'games_won': won,
+            'games_lost': lost,
+            'win_percentage': won / played
+        })
+
+    UserStat.query.delete()
+    if rows:
+        db.session.execute(insert(UserStat), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,220 @@
+"""In-memory username index for the player search typeahead.
+
+Every username is kept in a sorted list of (casefolded username, user id)
+pairs, so the usernames starting with what has been typed so far are found
+with a binary search instead of a LIKE '%...%' scan of the users table.
+Searches put the searcher's friends first, then everyone else in
+alphabetical order.
+
+The index is loaded on the first search. Sign ups in this process are added
+straight away with add(); users created by other processes (other workers,
+generate_load_db) are picked up by a query for ids above the highest one
+indexed, at most once every USERNAME_INDEX_REFRESH_SECONDS. Usernames never
+change once an account exists, so nothing else has to be tracked.
+
+When fewer than the limit of usernames start with the query, the rest are
+filled with usernames that contain it, found according to
+USERNAME_SUBSTRING_SEARCH:
+
+    'scan'  a pass over the in-memory index (the default)
+    'fts5'  the user_search FTS5 table with the trigram tokenizer, kept in
+            step with the users table by triggers. Suited to large user
+            tables under load, since the work no longer grows with the
+            number of users. Only on SQLite 3.34+ built with FTS5; anywhere
+            else the scan is used.
+
+Substring matches need at least three characters, the shortest a trigram
+search can look up.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import event, inspect, text
+
+SUBSTRING_MODES = ('scan', 'fts5')
+SEARCH_TABLE = 'user_search'
+# Shortest query filled in with substring matches
+MIN_SUBSTRING_LENGTH = 3
+
+SEARCH_TABLE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"username, content='users', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON users BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, username) VALUES (new.id, new.username); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON users BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, username) VALUES ('delete', old.id, old.username); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF username ON users BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, username) VALUES ('delete', old.id, old.username); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, username) VALUES (new.id, new.username); END",
+]
+
+
+def supports_search_table(connection):
+    """Whether the database can hold the trigram FTS5 search table."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    version = connection.exec_driver_sql("SELECT sqlite_version()").scalar()
+    has_fts5 = connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()
+    return bool(has_fts5) and tuple(int(part) for part in version.split('.')[:2]) >= (3, 34)
+
+
+def create_search_table(target, connection, **kw):
+    # Runs after CREATE TABLE users, so db.create_all() databases get it too
+    if supports_search_table(connection):
+        for statement in SEARCH_TABLE_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def drop_search_table(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def is_search_table(name, type_, parent_names):
+    """Alembic include_name hook leaving the search table and its FTS5 shadow tables out of comparisons."""
+    return not (type_ == 'table' and name.startswith(SEARCH_TABLE))
+
+
+class UsernameIndex:
+    """Sorted (casefolded username, user id) pairs for prefix searches."""
+
+    def __init__(self, db):
+        self.db = db
+        self.refresh_seconds = 5
+        self.substring = 'scan'
+        self._lock = threading.Lock()
+        self.clear()
+
+    def init_app(self, app):
+        from models import User
+
+        self.refresh_seconds = app.config.get('USERNAME_INDEX_REFRESH_SECONDS', self.refresh_seconds)
+        self.substring = app.config.get('USERNAME_SUBSTRING_SEARCH', 'scan')
+        if self.substring not in SUBSTRING_MODES:
+            raise ValueError(f"USERNAME_SUBSTRING_SEARCH must be one of {', '.join(SUBSTRING_MODES)}, "
+                             f"not {self.substring!r}")
+        if not event.contains(User.__table__, 'after_create', create_search_table):
+            event.listen(User.__table__, 'after_create', create_search_table)
+            event.listen(User.__table__, 'before_drop', drop_search_table)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []  # (casefolded username, user id), sorted
+            self._names = {}  # user id -> username
+            self._last_id = 0
+            self._checked = None  # time.monotonic() of the last look for new users
+            self._has_search_table = None
+
+    def add(self, user_id, username):
+        """Index a user created in this process, without waiting for the next refresh."""
+        with self._lock:
+            if self._checked is None or user_id in self._names:
+                return  # not loaded yet, the first search will load it
+            insort(self._entries, (username.casefold(), user_id))
+            self._names[user_id] = username
+            self._last_id = max(self._last_id, user_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def refresh(self, force=False):
+        """Load users added since the last refresh, if it is due (or forced).
+
+        Only the first load holds the lock while it queries, since searches
+        have nothing to use until it is done. Later refreshes claim the
+        refresh under the lock and query outside it, so searches arriving in
+        the meantime use the entries already loaded instead of waiting on
+        the database.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked is not None and now - self._checked < self.refresh_seconds:
+                return
+            if self._checked is None:
+                self._merge(self._users_after(self._last_id))
+                self._checked = now
+                return
+            self._checked = now
+            last_id = self._last_id
+        rows = self._users_after(last_id)
+        if rows:
+            with self._lock:
+                self._merge(rows)
+
+    def _users_after(self, last_id):
+        from models import User
+
+        return self.db.session.query(User.id, User.username).filter(User.id > last_id).all()
+
+    def _merge(self, rows):
+        # Called with the lock held; users add() indexed in the meantime are skipped
+        new = {user_id: username for user_id, username in rows if user_id not in self._names}
+        if new:
+            # Timsort merges the already sorted list with the new run in close to linear time
+            self._entries = sorted(self._entries + [(username.casefold(), user_id) for user_id, username in new.items()])
+            self._names.update(new)
+        if rows:
+            self._last_id = max(self._last_id, max(user_id for user_id, _ in rows))
+
+    def search(self, query, friend_ids=(), exclude=(), limit=10):
+        """Up to limit {'id', 'username', 'is_friend'} matches for query.
+
+        Friends whose usernames start with query come first, then everyone
+        else whose username does, then (for queries of three or more
+        characters) usernames containing query. Each group is in
+        alphabetical order. Users in exclude are left out.
+        """
+        prefix = query.strip().casefold()
+        if not prefix or limit <= 0:
+            return []
+        self.refresh()
+        friend_ids = set(friend_ids)
+        skip = set(exclude)
+        with self._lock:
+            friends = sorted(
+                (self._names[user_id].casefold(), user_id) for user_id in friend_ids - skip
+                if user_id in self._names and self._names[user_id].casefold().startswith(prefix)
+            )[:limit]
+            matches = [user_id for _, user_id in friends]
+            skip.update(matches)
+            position = bisect_left(self._entries, (prefix,))
+            while len(matches) < limit and position < len(self._entries) \
+                    and self._entries[position][0].startswith(prefix):
+                user_id = self._entries[position][1]
+                if user_id not in skip:
+                    matches.append(user_id)
+                    skip.add(user_id)
+                position += 1
+            names = {user_id: self._names[user_id] for user_id in matches}
+
+        if len(matches) < limit and len(prefix) >= MIN_SUBSTRING_LENGTH:
+            for user_id, username in self.containing(prefix, skip, limit - len(matches)):
+                matches.append(user_id)
+                names[user_id] = username
+        return [{'id': user_id, 'username': names[user_id], 'is_friend': user_id in friend_ids}
+                for user_id in matches]
+
+    def containing(self, needle, skip, limit):
+        """Up to limit (id, username) pairs of users not in skip whose usernames contain needle."""
+        if self.substring == 'fts5' and self.has_search_table():
+            term = '"' + needle.replace('"', '""') + '"'
+            rows = self.db.session.execute(
+                text(f"SELECT rowid, username FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :term LIMIT :limit"),
+                {'term': term, 'limit': limit + len(skip)}
+            )
+            found = [(user_id, username) for user_id, username in rows if user_id not in skip]
+            return sorted(found, key=lambda row: row[1].casefold())[:limit]
+        found = []
+        with self._lock:
+            for key, user_id in self._entries:
+                if needle in key and user_id not in skip:
+                    found.append((user_id, self._names[user_id]))
+                    if len(found) == limit:
+                        break
+        return found
+
+    def has_search_table(self):
+        if self._has_search_table is None:
+            self._has_search_table = inspect(self.db.engine).has_table(SEARCH_TABLE)
+        return self._has_search_table